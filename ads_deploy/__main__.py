@@ -8,19 +8,26 @@ Try::
 import argparse
 import importlib
 import logging
+import sys
 
 import ads_deploy
 
 DESCRIPTION = __doc__
 
 
-MODULES = {
-    'config': 'config',
-    'iocboot': 'iocboot',
-    'typhos_gui': 'typhos',
-    'caproto_ioc': 'caproto',
-    'tsproj': 'tsproj',
-    'docs': 'docs',
+# Subcommand name to (module, short description).  Modules are only imported
+# when their subcommand is dispatched, as some (typhos, caproto) pull in heavy
+# dependencies such as Qt and ophyd.
+COMMANDS = {
+    'ads-sim': ('ads_sim', 'Serve the symbols of a solution over ADS'),
+    'bench-ca': ('bench_ca', 'Load-test the Channel Access server of an IOC'),
+    'cache': ('cache', 'Inspect or clear the parsed project cache'),
+    'caproto': ('caproto_ioc', 'Run a mock caproto IOC for a solution'),
+    'config': ('config', 'Create the initial deployment configuration'),
+    'docs': ('docs', 'Generate Sphinx documentation for a solution'),
+    'iocboot': ('iocboot', 'Create iocBoot directories for a solution'),
+    'tsproj': ('tsproj', 'List .tsproj projects in a solution'),
+    'typhos': ('typhos_gui', 'Create a typhos screen for a solution'),
 }
 
 
@@ -29,39 +36,24 @@ def _try_import(module):
     return importlib.import_module(relative_module, 'ads_deploy')
 
 
-def _build_commands():
-    global DESCRIPTION
-    result = {}
-    unavailable = []
+def _build_description():
+    description = DESCRIPTION
+    for command in sorted(COMMANDS):
+        description += f'\n    $ ads-deploy {command} --help'
+    return description
 
-    for module, command in sorted(MODULES.items()):
-        try:
-            mod = _try_import(module)
-        except Exception as ex:
-            unavailable.append((command, ex))
-        else:
-            result[command] = (mod.build_arg_parser, mod.main)
-            DESCRIPTION += f'\n    $ ads-deploy {command} --help'
-
-    if unavailable:
-        DESCRIPTION += '\n'
-
-        for command, ex in unavailable:
-            DESCRIPTION += (
-                f'\nWARNING: "ads-deploy {command}" is unavailable due to:'
-                f'\n\t{ex.__class__.__name__}: {ex}'
-            )
-
-    return result
 
-
-COMMANDS = _build_commands()
+def _find_command(argv):
+    """Find the requested subcommand name in ``argv``, if specified."""
+    for arg in argv:
+        if arg in COMMANDS:
+            return arg
 
 
 def main():
     top_parser = argparse.ArgumentParser(
         prog='ads-deploy',
-        description=DESCRIPTION,
+        description=_build_description(),
         formatter_class=argparse.RawTextHelpFormatter
     )
 
@@ -79,11 +71,23 @@ def main():
         help='Python logging level (e.g. DEBUG, INFO, WARNING)'
     )
 
+    requested = _find_command(sys.argv[1:])
     subparsers = top_parser.add_subparsers(help='Possible subcommands')
-    for command_name, (build_func, main) in COMMANDS.items():
-        sub = subparsers.add_parser(command_name)
-        build_func(sub)
-        sub.set_defaults(func=main)
+    for command_name, (module, help_text) in sorted(COMMANDS.items()):
+        sub = subparsers.add_parser(command_name, help=help_text)
+        if command_name != requested:
+            continue
+
+        try:
+            mod = _try_import(module)
+        except Exception as ex:
+            top_parser.error(
+                f'"ads-deploy {command_name}" is unavailable due to:'
+                f'\n\t{ex.__class__.__name__}: {ex}'
+            )
+
+        mod.build_arg_parser(sub)
+        sub.set_defaults(func=mod.main)
 
     args = top_parser.parse_args()
     kwargs = vars(args)
@@ -0,0 +1,1029 @@
+"""
+`ads-deploy ads-sim` serves the symbols of a TwinCAT solution (or tsproj
+project) over the ADS/AMS TCP protocol, as a local stand-in for the PLCs.
+
+This allows load-testing the ads-ioc (as set up by `ads-deploy iocboot`)
+without a physical PLC.  The symbol table - names, index groups, offsets,
+sizes and types, including structure members and array elements - is built
+from the .tmc file of each PLC, and served by AMS port (e.g., 851 for the
+first PLC).  All values start at zero.
+
+Supported are reads and writes by index group/offset and by handle or name,
+symbol information and upload, sum-up (batched) reads, writes and
+read/writes, and device notifications, either cyclic or on change.  With
+``--update-rate``, all numeric symbols are changed periodically to exercise
+on-change notifications.  Request and notification rates are logged every
+``--stats-interval`` seconds.
+"""
+
+import argparse
+import asyncio
+import collections
+import functools
+import itertools
+import logging
+import struct
+import time
+
+from pytmc import parser as pytmc_parser
+
+from . import cache, util
+
+DESCRIPTION = __doc__
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 48898
+DEFAULT_NET_ID = '127.0.0.1.1.1'
+DEFAULT_TICK_RATE = 100.0
+STATS_INTERVAL = 10.0
+# Arrays with more elements are only served whole
+MAX_ARRAY_ELEMENTS = 65536
+# Handles are symbol indices, offset such that 0 is never a valid handle
+HANDLE_BASE = 1
+DEVICE_NAME = b'ads-deploy sim'
+DEVICE_VERSION = (3, 1, 4024)
+
+# AMS commands
+ADSSRVID_READDEVICEINFO = 1
+ADSSRVID_READ = 2
+ADSSRVID_WRITE = 3
+ADSSRVID_READSTATE = 4
+ADSSRVID_WRITECTRL = 5
+ADSSRVID_ADDDEVICENOTE = 6
+ADSSRVID_DELDEVICENOTE = 7
+ADSSRVID_DEVICENOTE = 8
+ADSSRVID_READWRITE = 9
+
+# Index groups
+ADSIGRP_PLC_RW = 0x4040
+ADSIGRP_IOIMAGE_RWIB = 0xF020
+ADSIGRP_IOIMAGE_RWOB = 0xF030
+ADSIGRP_SYM_HNDBYNAME = 0xF003
+ADSIGRP_SYM_VALBYNAME = 0xF004
+ADSIGRP_SYM_VALBYHND = 0xF005
+ADSIGRP_SYM_RELEASEHND = 0xF006
+ADSIGRP_SYM_INFOBYNAMEEX = 0xF009
+ADSIGRP_SYM_UPLOAD = 0xF00B
+ADSIGRP_SYM_UPLOADINFO = 0xF00C
+ADSIGRP_SYM_DT_UPLOAD = 0xF00E
+ADSIGRP_SYM_UPLOADINFO2 = 0xF00F
+ADSIGRP_SUMUP_READ = 0xF080
+ADSIGRP_SUMUP_WRITE = 0xF081
+ADSIGRP_SUMUP_READWRITE = 0xF082
+ADSIGRP_SUMUP_READEX = 0xF083
+
+# Data area type (from the .tmc) to index group
+AREA_INDEX_GROUPS = {
+    'Internal': ADSIGRP_PLC_RW,
+    'InputDst': ADSIGRP_IOIMAGE_RWIB,
+    'OutputSrc': ADSIGRP_IOIMAGE_RWOB,
+}
+
+# Error codes
+ERR_TARGETPORTNOTFOUND = 0x006
+ADSERR_DEVICE_SRVNOTSUPP = 0x701
+ADSERR_DEVICE_INVALIDGRP = 0x702
+ADSERR_DEVICE_INVALIDOFFSET = 0x703
+ADSERR_DEVICE_INVALIDSIZE = 0x705
+ADSERR_DEVICE_INVALIDDATA = 0x706
+ADSERR_DEVICE_SYMBOLNOTFOUND = 0x710
+ADSERR_DEVICE_TRANSMODENOTSUPP = 0x713
+ADSERR_DEVICE_NOTIFYHNDINVALID = 0x714
+
+ADSSTATE_RUN = 5
+ADSTRANS_SERVERCYCLE = 3
+ADSTRANS_SERVERONCHA = 4
+ADSTRANS_SERVERCYCLE2 = 5
+ADSTRANS_SERVERONCHA2 = 6
+# Transmission modes, to whether notifications are sent on change only
+TRANSMISSION_MODES = {
+    ADSTRANS_SERVERCYCLE: False,
+    ADSTRANS_SERVERONCHA: True,
+    ADSTRANS_SERVERCYCLE2: False,
+    ADSTRANS_SERVERONCHA2: True,
+}
+AMS_RESPONSE_FLAGS = 0x0005
+
+# ADS data type ID and struct format of scalar types, by TwinCAT type name
+ADST_BIGTYPE = 65
+ADST_STRING = 30
+ADS_TYPES = {
+    'BOOL': (33, '?'),
+    'BIT': (33, '?'),
+    'SINT': (16, 'b'),
+    'USINT': (17, 'B'),
+    'BYTE': (17, 'B'),
+    'INT': (2, 'h'),
+    'UINT': (18, 'H'),
+    'WORD': (18, 'H'),
+    'DINT': (3, 'i'),
+    'UDINT': (19, 'I'),
+    'DWORD': (19, 'I'),
+    'TIME': (19, 'I'),
+    'LINT': (20, 'q'),
+    'ULINT': (21, 'Q'),
+    'LWORD': (21, 'Q'),
+    'REAL': (4, 'f'),
+    'LREAL': (5, 'd'),
+}
+
+_TCP_HEADER = struct.Struct('<HI')
+_AMS_HEADER = struct.Struct('<6sH6sHHHIII')
+_SYMBOL_ENTRY = struct.Struct('<IIIIIIHHH')
+_NOTIFICATION_REQUEST = struct.Struct('<IIIIII16x')
+_SAMPLE_HEADER = struct.Struct('<II')
+_UINT32 = struct.Struct('<I')
+# Seconds between 1601-01-01 (FILETIME) and 1970-01-01
+_FILETIME_EPOCH = 11644473600
+
+AdsSymbol = collections.namedtuple(
+    'AdsSymbol', 'name index_group offset size type_name'
+)
+
+
+class AdsError(Exception):
+    """An ADS request failed with an ADS error code."""
+
+    def __init__(self, code, message=''):
+        super().__init__(code, message)
+        self.code = code
+        self.message = message
+
+    def __str__(self):
+        return self.message or f'ADS error {self.code:#x}'
+
+
+def build_arg_parser(parser=None):
+    if parser is None:
+        parser = argparse.ArgumentParser()
+
+    parser.description = DESCRIPTION
+    parser.formatter_class = argparse.RawTextHelpFormatter
+
+    parser.add_argument(
+        'project', metavar="INPUT",
+        type=argparse.FileType('rt', encoding='utf-8'),
+        help='Path to the solution (.sln) or project (.tsproj) file'
+    )
+
+    parser.add_argument(
+        '--exclude',
+        type=str,
+        nargs='*',
+        help='Exclude symbols by name',
+    )
+
+    parser.add_argument(
+        '--include',
+        type=str,
+        nargs='*',
+        help='Include symbols by name',
+    )
+
+    parser.add_argument(
+        '--plcs',
+        type=str,
+        action='append',
+        help='Specify one or more PLC names to serve'
+    )
+
+    parser.add_argument(
+        '--host',
+        type=str,
+        default='0.0.0.0',
+        help='Address to listen on [default: 0.0.0.0]'
+    )
+
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=DEFAULT_PORT,
+        help=f'TCP port to listen on [default: {DEFAULT_PORT}]'
+    )
+
+    parser.add_argument(
+        '--net-id',
+        type=str,
+        default=DEFAULT_NET_ID,
+        help=('AMS Net ID used by notifications to clients '
+              f'[default: {DEFAULT_NET_ID}]')
+    )
+
+    parser.add_argument(
+        '--tick-rate',
+        type=float,
+        default=DEFAULT_TICK_RATE,
+        help=('Checks per second for device notifications which are due '
+              f'[default: {DEFAULT_TICK_RATE}]')
+    )
+
+    parser.add_argument(
+        '--update-rate',
+        type=float,
+        default=0.0,
+        help=('Change all numeric symbols this many times per second '
+              '[default: 0, never]')
+    )
+
+    parser.add_argument(
+        '--stats-interval',
+        type=float,
+        default=STATS_INTERVAL,
+        help=('Seconds between logging request and notification rates '
+              f'[default: {STATS_INTERVAL}]')
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use the cache of parsed projects'
+    )
+
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help=('Number of worker processes for processing PLC projects '
+              '(0 for one per CPU) [default: 1]')
+    )
+
+    return parser
+
+
+def _get_index_group(symbol):
+    """Get the index group of a symbol from the type of its data area."""
+    area_numbers = getattr(symbol.parent, 'AreaNo', None) or [None]
+    area_type = getattr(area_numbers[0], 'attributes', {}).get('AreaType')
+    return AREA_INDEX_GROUPS.get(area_type, ADSIGRP_PLC_RW)
+
+
+def _get_array_dimensions(item):
+    """Get (lower bound, elements) of each dimension of an array item."""
+    dimensions = []
+    for info in getattr(item, 'ArrayInfo', None) or []:
+        lower = getattr(info, 'LBound', None)
+        elements = getattr(info, 'Elements', None)
+        dimensions.append((int(lower[0].text) if lower else 0,
+                           int(elements[0].text) if elements else 1))
+    return dimensions
+
+
+def _walk_members(item, name, bit_offset):
+    """
+    Yield (name, bit offset, bit size, type name) of an item and members.
+
+    Elements of arrays (up to ``MAX_ARRAY_ELEMENTS``) are yielded as
+    ``name[index]`` or, for multi-dimensional arrays, ``name[i,j]``, along
+    with their members.
+    """
+    bit_size = int(item.BitSize[0].text)
+    dimensions = _get_array_dimensions(item)
+    if not dimensions:
+        yield name, bit_offset, bit_size, item.type_name
+        if not getattr(item, 'is_pointer', False):
+            yield from _walk_type(item.data_type, name, bit_offset)
+        return
+
+    bounds = ', '.join(f'{lower}..{lower + elements - 1}'
+                       for lower, elements in dimensions)
+    yield name, bit_offset, bit_size, f'ARRAY [{bounds}] OF {item.type_name}'
+
+    count = 1
+    for _, elements in dimensions:
+        count *= elements
+    if not count or count > MAX_ARRAY_ELEMENTS:
+        logger.debug('Serving array %s (%d elements) only whole', name,
+                     count)
+        return
+
+    element_size = bit_size // count
+    indices = itertools.product(*(
+        range(lower, lower + elements) for lower, elements in dimensions
+    ))
+    for idx, index in enumerate(indices):
+        element_name = f'{name}[{",".join(str(i) for i in index)}]'
+        element_offset = bit_offset + idx * element_size
+        yield element_name, element_offset, element_size, item.type_name
+        if not getattr(item, 'is_pointer', False):
+            yield from _walk_type(item.data_type, element_name,
+                                  element_offset)
+
+
+def _walk_type(data_type, name, bit_offset):
+    """Yield the members of a structure, as in :func:`_walk_members`."""
+    for sub_item in getattr(data_type, 'SubItem', None) or []:
+        yield from _walk_members(
+            sub_item, f'{name}.{sub_item.name}',
+            bit_offset + int(sub_item.BitOffs[0].text)
+        )
+
+
+def symbols_from_tmc(tmc, *, includes=None, excludes=None):
+    """
+    Build the symbol table of a PLC, including structure members.
+
+    The data areas of each index group are laid out one after the other, so
+    offsets may differ from those on the PLC.  Clients are expected to use
+    handles, or the offsets from the symbol information.
+
+    Parameters
+    ----------
+    tmc : pytmc.parser.TcModuleClass
+        The parsed tmc file.
+
+    includes : list of str, optional
+        Include symbols by name.
+
+    excludes : list of str, optional
+        Exclude symbols by name.
+
+    Returns
+    -------
+    list of AdsSymbol
+    """
+    # Index group to the next free offset, and data area to its base offset
+    group_sizes = collections.defaultdict(int)
+    area_offsets = {}
+    symbols = []
+    for symbol in tmc.find(pytmc_parser.Symbol):
+        if not util.should_filter(includes or [], excludes or [],
+                                  [symbol.name]):
+            continue
+
+        index_group = _get_index_group(symbol)
+        area = id(symbol.parent)
+        if area not in area_offsets:
+            area_offsets[area] = group_sizes[index_group]
+
+        base = area_offsets[area] * 8
+        for name, bit_offset, bit_size, type_name in _walk_members(
+                symbol, symbol.name, base + int(symbol.BitOffs[0].text)):
+            offset = bit_offset // 8
+            size = max(-(-bit_size // 8), 1)
+            symbols.append(
+                AdsSymbol(name, index_group, offset, size, type_name)
+            )
+            group_sizes[index_group] = max(group_sizes[index_group],
+                                           offset + size)
+    return symbols
+
+
+def symbols_from_plc(tmc_path, *, includes=None, excludes=None,
+                     use_cache=True):
+    """
+    Build the symbol table of a PLC from its tmc file.
+
+    This only requires pytmc and its result is picklable, such that it may be
+    run in a worker process.
+    """
+    tmc = cache.parse(tmc_path, use_cache=use_cache)
+    return symbols_from_tmc(tmc, includes=includes, excludes=excludes)
+
+
+def get_ads_type(type_name):
+    """
+    Get the ADS data type ID and struct format of a TwinCAT type.
+
+    Returns
+    -------
+    data_type : int
+
+    fmt : str or None
+        The struct format, for numeric scalars.
+    """
+    type_name = type_name.upper()
+    if type_name.startswith('ARRAY '):
+        # Arrays are described by the type of their elements
+        data_type, _ = get_ads_type(type_name.split(' OF ', 1)[-1])
+        return data_type, None
+    if type_name.startswith('STRING'):
+        return ADST_STRING, None
+    return ADS_TYPES.get(type_name, (ADST_BIGTYPE, None))
+
+
+class SymbolTable:
+    """
+    The symbols and memory of one PLC.
+
+    Parameters
+    ----------
+    symbols : list of AdsSymbol
+        The symbols, as from :func:`symbols_from_tmc`.
+
+    Attributes
+    ----------
+    areas : dict
+        Index group to the bytearray holding its data.
+
+    generation : int
+        Incremented on each write, so that on-change notifications only
+        compare their values once the table has changed.
+    """
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        self.areas = {}
+        self.generation = 0
+        self._by_name = {}
+        sizes = collections.defaultdict(int)
+        for index, symbol in enumerate(self.symbols):
+            self._by_name.setdefault(symbol.name.upper(), index)
+            sizes[symbol.index_group] = max(sizes[symbol.index_group],
+                                            symbol.offset + symbol.size)
+        self.areas = {
+            index_group: bytearray(size) for index_group, size in sizes.items()
+        }
+        self._entries = [self._symbol_entry(symbol) for symbol in self.symbols]
+        self._upload = b''.join(self._entries)
+        self._numeric = []
+        for symbol in self.symbols:
+            _, fmt = get_ads_type(symbol.type_name)
+            if fmt is not None and struct.calcsize(fmt) == symbol.size:
+                self._numeric.append((self.areas[symbol.index_group],
+                                      symbol.offset, struct.Struct('<' + fmt)))
+
+    @staticmethod
+    def _symbol_entry(symbol):
+        data_type, _ = get_ads_type(symbol.type_name)
+        name = symbol.name.encode('latin-1') + b'\0'
+        type_name = symbol.type_name.encode('latin-1') + b'\0'
+        comment = b'\0'
+        header = _SYMBOL_ENTRY.pack(
+            _SYMBOL_ENTRY.size + len(name) + len(type_name) + len(comment),
+            symbol.index_group, symbol.offset, symbol.size, data_type, 0,
+            len(name) - 1, len(type_name) - 1, len(comment) - 1,
+        )
+        return header + name + type_name + comment
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def get_index(self, name):
+        """Get the index of a symbol by (case-insensitive) name."""
+        try:
+            return self._by_name[name.upper()]
+        except KeyError:
+            raise AdsError(ADSERR_DEVICE_SYMBOLNOTFOUND,
+                           f'Symbol not found: {name}') from None
+
+    def get_symbol(self, handle):
+        """Get a symbol by handle."""
+        index = handle - HANDLE_BASE
+        if not 0 <= index < len(self.symbols):
+            raise AdsError(ADSERR_DEVICE_SYMBOLNOTFOUND,
+                           f'Invalid handle: {handle}')
+        return self.symbols[index]
+
+    def locate(self, index_group, index_offset, length):
+        """Get the area and offset of a data request, checking bounds."""
+        if index_group == ADSIGRP_SYM_VALBYHND:
+            symbol = self.get_symbol(index_offset)
+            if length > symbol.size:
+                raise AdsError(ADSERR_DEVICE_INVALIDSIZE)
+            return self.areas[symbol.index_group], symbol.offset
+
+        try:
+            area = self.areas[index_group]
+        except KeyError:
+            raise AdsError(ADSERR_DEVICE_INVALIDGRP) from None
+        if index_offset > len(area):
+            raise AdsError(ADSERR_DEVICE_INVALIDOFFSET)
+        if index_offset + length > len(area):
+            raise AdsError(ADSERR_DEVICE_INVALIDSIZE)
+        return area, index_offset
+
+    def read(self, index_group, index_offset, length):
+        """Read by index group and offset, returning bytes."""
+        if index_group == ADSIGRP_SYM_UPLOAD:
+            return self._upload[:length]
+        if index_group == ADSIGRP_SYM_UPLOADINFO:
+            return struct.pack('<II', len(self.symbols), len(self._upload))
+        if index_group == ADSIGRP_SYM_UPLOADINFO2:
+            return struct.pack('<IIIIII', len(self.symbols),
+                               len(self._upload), 0, 0, 0, 0)
+        if index_group == ADSIGRP_SYM_DT_UPLOAD:
+            return b''
+
+        area, offset = self.locate(index_group, index_offset, length)
+        return bytes(area[offset:offset + length])
+
+    def write(self, index_group, index_offset, data):
+        """Write by index group and offset."""
+        if index_group == ADSIGRP_SYM_RELEASEHND:
+            # Handles are symbol indices, so there is nothing to release
+            return
+
+        area, offset = self.locate(index_group, index_offset, len(data))
+        area[offset:offset + len(data)] = data
+        self.generation += 1
+
+    def read_write(self, index_group, index_offset, read_length, data):
+        """Write then read, as for handle and symbol information requests."""
+        if index_group == ADSIGRP_SUMUP_READ:
+            return self._sum_read(index_offset, data, with_lengths=False)
+        if index_group == ADSIGRP_SUMUP_READEX:
+            return self._sum_read(index_offset, data, with_lengths=True)
+        if index_group == ADSIGRP_SUMUP_WRITE:
+            return self._sum_write(index_offset, data)
+        if index_group == ADSIGRP_SUMUP_READWRITE:
+            return self._sum_read_write(index_offset, data)
+
+        name = bytes(data).split(b'\0', 1)[0].decode('latin-1')
+        if index_group == ADSIGRP_SYM_HNDBYNAME:
+            return _UINT32.pack(self.get_index(name) + HANDLE_BASE)
+        if index_group == ADSIGRP_SYM_VALBYNAME:
+            symbol = self.symbols[self.get_index(name)]
+            return self.read(symbol.index_group, symbol.offset,
+                             min(read_length, symbol.size))
+        if index_group == ADSIGRP_SYM_INFOBYNAMEEX:
+            return self._entries[self.get_index(name)]
+        raise AdsError(ADSERR_DEVICE_INVALIDGRP)
+
+    @staticmethod
+    def _split_requests(count, data, fmt):
+        request = struct.Struct(fmt)
+        if len(data) < count * request.size:
+            raise AdsError(ADSERR_DEVICE_INVALIDSIZE)
+        requests = [request.unpack_from(data, idx * request.size)
+                    for idx in range(count)]
+        return requests, memoryview(data)[count * request.size:]
+
+    def _sum_read(self, count, data, with_lengths):
+        """Sum-up read: (group, offset, length) per request."""
+        requests, _ = self._split_requests(count, data, '<III')
+        results = []
+        values = []
+        for index_group, index_offset, length in requests:
+            try:
+                value = self.read(index_group, index_offset, length)
+            except AdsError as ex:
+                results.append((ex.code, 0))
+                # Sum-up reads keep the requested space for failed requests
+                values.append(b'' if with_lengths else bytes(length))
+            else:
+                results.append((0, len(value)))
+                values.append(value.ljust(length, b'\0')
+                              if not with_lengths else value)
+        header = b''.join(
+            struct.pack('<II', *result) if with_lengths
+            else _UINT32.pack(result[0])
+            for result in results
+        )
+        return header + b''.join(values)
+
+    def _sum_write(self, count, data):
+        """Sum-up write: (group, offset, length) per request, then data."""
+        requests, payload = self._split_requests(count, data, '<III')
+        results = []
+        position = 0
+        for index_group, index_offset, length in requests:
+            value = payload[position:position + length]
+            position += length
+            try:
+                self.write(index_group, index_offset, value)
+            except AdsError as ex:
+                results.append(ex.code)
+            else:
+                results.append(0)
+        return b''.join(_UINT32.pack(result) for result in results)
+
+    def _sum_read_write(self, count, data):
+        """
+        Sum-up read/write: (group, offset, read length, write length) per
+        request, then the write data.
+        """
+        requests, payload = self._split_requests(count, data, '<IIII')
+        results = []
+        values = []
+        position = 0
+        for index_group, index_offset, read_length, write_length in requests:
+            value = payload[position:position + write_length]
+            position += write_length
+            try:
+                value = self.read_write(index_group, index_offset,
+                                        read_length, value)
+            except AdsError as ex:
+                results.append(struct.pack('<II', ex.code, 0))
+            else:
+                value = value[:read_length]
+                results.append(struct.pack('<II', 0, len(value)))
+                values.append(value)
+        return b''.join(results) + b''.join(values)
+
+    def update_numeric(self):
+        """Change all numeric symbols, incrementing or toggling them."""
+        for area, offset, fmt in self._numeric:
+            value, = fmt.unpack_from(area, offset)
+            if isinstance(value, bool):
+                value = not value
+            elif isinstance(value, float):
+                value += 1.0
+            else:
+                value = (value + 1) & ((1 << (8 * fmt.size - 1)) - 1)
+            fmt.pack_into(area, offset, value)
+        self.generation += 1
+
+
+def _filetime():
+    """The current time as a Windows FILETIME (100 ns since 1601)."""
+    return int((time.time() + _FILETIME_EPOCH) * 1e7)
+
+
+class Notification:
+    """A device notification registered by a client."""
+
+    __slots__ = ('handle', 'port', 'table', 'area', 'offset', 'length',
+                 'on_change', 'cycle_time', 'next_due', 'last_value',
+                 'last_generation')
+
+    def __init__(self, handle, port, table, area, offset, length, on_change,
+                 cycle_time):
+        self.handle = handle
+        self.port = port
+        self.table = table
+        self.area = area
+        self.offset = offset
+        self.length = length
+        self.on_change = on_change
+        self.cycle_time = cycle_time
+        self.next_due = 0.0
+        self.last_value = None
+        self.last_generation = None
+
+    def poll(self, now):
+        """Get the value to send, if due (and, if on change, changed)."""
+        if now < self.next_due:
+            return None
+        self.next_due = now + self.cycle_time
+        generation = self.table.generation
+        if self.on_change and generation == self.last_generation:
+            # Nothing in the table has been written since
+            return None
+        self.last_generation = generation
+        value = bytes(self.area[self.offset:self.offset + self.length])
+        if self.on_change and value == self.last_value:
+            return None
+        self.last_value = value
+        return value
+
+
+class AdsConnection:
+    """
+    One client connection of an :class:`AdsSimulator`.
+
+    Parameters
+    ----------
+    server : AdsSimulator
+        The server.
+
+    reader : asyncio.StreamReader
+
+    writer : asyncio.StreamWriter
+    """
+
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.peer = writer.get_extra_info('peername')
+        # Handle to Notification
+        self.notifications = {}
+        # Address of the client, for notifications
+        self.client_address = None
+        self._next_handle = 1
+
+    def send(self, target, source, command, invoke_id, data, error=0,
+             flags=AMS_RESPONSE_FLAGS):
+        """Send an AMS packet."""
+        header = _AMS_HEADER.pack(*target, *source, command, flags,
+                                  len(data), error, invoke_id)
+        self.writer.write(
+            _TCP_HEADER.pack(0, len(header) + len(data)) + header + data
+        )
+
+    async def run(self):
+        """Handle requests until the client disconnects."""
+        logger.info('Client connected: %s', self.peer)
+        try:
+            while True:
+                try:
+                    tcp_header = await self.reader.readexactly(
+                        _TCP_HEADER.size)
+                except asyncio.IncompleteReadError:
+                    break
+                _, length = _TCP_HEADER.unpack(tcp_header)
+                packet = await self.reader.readexactly(length)
+                self.handle_packet(packet)
+                await self.writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as ex:
+            logger.debug('Client %s disconnected: %s', self.peer, ex)
+        finally:
+            logger.info('Client disconnected: %s (%d notification(s))',
+                        self.peer, len(self.notifications))
+            self.server.connections.discard(self)
+            self.writer.close()
+
+    def handle_packet(self, packet):
+        """Handle one AMS packet, sending the response."""
+        (target_net_id, target_port, source_net_id, source_port, command,
+         _, length, _, invoke_id) = _AMS_HEADER.unpack_from(packet)
+        data = memoryview(packet)[_AMS_HEADER.size:_AMS_HEADER.size + length]
+        target = (source_net_id, source_port)
+        source = (target_net_id, target_port)
+        self.client_address = target
+        self.server.counters[command] += 1
+
+        table = self.server.tables.get(target_port)
+        if table is None:
+            logger.debug('Request for unknown AMS port %d', target_port)
+            self.send(target, source, command, invoke_id, b'',
+                      error=ERR_TARGETPORTNOTFOUND)
+            return
+
+        try:
+            handler = self._handlers[command]
+        except KeyError:
+            response = _UINT32.pack(ADSERR_DEVICE_SRVNOTSUPP)
+        else:
+            try:
+                response = handler(self, table, target_port, data)
+            except AdsError as ex:
+                response = _UINT32.pack(ex.code)
+            except struct.error:
+                response = _UINT32.pack(ADSERR_DEVICE_INVALIDDATA)
+        self.send(target, source, command, invoke_id, response)
+
+    def _read_device_info(self, table, port, data):
+        major, minor, build = DEVICE_VERSION
+        return struct.pack('<IBBH16s', 0, major, minor, build, DEVICE_NAME)
+
+    def _read(self, table, port, data):
+        index_group, index_offset, length = struct.unpack_from('<III', data)
+        if index_group in (ADSIGRP_SUMUP_READ, ADSIGRP_SUMUP_READEX):
+            raise AdsError(ADSERR_DEVICE_INVALIDGRP)
+        value = table.read(index_group, index_offset, length)
+        return struct.pack('<II', 0, len(value)) + value
+
+    def _write(self, table, port, data):
+        index_group, index_offset, length = struct.unpack_from('<III', data)
+        table.write(index_group, index_offset, data[12:12 + length])
+        return _UINT32.pack(0)
+
+    def _read_state(self, table, port, data):
+        return struct.pack('<IHH', 0, ADSSTATE_RUN, 0)
+
+    def _write_control(self, table, port, data):
+        return _UINT32.pack(0)
+
+    def _read_write(self, table, port, data):
+        index_group, index_offset, read_length, write_length = (
+            struct.unpack_from('<IIII', data))
+        if index_group in (ADSIGRP_SUMUP_READ, ADSIGRP_SUMUP_READEX,
+                           ADSIGRP_SUMUP_WRITE, ADSIGRP_SUMUP_READWRITE):
+            self.server.counters['sum_requests'] += index_offset
+        value = table.read_write(index_group, index_offset, read_length,
+                                 data[16:16 + write_length])
+        return struct.pack('<II', 0, len(value)) + value
+
+    def _add_notification(self, table, port, data):
+        (index_group, index_offset, length, mode, _,
+         cycle_time) = _NOTIFICATION_REQUEST.unpack_from(data)
+        if mode not in TRANSMISSION_MODES:
+            raise AdsError(ADSERR_DEVICE_TRANSMODENOTSUPP)
+        area, offset = table.locate(index_group, index_offset, length)
+        handle = self._next_handle
+        self._next_handle += 1
+        # Cycle times are in units of 100 ns
+        self.notifications[handle] = Notification(
+            handle, port, table, area, offset, length,
+            on_change=TRANSMISSION_MODES[mode],
+            cycle_time=cycle_time * 1e-7,
+        )
+        return struct.pack('<II', 0, handle)
+
+    def _delete_notification(self, table, port, data):
+        handle, = _UINT32.unpack_from(data)
+        if self.notifications.pop(handle, None) is None:
+            raise AdsError(ADSERR_DEVICE_NOTIFYHNDINVALID)
+        return _UINT32.pack(0)
+
+    _handlers = {
+        ADSSRVID_READDEVICEINFO: _read_device_info,
+        ADSSRVID_READ: _read,
+        ADSSRVID_WRITE: _write,
+        ADSSRVID_READSTATE: _read_state,
+        ADSSRVID_WRITECTRL: _write_control,
+        ADSSRVID_READWRITE: _read_write,
+        ADSSRVID_ADDDEVICENOTE: _add_notification,
+        ADSSRVID_DELDEVICENOTE: _delete_notification,
+    }
+
+    def send_notifications(self, now):
+        """
+        Send the notifications which are due, batched per AMS port.
+
+        Returns
+        -------
+        int
+            The number of samples sent.
+        """
+        if not self.notifications or self.client_address is None:
+            return 0
+
+        samples = collections.defaultdict(list)
+        for notification in self.notifications.values():
+            value = notification.poll(now)
+            if value is not None:
+                samples[notification.port].append(
+                    _SAMPLE_HEADER.pack(notification.handle, len(value)) +
+                    value
+                )
+
+        timestamp = _filetime()
+        for port, port_samples in samples.items():
+            stamp = (struct.pack('<QI', timestamp, len(port_samples)) +
+                     b''.join(port_samples))
+            data = struct.pack('<II', len(stamp) + 4, 1) + stamp
+            source = (self.server.net_id, port)
+            # Notifications are requests, from the server to the client
+            self.send(self.client_address, source, ADSSRVID_DEVICENOTE, 0,
+                      data, flags=0x0004)
+        return sum(len(port_samples) for port_samples in samples.values())
+
+
+def parse_net_id(net_id):
+    """Parse an AMS Net ID, such as 127.0.0.1.1.1, into bytes."""
+    parts = [int(part) for part in net_id.split('.')]
+    if len(parts) != 6 or not all(0 <= part <= 255 for part in parts):
+        raise ValueError(f'Invalid AMS Net ID: {net_id}')
+    return bytes(parts)
+
+
+class AdsSimulator:
+    """
+    Serve symbol tables over ADS/AMS TCP.
+
+    Parameters
+    ----------
+    tables : dict
+        AMS port to :class:`SymbolTable`.
+
+    net_id : str, optional
+        AMS Net ID of the server, the source of notifications.
+
+    tick_rate : float, optional
+        Checks per second for device notifications which are due.
+
+    Attributes
+    ----------
+    counters : collections.Counter
+        Requests by AMS command ID, ``sum_requests`` (sub-requests of sum-up
+        requests) and ``notifications`` (samples sent).
+    """
+
+    def __init__(self, tables, *, net_id=DEFAULT_NET_ID,
+                 tick_rate=DEFAULT_TICK_RATE):
+        self.tables = tables
+        self.net_id = parse_net_id(net_id)
+        self.tick_rate = tick_rate
+        self.connections = set()
+        self.counters = collections.Counter()
+
+    async def _handle_client(self, reader, writer):
+        connection = AdsConnection(self, reader, writer)
+        self.connections.add(connection)
+        await connection.run()
+
+    async def start(self, host='0.0.0.0', port=DEFAULT_PORT):
+        """Start listening, returning the asyncio server."""
+        server = await asyncio.start_server(self._handle_client, host, port)
+        for sock in server.sockets:
+            logger.info('Serving %d PLC(s) (%s symbols) on %s',
+                        len(self.tables),
+                        ', '.join(str(len(table))
+                                  for table in self.tables.values()),
+                        sock.getsockname())
+        return server
+
+    async def send_notifications(self):
+        """Send device notifications as they are due."""
+        period = 1.0 / self.tick_rate
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(period)
+            now = loop.time()
+            for connection in list(self.connections):
+                try:
+                    self.counters['notifications'] += (
+                        connection.send_notifications(now))
+                except ConnectionError:
+                    ...
+
+    async def update_values(self, rate):
+        """Change all numeric symbols ``rate`` times per second."""
+        while True:
+            await asyncio.sleep(1.0 / rate)
+            for table in self.tables.values():
+                table.update_numeric()
+
+    async def log_stats(self, interval):
+        """Log request and notification rates every ``interval`` seconds."""
+        previous = collections.Counter()
+        while True:
+            await asyncio.sleep(interval)
+            counters = collections.Counter(self.counters)
+            delta = counters - previous
+            previous = counters
+            logger.info(
+                '%d client(s); per second: %.1f reads, %.1f writes, '
+                '%.1f read/writes (%.1f sum-up sub-requests), '
+                '%.1f notification samples', len(self.connections),
+                *(delta[key] / interval
+                  for key in (ADSSRVID_READ, ADSSRVID_WRITE,
+                              ADSSRVID_READWRITE, 'sum_requests',
+                              'notifications'))
+            )
+
+    async def serve(self, host='0.0.0.0', port=DEFAULT_PORT, *,
+                    update_rate=0.0, stats_interval=STATS_INTERVAL):
+        """Serve until cancelled."""
+        server = await self.start(host, port)
+        tasks = [self.send_notifications()]
+        if update_rate:
+            tasks.append(self.update_values(update_rate))
+        if stats_interval:
+            tasks.append(self.log_stats(stats_interval))
+        async with server:
+            await asyncio.gather(server.serve_forever(), *tasks)
+
+
+def tables_from_project(filename, *, plcs=None, includes=None, excludes=None,
+                        use_cache=True, jobs=1):
+    """
+    Build the symbol tables of the PLCs of a project.
+
+    Returns
+    -------
+    dict
+        AMS port to :class:`SymbolTable`.  PLCs which fail to process are
+        logged and skipped.
+    """
+    solution_path, projects = util.get_tsprojects_from_filename(filename)
+
+    to_process = []
+    for tsproj_project, parsed_tsproj in zip(
+            projects, cache.parse_all(projects, use_cache=use_cache,
+                                      jobs=jobs)):
+        for plc_name, plc_project in parsed_tsproj.plcs_by_name.items():
+            logger.debug('Project: %s PLC: %s', tsproj_project, plc_name)
+
+            if plcs and plc_name not in plcs:
+                logger.debug('Skipping; not in valid list: %s', plcs)
+                continue
+
+            to_process.append((plc_name, int(plc_project.port),
+                               plc_project.tmc_path))
+
+    get_symbols = functools.partial(
+        symbols_from_plc, includes=includes, excludes=excludes,
+        use_cache=use_cache)
+
+    tables = {}
+    results = util.run_jobs(get_symbols,
+                            [(tmc_path, ) for _, _, tmc_path in to_process],
+                            jobs=jobs)
+    for (plc_name, port, _), result in zip(to_process, results):
+        try:
+            symbols = result.result()
+        except Exception:
+            logger.exception('Failed to get symbols for plc %s', plc_name)
+            continue
+        if port in tables:
+            logger.warning('PLC %s uses AMS port %d of another PLC; '
+                           'skipping it', plc_name, port)
+            continue
+        tables[port] = SymbolTable(symbols)
+        logger.info('PLC %s: %d symbols on AMS port %d', plc_name,
+                    len(symbols), port)
+    return tables
+
+
+def main(project, *, plcs=None, include=None, exclude=None, host='0.0.0.0',
+         port=DEFAULT_PORT, net_id=DEFAULT_NET_ID,
+         tick_rate=DEFAULT_TICK_RATE, update_rate=0.0,
+         stats_interval=STATS_INTERVAL, no_cache=False, jobs=1):
+    tables = tables_from_project(
+        project.name, plcs=plcs, includes=include or [],
+        excludes=exclude or [], use_cache=not no_cache, jobs=jobs)
+    if not tables:
+        logger.error('No PLCs to serve')
+        return
+
+    simulator = AdsSimulator(tables, net_id=net_id, tick_rate=tick_rate)
+    try:
+        asyncio.run(
+            simulator.serve(host, port, update_rate=update_rate,
+                            stats_interval=stats_interval)
+        )
+    except KeyboardInterrupt:
+        ...
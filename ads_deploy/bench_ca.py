@@ -0,0 +1,508 @@
+"""
+`ads-deploy bench-ca` load-tests the Channel Access server of an IOC for a
+TwinCAT solution (or tsproj project), such as the `ads-deploy caproto` mock
+IOC, and writes a JSON report.
+
+The PVs are those of the records generated for the project.  Each of
+``--clients`` client contexts connects to all of them, then measures get
+and (with ``--put``) put round-trip latencies and the rate of monitor
+updates.  Puts write back the value just read, leaving the IOC unchanged.
+"""
+
+import argparse
+import asyncio
+import datetime
+import functools
+import json
+import logging
+import sys
+import time
+
+import numpy
+from caproto.asyncio.client import Context
+
+from . import __version__, caproto_ioc, util
+
+DESCRIPTION = __doc__
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 64
+DEFAULT_DURATION = 10.0
+DEFAULT_TIMEOUT = 10.0
+
+
+def build_arg_parser(parser=None):
+    if parser is None:
+        parser = argparse.ArgumentParser()
+
+    parser.description = DESCRIPTION
+    parser.formatter_class = argparse.RawTextHelpFormatter
+
+    parser.add_argument(
+        'project', metavar="INPUT",
+        type=argparse.FileType('rt', encoding='utf-8'),
+        help='Path to the solution (.sln) or project (.tsproj) file'
+    )
+
+    parser.add_argument(
+        '--exclude',
+        type=str,
+        nargs='*',
+        help='Exclude signals by name',
+    )
+
+    parser.add_argument(
+        '--include',
+        type=str,
+        nargs='*',
+        help='Include signals by name',
+    )
+
+    parser.add_argument(
+        '--macro',
+        type=str,
+        nargs='*',
+        help='Specify an additional macro for the template (VAR=VALUE)'
+    )
+
+    parser.add_argument(
+        '--plcs',
+        type=str,
+        action='append',
+        help='Specify one or more PLC names to generate'
+    )
+
+    parser.add_argument(
+        '--max-pvs',
+        type=int,
+        default=None,
+        help='Only use the first N PVs, in order of PV name'
+    )
+
+    parser.add_argument(
+        '--clients',
+        type=int,
+        default=1,
+        help='Number of concurrent client contexts [default: 1]'
+    )
+
+    parser.add_argument(
+        '--count',
+        type=int,
+        default=1,
+        help='Gets (and puts) per PV and client [default: 1]'
+    )
+
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help=('Maximum requests in progress per client '
+              f'[default: {DEFAULT_CONCURRENCY}]')
+    )
+
+    parser.add_argument(
+        '--put',
+        action='store_true',
+        help=('Measure puts to output records, writing back their current '
+              'value, and keep\nputting while measuring monitor updates')
+    )
+
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=DEFAULT_DURATION,
+        help=('Seconds to count monitor updates for '
+              f'[default: {DEFAULT_DURATION}]')
+    )
+
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help=f'Timeout for each request [default: {DEFAULT_TIMEOUT}]'
+    )
+
+    parser.add_argument(
+        '--output', '-o',
+        type=str,
+        default=None,
+        help='Write the JSON report to this file, rather than to stdout'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use the cache of parsed projects'
+    )
+
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help=('Number of worker processes for processing PLC projects '
+              '(0 for one per CPU) [default: 1]')
+    )
+
+    return parser
+
+
+def get_pvnames(project, *, plcs=None, macros=None, includes=None,
+                excludes=None, use_cache=True, jobs=1):
+    """
+    Get the PV names of the records generated for a project.
+
+    Returns
+    -------
+    pvnames : list of str
+        All PV names, sorted.
+
+    writable : set of str
+        The PV names of output records.
+    """
+    record_pairs, _, _ = caproto_ioc.records_from_project(
+        project, plcs=plcs, macros=macros or {}, includes=includes,
+        excludes=excludes, use_cache=use_cache, jobs=jobs)
+
+    pvnames = set()
+    writable = set()
+    for pairs in record_pairs.values():
+        for input_record, output_record in pairs:
+            pvnames.add(input_record.pvname)
+            if output_record is not None:
+                pvnames.add(output_record.pvname)
+                writable.add(output_record.pvname)
+    return sorted(pvnames), writable
+
+
+def summarize_latencies(latencies):
+    """Summarize latencies (in seconds) as milliseconds."""
+    if not len(latencies):
+        return {'count': 0}
+
+    latencies = numpy.asarray(latencies) * 1e3
+    p50, p90, p99 = numpy.percentile(latencies, [50, 90, 99])
+    return {
+        'count': len(latencies),
+        'mean_ms': float(latencies.mean()),
+        'min_ms': float(latencies.min()),
+        'p50_ms': float(p50),
+        'p90_ms': float(p90),
+        'p99_ms': float(p99),
+        'max_ms': float(latencies.max()),
+    }
+
+
+async def _run_requests(items, request, *, concurrency):
+    """
+    Await ``request(item)`` for each item, with at most ``concurrency`` in
+    progress.
+
+    The latency of a request is the time it took, unless it returns its own
+    (e.g., to exclude a preparatory read).
+
+    Returns
+    -------
+    latencies : list of float
+        Seconds per successful request.
+
+    failed : list
+        The items of failed requests.
+    """
+    latencies = []
+    failed = []
+    pending = iter(items)
+
+    async def worker():
+        for item in pending:
+            t0 = time.perf_counter()
+            try:
+                latency = await request(item)
+            except Exception as ex:
+                failed.append(item)
+                logger.debug('Request failed for %s: %s', item, ex)
+            else:
+                if latency is None:
+                    latency = time.perf_counter() - t0
+                latencies.append(latency)
+
+    await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    return latencies, failed
+
+
+async def connect(context, pvnames, *, timeout):
+    """
+    Connect to PVs.
+
+    Returns
+    -------
+    pvs : list of caproto.asyncio.client.PV
+        The connected PVs.
+
+    latencies : list of float
+        Seconds from the search to the connection of each PV.
+    """
+    t0 = time.perf_counter()
+    pvs = await context.get_pvs(*pvnames, timeout=timeout)
+
+    async def wait(pv):
+        await pv.wait_for_connection(timeout=timeout)
+        return time.perf_counter() - t0
+
+    results = await asyncio.gather(*(wait(pv) for pv in pvs),
+                                   return_exceptions=True)
+    connected = []
+    latencies = []
+    for pv, result in zip(pvs, results):
+        if isinstance(result, Exception):
+            logger.debug('Failed to connect to %s: %s', pv.name, result)
+        else:
+            connected.append(pv)
+            latencies.append(result)
+    return connected, latencies
+
+
+async def put_same_value(pv, *, timeout):
+    """Write back the current value of a PV, waiting for completion."""
+    reading = await pv.read(timeout=timeout)
+    t0 = time.perf_counter()
+    await pv.write(reading.data, wait=True, timeout=timeout)
+    return time.perf_counter() - t0
+
+
+class _UpdateCounter:
+    """Count the monitor updates of subscriptions."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, sub, response):
+        self.count += 1
+
+
+async def _gather_phase(per_client):
+    """
+    Run the requests of each client concurrently and summarize them.
+
+    Returns
+    -------
+    summary : dict
+        The combined request counts, rate and latencies.
+
+    failed : set of str
+        The names of PVs with failed requests.
+    """
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*per_client)
+    elapsed = time.perf_counter() - t0
+    latencies = [latency for client, _ in results for latency in client]
+    failed = [pv for _, client in results for pv in client]
+    summary = {
+        'requests': len(latencies) + len(failed),
+        'errors': len(failed),
+        'elapsed_s': elapsed,
+        'rate_per_s': len(latencies) / elapsed if elapsed else 0.0,
+        'latency': summarize_latencies(latencies),
+    }
+    return summary, {pv.name for pv in failed}
+
+
+async def run_benchmark(pvnames, writable=(), *, clients=1, count=1,
+                        concurrency=DEFAULT_CONCURRENCY, put=False,
+                        duration=DEFAULT_DURATION, timeout=DEFAULT_TIMEOUT):
+    """
+    Run the CA load test.
+
+    Parameters
+    ----------
+    pvnames : list of str
+        The PVs to use.
+
+    writable : set of str, optional
+        The PVs which may be put to, with ``put``.
+
+    clients : int, optional
+        Number of concurrent client contexts, each using all PVs.
+
+    count : int, optional
+        Gets (and puts) per PV and client.
+
+    concurrency : int, optional
+        Maximum requests in progress per client.
+
+    put : bool, optional
+        Measure puts to ``writable`` PVs, writing back their current value,
+        and keep putting while counting monitor updates.
+
+    duration : float, optional
+        Seconds to count monitor updates for.
+
+    timeout : float, optional
+        Timeout for each request.
+
+    Returns
+    -------
+    dict
+        The report.
+    """
+    contexts = [Context(timeout=timeout) for _ in range(clients)]
+    report = {
+        'pvs': len(pvnames),
+        'writable_pvs': len(writable) if put else 0,
+        'clients': clients,
+        'count': count,
+        'concurrency': concurrency,
+    }
+
+    try:
+        t0 = time.perf_counter()
+        connections = await asyncio.gather(*(
+            connect(context, pvnames, timeout=timeout)
+            for context in contexts
+        ))
+        elapsed = time.perf_counter() - t0
+        client_pvs = [pvs for pvs, _ in connections]
+        connected = sum(len(pvs) for pvs in client_pvs)
+        report['connect'] = {
+            'connected': connected,
+            'failed': len(pvnames) * clients - connected,
+            'elapsed_s': elapsed,
+            'latency': summarize_latencies(
+                [latency for _, latencies in connections
+                 for latency in latencies]
+            ),
+        }
+        logger.info('Connected %d of %d channel(s) in %.2f s', connected,
+                    len(pvnames) * clients, elapsed)
+
+        async def read(pv):
+            await pv.read(timeout=timeout)
+
+        report['get'], _ = await _gather_phase(
+            _run_requests(pvs * count, read, concurrency=concurrency)
+            for pvs in client_pvs
+        )
+        logger.info('Get: %(requests)d request(s), %(errors)d error(s), '
+                    '%(rate_per_s).0f/s', report['get'])
+
+        writable_pvs = [
+            [pv for pv in pvs if pv.name in writable] if put else []
+            for pvs in client_pvs
+        ]
+        report['put'] = None
+        stimulus_pvs = []
+        if put:
+            put_request = functools.partial(put_same_value, timeout=timeout)
+            report['put'], failed = await _gather_phase(
+                _run_requests(pvs * count, put_request,
+                              concurrency=concurrency)
+                for pvs in writable_pvs
+            )
+            logger.info('Put: %(requests)d request(s), %(errors)d '
+                        'error(s), %(rate_per_s).0f/s', report['put'])
+            # Failed puts can be slow on the server side; avoid them
+            stimulus_pvs = [pv for pv in writable_pvs[0]
+                            if pv.name not in failed]
+
+        report['monitor'] = await measure_monitors(
+            client_pvs, stimulus_pvs, duration=duration,
+            concurrency=concurrency, timeout=timeout)
+        logger.info('Monitor: %(updates)d update(s) in %(duration_s).1f s, '
+                    '%(rate_per_s).0f/s', report['monitor'])
+    finally:
+        await asyncio.gather(*(context.disconnect() for context in contexts),
+                             return_exceptions=True)
+    return report
+
+
+async def measure_monitors(client_pvs, put_pvs, *, duration, concurrency,
+                           timeout):
+    """
+    Subscribe to all PVs and count their updates.
+
+    The initial update of each subscription is counted separately from the
+    updates during ``duration``, while values are written back to
+    ``put_pvs`` (if any) to generate updates.
+    """
+    counter = _UpdateCounter()
+    subscriptions = []
+    t0 = time.perf_counter()
+    for pvs in client_pvs:
+        for pv in pvs:
+            sub = pv.subscribe(data_type='time')
+            sub.add_callback(counter)
+            subscriptions.append(sub)
+
+    # Wait for the initial updates, or at most ``timeout``
+    deadline = t0 + timeout
+    while counter.count < len(subscriptions) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    initial_elapsed = time.perf_counter() - t0
+    initial = counter.count
+
+    async def stimulate():
+        while True:
+            await _run_requests(
+                put_pvs, functools.partial(put_same_value, timeout=timeout),
+                concurrency=concurrency)
+            await asyncio.sleep(0)
+
+    stimulus = asyncio.ensure_future(stimulate()) if put_pvs else None
+    counter.count = 0
+    t0 = time.perf_counter()
+    try:
+        await asyncio.sleep(duration)
+    finally:
+        updates = counter.count
+        elapsed = time.perf_counter() - t0
+        if stimulus is not None:
+            stimulus.cancel()
+            await asyncio.gather(stimulus, return_exceptions=True)
+
+    for sub in subscriptions:
+        await sub.clear()
+
+    return {
+        'subscriptions': len(subscriptions),
+        'initial_updates': initial,
+        'initial_elapsed_s': initial_elapsed,
+        'updates': updates,
+        'duration_s': elapsed,
+        'rate_per_s': updates / elapsed if elapsed else 0.0,
+    }
+
+
+def main(project, *, plcs=None, include=None, exclude=None, macro=None,
+         max_pvs=None, clients=1, count=1, concurrency=DEFAULT_CONCURRENCY,
+         put=False, duration=DEFAULT_DURATION, timeout=DEFAULT_TIMEOUT,
+         output=None, no_cache=False, jobs=1):
+    pvnames, writable = get_pvnames(
+        project.name, plcs=plcs, macros=util.split_macros(macro or []),
+        includes=include or [], excludes=exclude or [],
+        use_cache=not no_cache, jobs=jobs)
+    if max_pvs is not None:
+        pvnames = pvnames[:max_pvs]
+    logger.info('Benchmarking %d PV(s) with %d client(s)', len(pvnames),
+                clients)
+
+    report = {
+        'input': project.name,
+        'version': __version__,
+        'started': datetime.datetime.now().isoformat(),
+    }
+    report.update(
+        asyncio.run(
+            run_benchmark(pvnames, writable, clients=clients, count=count,
+                          concurrency=concurrency, put=put,
+                          duration=duration, timeout=timeout)
+        )
+    )
+
+    if output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(output, 'wt') as f:
+            json.dump(report, f, indent=2)
+        logger.info('Wrote report to %s', output)
+    return report
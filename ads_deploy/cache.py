@@ -0,0 +1,443 @@
+"""
+`ads-deploy cache` is used to inspect or clear the on-disk cache of parsed
+TwinCAT projects.
+
+Parsed projects are cached per user and are invalidated whenever any of the
+files that went into them (.tsproj, .xti, .plcproj, .tmc, source files) change
+in size or modification time.  Set ADS_DEPLOY_CACHE_PATH to relocate the cache
+and ADS_DEPLOY_CACHE_SIZE to change its maximum size in bytes.
+"""
+
+import argparse
+import gc
+import hashlib
+import io
+import logging
+import os
+import pathlib
+import pickle
+import sys
+import tempfile
+
+import pytmc
+from pytmc import parser as pytmc_parser
+
+from . import util
+
+DESCRIPTION = __doc__
+logger = logging.getLogger(__name__)
+
+# Bump this when the layout of cache entries changes
+CACHE_VERSION = 1
+CACHE_SUFFIX = '.pickle'
+MAX_CACHE_SIZE = int(os.environ.get('ADS_DEPLOY_CACHE_SIZE', 1024 ** 3))
+
+
+def _get_default_cache_path():
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+        return pathlib.Path(base) / 'ads-deploy' / 'Cache'
+
+    base = os.environ.get('XDG_CACHE_HOME',
+                          os.path.join(os.path.expanduser('~'), '.cache'))
+    return pathlib.Path(base) / 'ads-deploy'
+
+
+CACHE_PATH = pathlib.Path(
+    os.environ.get('ADS_DEPLOY_CACHE_PATH', _get_default_cache_path())
+)
+
+
+def build_arg_parser(parser=None):
+    if parser is None:
+        parser = argparse.ArgumentParser()
+
+    parser.description = DESCRIPTION
+    parser.formatter_class = argparse.RawTextHelpFormatter
+
+    parser.add_argument(
+        'action',
+        choices=['stats', 'clear'],
+        help='Show cache statistics or remove all cached projects'
+    )
+
+    return parser
+
+
+def _twincat_type(name, base_name):
+    """Get (or re-create) a dynamically-generated pytmc TwincatItem class."""
+    try:
+        return pytmc_parser.TWINCAT_TYPES[name]
+    except KeyError:
+        return type(name, (getattr(pytmc_parser, base_name), ), {})
+
+
+class _ProjectPickler(pickle.Pickler):
+    """
+    Pickler for parsed pytmc projects.
+
+    pytmc creates classes on the fly for XML tags it does not know about;
+    these cannot be looked up by name on unpickling, so they are recorded by
+    name and base class instead.  While pickling, the files that contributed
+    to the project are recorded in ``dependencies``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dependencies = set()
+
+    def reducer_override(self, obj):
+        if isinstance(obj, type):
+            if (issubclass(obj, pytmc_parser.TwincatItem) and
+                    getattr(pytmc_parser, obj.__name__, None) is not obj):
+                return _twincat_type, (obj.__name__, obj.__bases__[0].__name__)
+        elif isinstance(obj, pytmc_parser.TwincatItem):
+            if obj.filename is not None:
+                self.dependencies.add(str(obj.filename))
+            if isinstance(obj, pytmc_parser.Plc):
+                # These may not exist yet, but would change the project if
+                # they are created:
+                self.dependencies.add(str(obj.project_path))
+                self.dependencies.add(str(obj.tmc_path))
+        return NotImplemented
+
+
+def _unpickle_project(f):
+    """Unpickle a project from the file-like object ``f``."""
+    # Unpickling a large object graph is significantly faster without the
+    # cyclic garbage collector running.  The project remains collectable once
+    # released, e.g., by streaming builds of ``ads-deploy docs``.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        item = pickle.load(f)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return item
+
+
+def _file_signature(filename):
+    """(size, mtime) signature of a file, or None if it does not exist."""
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def get_cache_filename(filename):
+    """
+    Get the cache entry filename for the given project file.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        The .tsproj or .tmc file.
+
+    Returns
+    -------
+    pathlib.Path
+    """
+    filename = pathlib.Path(filename).resolve()
+    key = '|'.join((str(CACHE_VERSION), str(pytmc.__version__),
+                    '.'.join(str(v) for v in sys.version_info[:2]),
+                    str(filename)))
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return CACHE_PATH / f'{filename.stem}-{digest}{CACHE_SUFFIX}'
+
+
+def _get_stale_dependencies(f):
+    """Read the dependency header of a cache entry and check for changes."""
+    dependencies = pickle.load(f)
+    return [
+        dep for dep, signature in dependencies.items()
+        if _file_signature(dep) != signature
+    ]
+
+
+def is_cached(filename):
+    """
+    Check if there is an up-to-date cache entry for the given project file.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        The .tsproj or .tmc file.
+
+    Returns
+    -------
+    bool
+    """
+    try:
+        with open(get_cache_filename(filename), 'rb') as f:
+            return not _get_stale_dependencies(f)
+    except Exception:
+        return False
+
+
+def load(filename):
+    """
+    Load a parsed project from the cache.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        The .tsproj or .tmc file.
+
+    Returns
+    -------
+    item : pytmc.parser.TwincatItem or None
+        None if there is no valid cache entry.
+    """
+    cache_filename = get_cache_filename(filename)
+    try:
+        with open(cache_filename, 'rb') as f:
+            stale = _get_stale_dependencies(f)
+            if stale:
+                logger.debug('Cache entry for %s is stale: %s', filename,
+                             stale)
+                return None
+
+            item = _unpickle_project(f)
+    except FileNotFoundError:
+        return None
+    except Exception as ex:
+        logger.warning('Removing unreadable cache entry %s (%s: %s)',
+                       cache_filename, type(ex).__name__, ex)
+        _remove(cache_filename)
+        return None
+
+    # Mark as recently used, for eviction purposes
+    os.utime(cache_filename)
+    logger.debug('Loaded %s from cache %s', filename, cache_filename)
+    return item
+
+
+def store(filename, item, *, max_size=None):
+    """
+    Store a parsed project in the cache.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        The .tsproj or .tmc file.
+
+    item : pytmc.parser.TwincatItem
+        The parsed project.
+
+    max_size : int, optional
+        Maximum total cache size in bytes.  Defaults to MAX_CACHE_SIZE.
+    """
+    buf = io.BytesIO()
+    pickler = _ProjectPickler(buf, protocol=pickle.HIGHEST_PROTOCOL)
+    try:
+        pickler.dump(item)
+    except Exception as ex:
+        logger.warning('Unable to cache %s (%s: %s)', filename,
+                       type(ex).__name__, ex)
+        return
+
+    dependencies = {
+        dep: _file_signature(dep) for dep in sorted(pickler.dependencies)
+    }
+    dependencies[str(pathlib.Path(filename).resolve())] = _file_signature(
+        filename)
+
+    cache_filename = get_cache_filename(filename)
+    CACHE_PATH.mkdir(parents=True, exist_ok=True)
+    fd, temp_filename = tempfile.mkstemp(dir=CACHE_PATH, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(dependencies, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.write(buf.getbuffer())
+        os.replace(temp_filename, cache_filename)
+    except OSError as ex:
+        logger.warning('Unable to write cache entry %s (%s)', cache_filename,
+                       ex)
+        _remove(temp_filename)
+        return
+
+    logger.debug('Cached %s in %s (%d bytes)', filename, cache_filename,
+                 buf.tell())
+    try:
+        evict(max_size=max_size)
+    except OSError as ex:
+        logger.warning('Unable to evict cache entries (%s)', ex)
+
+
+def parse(filename, *, use_cache=True):
+    """
+    Parse a tsproj/tmc file with pytmc, using the on-disk cache if possible.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        The .tsproj or .tmc file.
+
+    use_cache : bool, optional
+        Load from and store to the cache.  If False, always parse.
+
+    Returns
+    -------
+    item : pytmc.parser.TwincatItem
+    """
+    if not use_cache:
+        return pytmc_parser.parse(filename)
+
+    item = load(filename)
+    if item is None:
+        item = pytmc_parser.parse(filename)
+        store(filename, item)
+    return item
+
+
+def dumps(item):
+    """Serialize a parsed project, e.g., to pass it between processes."""
+    buf = io.BytesIO()
+    _ProjectPickler(buf, protocol=pickle.HIGHEST_PROTOCOL).dump(item)
+    return buf.getvalue()
+
+
+def loads(data):
+    """Deserialize a parsed project from :func:`dumps`."""
+    return _unpickle_project(io.BytesIO(data))
+
+
+def _parse_in_worker(filename, use_cache):
+    item = parse(filename, use_cache=use_cache)
+    if not use_cache:
+        return dumps(item)
+    # Otherwise, the parent process loads it from the freshly-populated cache
+
+
+def parse_all(filenames, *, use_cache=True, jobs=1):
+    """
+    Parse several tsproj/tmc files, optionally in worker processes.
+
+    Parameters
+    ----------
+    filenames : list of str or pathlib.Path
+        The .tsproj or .tmc files.
+
+    use_cache : bool, optional
+        Load from and store to the cache.  If False, always parse.
+
+    jobs : int, optional
+        Number of worker processes.  See :func:`ads_deploy.util.run_jobs`.
+
+    Yields
+    ------
+    item : pytmc.parser.TwincatItem
+        The parsed projects, in the order of ``filenames``.
+    """
+    filenames = list(filenames)
+    # Only files which are not already cached are worth sending to workers
+    to_parse = [
+        filename for filename in filenames
+        if not use_cache or not is_cached(filename)
+    ]
+    if jobs == 1 or len(to_parse) <= 1:
+        for filename in filenames:
+            yield parse(filename, use_cache=use_cache)
+        return
+
+    futures = dict(zip(
+        to_parse,
+        util.run_jobs(_parse_in_worker,
+                      [(filename, use_cache) for filename in to_parse],
+                      jobs=jobs)
+    ))
+    for filename in filenames:
+        data = futures[filename].result() if filename in futures else None
+        if data is None:
+            yield parse(filename, use_cache=use_cache)
+        else:
+            yield loads(data)
+
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except OSError:
+        ...
+
+
+def get_entries():
+    """
+    Get all cache entries, least recently used first.
+
+    Returns
+    -------
+    list of (pathlib.Path, os.stat_result)
+    """
+    if not CACHE_PATH.exists():
+        return []
+
+    entries = []
+    for path in CACHE_PATH.glob(f'*{CACHE_SUFFIX}'):
+        try:
+            entries.append((path, path.stat()))
+        except FileNotFoundError:
+            # Evicted or replaced by another process (e.g., --jobs workers)
+            continue
+    return sorted(entries, key=lambda entry: entry[1].st_mtime_ns)
+
+
+def evict(max_size=None):
+    """
+    Remove least recently used entries until the cache fits in ``max_size``.
+
+    Parameters
+    ----------
+    max_size : int, optional
+        Maximum total cache size in bytes.  Defaults to MAX_CACHE_SIZE.
+    """
+    if max_size is None:
+        max_size = MAX_CACHE_SIZE
+
+    entries = get_entries()
+    total_size = sum(stat.st_size for _, stat in entries)
+    for path, stat in entries:
+        if total_size <= max_size:
+            break
+        logger.debug('Evicting cache entry %s', path)
+        _remove(path)
+        total_size -= stat.st_size
+
+
+def clear():
+    """Remove all cache entries."""
+    for path, _ in get_entries():
+        _remove(path)
+
+
+def get_stats():
+    """
+    Get cache statistics.
+
+    Returns
+    -------
+    dict
+        With keys "path", "entries", "size", and "max_size".
+    """
+    entries = get_entries()
+    return dict(
+        path=CACHE_PATH,
+        entries=len(entries),
+        size=sum(stat.st_size for _, stat in entries),
+        max_size=MAX_CACHE_SIZE,
+    )
+
+
+def main(action):
+    if action == 'clear':
+        count = len(get_entries())
+        clear()
+        print(f'Removed {count} cache entries from "{CACHE_PATH}".')
+    elif action == 'stats':
+        stats = get_stats()
+        print(f'Cache path: {stats["path"]}')
+        print(f'Entries:    {stats["entries"]}')
+        print(f'Size:       {stats["size"] / 1024 ** 2:.1f} MiB')
+        print(f'Max size:   {stats["max_size"] / 1024 ** 2:.1f} MiB')
@@ -0,0 +1,393 @@
+"""
+Generation of standalone Python modules for `ads-deploy caproto` mock IOCs.
+
+With ``--codegen``, the PVGroup classes (or, with ``--lazy``, the record
+tables) and motion stages of a mock IOC are written to a module in the cache
+directory, keyed by the project and the command-line options which affect its
+records.  The module records the SHA-256 hashes of the files it was generated
+from (solution, .tsproj, .xti, .plcproj and .tmc); while those are unchanged, later
+starts import the module directly rather than parsing the project with pytmc.
+"""
+
+import hashlib
+import importlib.util
+import json
+import keyword
+import logging
+import os
+import pathlib
+import sys
+import tempfile
+
+import caproto
+import numpy
+from pytmc import parser as pytmc_parser
+
+from . import __version__, cache, caproto_ioc, util
+
+logger = logging.getLogger(__name__)
+
+# Bump this when the layout of generated modules changes
+CODEGEN_VERSION = 5
+CODEGEN_PATH = cache.CACHE_PATH / 'caproto'
+DEPENDENCY_HEADER = '# dependencies: '
+
+
+def get_module_filename(project, *, plcs=None, macros=None, includes=None,
+                        excludes=None, lazy=False):
+    """
+    Get the generated module filename for a project and set of options.
+
+    Parameters
+    ----------
+    project : str or pathlib.Path
+        The .sln or .tsproj file.
+
+    plcs : list of str, optional
+        The PLCs to include, defaulting to all.
+
+    macros : dict, optional
+        Macros for the record names.
+
+    includes : list of str, optional
+        Include signals by name.
+
+    excludes : list of str, optional
+        Exclude signals by name.
+
+    lazy : bool, optional
+        Generate record tables for lazy PV databases, rather than PVGroups.
+
+    Returns
+    -------
+    pathlib.Path
+    """
+    project = pathlib.Path(project).resolve()
+    key = json.dumps(
+        [CODEGEN_VERSION, __version__, str(caproto.__version__),
+         str(project), sorted(plcs or []), sorted((macros or {}).items()),
+         includes or [], excludes or [], bool(lazy)]
+    )
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    stem = util.pvname_to_attribute(project.stem).lstrip('_')
+    return CODEGEN_PATH / f'{stem}_{digest}.py'
+
+
+def hash_file(filename):
+    """SHA-256 hash of a file, or None if it does not exist."""
+    try:
+        with open(filename, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def get_dependencies(project, parsed_projects):
+    """
+    Get the files which determine the records of a project.
+
+    Parameters
+    ----------
+    project : str or pathlib.Path
+        The .sln or .tsproj file.
+
+    parsed_projects : list of pytmc.parser.TcSmProject
+        The parsed .tsproj projects.
+
+    Returns
+    -------
+    dict
+        File name to SHA-256 hash.
+    """
+    filenames = {pathlib.Path(project).resolve()}
+    for tsproj in parsed_projects:
+        filenames.add(pathlib.Path(tsproj.filename).resolve())
+        # Including the .xti files of boxes and PLCs
+        filenames.update(
+            pathlib.Path(item.filename).resolve()
+            for item in tsproj.find(pytmc_parser.TwincatItem)
+            if item.filename is not None
+        )
+        for plc in tsproj.plcs:
+            filenames.add(pathlib.Path(plc.project_path).resolve())
+            filenames.add(pathlib.Path(plc.tmc_path).resolve())
+
+    return {
+        str(filename): hash_file(filename)
+        for filename in sorted(filenames)
+    }
+
+
+def get_stale_dependencies(filename):
+    """
+    Check the dependencies recorded in a generated module for changes.
+
+    Returns
+    -------
+    list of str or None
+        The changed files, or None if the module does not exist or has no
+        dependency header.
+    """
+    try:
+        with open(filename, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith(DEPENDENCY_HEADER):
+                    dependencies = json.loads(line[len(DEPENDENCY_HEADER):])
+                    break
+            else:
+                return None
+    except (OSError, ValueError):
+        return None
+
+    return [
+        dep for dep, sha256 in dependencies.items()
+        if hash_file(dep) != sha256
+    ]
+
+
+def _module_name(filename):
+    return f'ads_deploy_mock_ioc_{pathlib.Path(filename).stem}'
+
+
+def import_module(filename):
+    """Import a generated module from its filename."""
+    name = _module_name(filename)
+    spec = importlib.util.spec_from_file_location(name, filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+def load_module(filename):
+    """
+    Import a generated module, if it is up-to-date.
+
+    Returns
+    -------
+    module or None
+        None if the module does not exist, is out of date, or fails to
+        import.
+    """
+    stale = get_stale_dependencies(filename)
+    if stale is None:
+        return None
+    if stale:
+        logger.info('Regenerating the mock IOC module; changed: %s',
+                    ', '.join(stale))
+        return None
+
+    try:
+        module = import_module(filename)
+    except Exception as ex:
+        logger.warning('Unable to import generated module %s (%s: %s)',
+                       filename, type(ex).__name__, ex)
+        return None
+
+    logger.debug('Loaded mock IOC module %s', filename)
+    return module
+
+
+def _class_name(ioc_name, used):
+    name = util.pvname_to_attribute(ioc_name).lstrip('_') or 'PLC'
+    if not name.isidentifier() or keyword.iskeyword(name):
+        name = 'PLC_' + ''.join(c if c.isalnum() else '_' for c in name)
+    base, idx = name, 1
+    while name in used:
+        idx += 1
+        name = f'{base}_{idx}'
+    used.add(name)
+    return name
+
+
+def _attribute(attr):
+    """Attribute name usable in a class body, or None."""
+    if not attr.isidentifier() or attr.startswith('_'):
+        # These are not PVGroup attributes in any case
+        return None
+    if keyword.iskeyword(attr):
+        return attr + '_'
+    return attr
+
+
+def _value_source(value):
+    """Source for the initial value of a record."""
+    if not isinstance(value, numpy.ndarray):
+        return repr(value)
+    dtype = repr(value.dtype.str)
+    if len(value) and (value == value[0]).all():
+        return f'numpy.full({len(value)}, {value[0].item()!r}, dtype={dtype})'
+    return f'numpy.array({value.tolist()!r}, dtype={dtype})'
+
+
+def _ioc_class_source(ioc_name, class_name, record_pairs, default_values):
+    hook_attr, hook_pvname = caproto_ioc.get_startup_hook_attribute(ioc_name)
+    lines = [
+        f'class {class_name}(PVGroup):',
+        f'    ioc_name = {ioc_name!r}',
+        '    # Set by prepare_startup_fields and the startup hook:',
+        '    startup_writes = None',
+        '    startup_failures = []',
+        '    init_concurrency = DEFAULT_INIT_CONCURRENCY',
+        '    put_forwarder = None',
+        '    ready_time = None',
+        '',
+        f'    {_attribute(hook_attr) or "startup_hook"} = pvproperty(',
+        f'        name={hook_pvname!r}, value=0.0, startup=startup_hook)',
+    ]
+
+    startup_fields = {}
+    records = []
+
+    def add_pvproperty(attr, record, put=None):
+        put = f', put=forward_put({put!r})' if put else ''
+        value = caproto_ioc.get_initial_value(record, default_values)
+        data_type = caproto_ioc.get_data_type(record)
+        dtype = (f', dtype=ChannelType.{data_type.name}'
+                 if data_type is not None else '')
+        lines.append(
+            f'    {attr} = pvproperty(\n'
+            f'        name={record.pvname!r}, value={_value_source(value)},\n'
+            f'        record={record.record_type!r}{dtype}{put})'
+        )
+        startup_fields[attr] = caproto_ioc.get_startup_fields(record)
+        records.append(record)
+
+    for (input_attr, input_record, output_attr,
+         output_record) in caproto_ioc.iter_record_attributes(record_pairs):
+        input_attr = _attribute(input_attr)
+        if input_attr is None:
+            continue
+        if output_record and _attribute(output_attr):
+            add_pvproperty(_attribute(output_attr), output_record,
+                           put=input_attr)
+        add_pvproperty(input_attr, input_record)
+
+    lines.append('')
+    lines.append('    startup_fields = {')
+    lines.extend(f'        {attr!r}: {fields!r},'
+                 for attr, fields in startup_fields.items())
+    lines.append('    }')
+    lines.append('    aliases = {')
+    lines.extend(f'        {alias!r}: {pvname!r},'
+                 for alias, pvname in caproto_ioc.get_aliases(records).items())
+    lines.append('    }')
+    return '\n'.join(lines)
+
+
+def generate_module_source(project, record_pairs_by_ioc, dependencies, *,
+                           motors=None, lazy=False, default_values=None):
+    """
+    Generate the source of a mock IOC module.
+
+    Parameters
+    ----------
+    project : str or pathlib.Path
+        The .sln or .tsproj file.
+
+    record_pairs_by_ioc : dict
+        IOC (PLC) name to a list of (input_record, output_record) pairs, as
+        from :func:`ads_deploy.caproto_ioc.record_pairs_from_plc`.
+
+    dependencies : dict
+        From :func:`get_dependencies`.
+
+    motors : dict, optional
+        IOC (PLC) name to a list of motion stage PV prefixes, written to
+        ``MOTORS``.
+
+    lazy : bool, optional
+        Generate ``RECORD_TABLES`` for lazy PV databases rather than the
+        ``IOCS`` PVGroup classes.
+
+    default_values : dict, optional
+        A mapping of record_type to default value.
+
+    Returns
+    -------
+    str
+    """
+    lines = [
+        '"""',
+        f'Mock IOC for {pathlib.Path(project).name}, generated by ads-deploy '
+        f'{__version__}.',
+        '',
+        'Do not edit; this is regenerated whenever the project changes.',
+        '"""',
+        DEPENDENCY_HEADER + json.dumps(dependencies),
+        '',
+    ]
+    motors_source = ['MOTORS = {']
+    motors_source.extend(f'    {ioc_name!r}: {prefixes!r},'
+                         for ioc_name, prefixes in (motors or {}).items())
+    motors_source.append('}')
+
+    if lazy:
+        lines.extend([
+            'from ads_deploy.util import SimpleRecord',
+            '',
+            'RECORD_TABLES = {',
+        ])
+        for ioc_name, record_pairs in record_pairs_by_ioc.items():
+            lines.append(f'    {ioc_name!r}: {{')
+            lines.extend(
+                f'        {pvname!r}: {entry!r},'
+                for pvname, entry in caproto_ioc.get_record_table(
+                    record_pairs).items()
+            )
+            lines.append('    },')
+        lines.append('}')
+        lines.append('')
+        lines.extend(motors_source)
+        return '\n'.join(lines) + '\n'
+
+    lines.extend([
+        'import numpy',
+        'from caproto import ChannelType',
+        'from caproto.server import PVGroup, pvproperty',
+        '',
+        'from ads_deploy.caproto_ioc import (DEFAULT_INIT_CONCURRENCY,',
+        '                                    forward_put, startup_hook)',
+        '',
+    ])
+
+    class_names = {}
+    for ioc_name, record_pairs in record_pairs_by_ioc.items():
+        class_names[ioc_name] = _class_name(ioc_name, set(class_names.values()))
+        lines.extend([
+            '',
+            _ioc_class_source(ioc_name, class_names[ioc_name], record_pairs,
+                              default_values),
+            '',
+        ])
+
+    lines.append('')
+    lines.append('IOCS = {')
+    lines.extend(f'    {ioc_name!r}: {class_name},'
+                 for ioc_name, class_name in class_names.items())
+    lines.append('}')
+    lines.append('')
+    lines.extend(motors_source)
+    return '\n'.join(lines) + '\n'
+
+
+def write_module(filename, source):
+    """Atomically write a generated module."""
+    filename = pathlib.Path(filename)
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_filename = tempfile.mkstemp(dir=filename.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wt', encoding='utf-8') as f:
+            f.write(source)
+        os.replace(temp_filename, filename)
+    except OSError:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            ...
+        raise
+    logger.debug('Wrote mock IOC module %s (%d bytes)', filename, len(source))
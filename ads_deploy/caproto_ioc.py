@@ -4,20 +4,67 @@ a TwinCAT solution (or tsproj project).
 """
 
 import argparse
+import asyncio
+import collections
+import collections.abc
+import datetime
+import functools
 import logging
-import threading
+import signal
 import time
+import weakref
 
-import pytmc
+import caproto
+import numpy
+from caproto.asyncio.server import Context
 from caproto.server import PVGroup, pvproperty
-from caproto.server import run as caproto_run
 from caproto.server import template_arg_parser
+from pytmc.bin.db import process
 
-from . import typhos_gui, util
+from . import (cache, caproto_codegen, caproto_shards, motion_sim,
+               put_forwarding, pvsnapshot, pvstats, pvtrace, util)
 
 DESCRIPTION = __doc__
 logger = logging.getLogger(__name__)
 
+# Maximum number of record fields written concurrently at startup
+DEFAULT_INIT_CONCURRENCY = 64
+# Yield to the event loop after this many field writes
+INIT_BATCH_SIZE = 256
+# Seconds between summaries of the field failures of lazily-created PVs
+FIELD_FAILURE_INTERVAL = 60.0
+
+DEFAULT_VALUES = {
+    'ai': 0.0,
+    'ao': 0.0,
+    'bi': 0,
+    'bo': 0,
+    'calc': 0,
+    'longin': 0,
+    'longout': 0,
+    'stringin': "",
+    'stringout': "",
+    'mbbi': 0,
+    'mbbo': 0,
+    'waveform': {
+        'CHAR': 'unset',
+        'SHORT': [0],
+        'LONG': [0],
+        'FLOAT': [0.],
+        'DOUBLE': [0.],
+    }
+}
+
+# Waveform FTVL to (CA data type, NumPy dtype).  Arrays are stored in the
+# big-endian wire format, such that values put by clients are used as-is and
+# reads need no byte swapping.
+WAVEFORM_TYPES = {
+    'SHORT': (caproto.ChannelType.INT, numpy.dtype('>i2')),
+    'LONG': (caproto.ChannelType.LONG, numpy.dtype('>i4')),
+    'FLOAT': (caproto.ChannelType.FLOAT, numpy.dtype('>f4')),
+    'DOUBLE': (caproto.ChannelType.DOUBLE, numpy.dtype('>f8')),
+}
+
 
 def build_arg_parser(parser=None):
     if parser is None:
@@ -60,11 +107,547 @@ def build_arg_parser(parser=None):
         help='Specify one or more PLC names to generate'
     )
 
+    parser.add_argument(
+        '--single-server',
+        action='store_true',
+        help='Serve all PLCs from a single server, rather than one per PLC'
+    )
+
+    parser.add_argument(
+        '--shards',
+        type=int,
+        default=1,
+        help=('Split the records across this many server processes, '
+              'supervised by this one.\nClients must search for PVs by '
+              'broadcast (e.g., EPICS_CA_ADDR_LIST=127.255.255.255\nfor '
+              'localhost), as all servers share the UDP search port '
+              '[default: 1]')
+    )
+
+    parser.add_argument(
+        '--shard-by',
+        choices=caproto_shards.PARTITIONS,
+        default='hash',
+        help=('With --shards, split the records by a stable hash of the PV '
+              'name, or by PLC\n[default: hash]')
+    )
+
+    parser.add_argument(
+        '--lazy',
+        action='store_true',
+        help='Create PVs when first searched for, rather than at startup'
+    )
+
+    parser.add_argument(
+        '--idle-timeout',
+        type=float,
+        default=None,
+        help=('With --lazy, release PVs which have not been searched for in '
+              'this many seconds')
+    )
+
+    parser.add_argument(
+        '--init-concurrency',
+        type=int,
+        default=DEFAULT_INIT_CONCURRENCY,
+        help=('Maximum number of record fields to initialize concurrently '
+              f'[default: {DEFAULT_INIT_CONCURRENCY}]')
+    )
+
+    parser.add_argument(
+        '--simulate-motion',
+        action='store_true',
+        help=('Serve DUT_MotionStage axes as simulated motor records at their '
+              'PV prefix')
+    )
+
+    parser.add_argument(
+        '--motion-tick-rate',
+        type=float,
+        default=motion_sim.DEFAULT_TICK_RATE,
+        help=('Updates per second of the motion simulation '
+              f'[default: {motion_sim.DEFAULT_TICK_RATE}]')
+    )
+
+    parser.add_argument(
+        '--replay',
+        type=str,
+        metavar='FILE',
+        help='Replay a PV trace file into the IOC'
+    )
+
+    parser.add_argument(
+        '--replay-speed',
+        type=float,
+        default=1.0,
+        help=('Replay speed relative to the recorded rate, or 0 for as fast '
+              'as possible\n[default: 1.0]')
+    )
+
+    parser.add_argument(
+        '--record',
+        type=str,
+        metavar='FILE',
+        help=('Record the values put by clients to a PV trace file (with '
+              '--shards, one\nfile per shard), keeping up to '
+              f'{pvtrace.MAX_RECORDED_SAMPLES} puts')
+    )
+
+    parser.add_argument(
+        '--snapshot',
+        type=str,
+        metavar='FILE',
+        help=('Write the record values to a snapshot file periodically, on '
+              'shutdown and on\ndemand (with --shards, one file per shard)')
+    )
+
+    parser.add_argument(
+        '--snapshot-interval',
+        type=float,
+        default=pvsnapshot.SNAPSHOT_INTERVAL,
+        metavar='SECONDS',
+        help=('Seconds between snapshots, or 0 for only on demand and on '
+              f'shutdown\n[default: {pvsnapshot.SNAPSHOT_INTERVAL}]')
+    )
+
+    parser.add_argument(
+        '--snapshot-prefix',
+        type=str,
+        default=pvsnapshot.DEFAULT_PREFIX,
+        help=('Prefix of the PVs for taking snapshots on demand (with '
+              '--shards, followed by\nSHARDn:) '
+              f'[default: {pvsnapshot.DEFAULT_PREFIX}]')
+    )
+
+    parser.add_argument(
+        '--restore',
+        type=str,
+        action='append',
+        metavar='FILE',
+        help=('Restore record values from a snapshot (or the last values of '
+              'a PV trace)\nbefore serving them (may be repeated, e.g., for '
+              'the files of each shard)')
+    )
+
+    parser.add_argument(
+        '--coalesce-window',
+        type=float,
+        default=0.0,
+        metavar='SECONDS',
+        help=('Forward puts to output records to their input record at most '
+              'once per\nwindow, holding back only the latest value '
+              '[default: 0, forward all]')
+    )
+
+    parser.add_argument(
+        '--coalesce',
+        type=put_forwarding.parse_window,
+        action='append',
+        metavar='GLOB=SECONDS',
+        help=('Coalescing window for output records matching a PV name '
+              'glob, overriding\n--coalesce-window (may be repeated; the '
+              'first match is used)')
+    )
+
+    parser.add_argument(
+        '--max-forward-rate',
+        type=float,
+        metavar='RATE',
+        help=('Maximum number of puts per second forwarded from output to '
+              'input records,\nover all records')
+    )
+
+    parser.add_argument(
+        '--stats',
+        action='store_true',
+        help=('Count reads, puts and subscriptions per PV, and serve summary '
+              'PVs of them')
+    )
+
+    parser.add_argument(
+        '--stats-prefix',
+        type=str,
+        default=pvstats.DEFAULT_PREFIX,
+        help=('Prefix of the summary PVs (with --shards, followed by '
+              f'SHARDn:)\n[default: {pvstats.DEFAULT_PREFIX}]')
+    )
+
+    parser.add_argument(
+        '--stats-top',
+        type=int,
+        default=pvstats.DEFAULT_TOP,
+        help=('Number of PVs listed by the TOP_* summary PVs '
+              f'[default: {pvstats.DEFAULT_TOP}]')
+    )
+
+    parser.add_argument(
+        '--stats-file',
+        type=str,
+        metavar='FILE',
+        help=('Write the statistics to an OpenMetrics text file (implies '
+              '--stats; with\n--shards, one file per shard)')
+    )
+
+    parser.add_argument(
+        '--stats-interval',
+        type=float,
+        default=pvstats.DUMP_INTERVAL,
+        help=('Seconds between writes of the statistics file '
+              f'[default: {pvstats.DUMP_INTERVAL}]')
+    )
+
+    parser.add_argument(
+        '--codegen',
+        action='store_true',
+        help=('Generate a Python module for the IOC in the cache and, while '
+              'the project is\nunchanged, import it on later starts rather '
+              'than parsing the project')
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help=('Do not use the cache of parsed projects (or, with --codegen, '
+              'a previously\ngenerated module)')
+    )
+
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help=('Number of worker processes for processing PLC projects '
+              '(0 for one per CPU) [default: 1]')
+    )
+
     return parser
 
 
+def get_initial_value(record, default_values=None):
+    """
+    Get the initial value for a record, based on its type and VAL field.
+
+    Numeric waveforms are NumPy arrays of NELM elements, with the dtype from
+    :data:`WAVEFORM_TYPES`.
+
+    Parameters
+    ----------
+    record : SimpleRecord
+        The record.
+
+    default_values : dict, optional
+        A mapping of record_type to default value.  Defaults to
+        DEFAULT_VALUES.
+    """
+    if default_values is None:
+        default_values = DEFAULT_VALUES
+
+    default_value = default_values.get(record.record_type, 0)
+    if record.record_type == 'waveform':
+        ftvl = record.fields.get('FTVL', 'SHORT')
+        default_value = default_value[ftvl]
+        if ftvl in WAVEFORM_TYPES:
+            nelm = int(record.fields.get('NELM', 1))
+            _, dtype = WAVEFORM_TYPES[ftvl]
+            if 'VAL' in record.fields:
+                default_value = [record.fields['VAL']]
+            return numpy.resize(default_value, nelm).astype(dtype)
+
+    if 'VAL' in record.fields:
+        return type(default_value)(record.fields['VAL'])
+    return default_value
+
+
+def get_data_type(record):
+    """
+    Get the CA data type for a record, if not implied by its initial value.
+
+    Returns
+    -------
+    caproto.ChannelType or None
+    """
+    if record.record_type == 'waveform':
+        ftvl = record.fields.get('FTVL', 'SHORT')
+        if ftvl in WAVEFORM_TYPES:
+            data_type, _ = WAVEFORM_TYPES[ftvl]
+            return data_type
+    return None
+
+
+def get_startup_fields(record):
+    """Get the fields of a record to write once its ChannelData exists."""
+    return {
+        field_name: value
+        for field_name, value in record.fields.items()
+        if field_name != 'VAL'
+    }
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+
+_FIELD_CONVERTERS = [
+    ((caproto.ChannelDouble, caproto.ChannelFloat), float),
+    ((caproto.ChannelInteger, caproto.ChannelShort), _to_int),
+    ((caproto.ChannelChar, caproto.ChannelString), str),
+]
+
+
+def convert_field_value(field, value):
+    """Convert a (string) field value from pytmc to the field's data type."""
+    for classes, converter in _FIELD_CONVERTERS:
+        if isinstance(field, classes):
+            return converter(value)
+    return value
+
+
+def prepare_field_writes(records):
+    """
+    Look up and convert record field values ahead of writing them.
+
+    Parameters
+    ----------
+    records : iterable of (ChannelData, dict)
+        Records and their field values.
+
+    Returns
+    -------
+    writes : list of (ChannelData, str, ChannelData, value)
+        The record, field name, field and converted value.
+
+    failures : list of (str, str, value, Exception)
+        The PV name, field name, value and exception for fields which do not
+        exist or where the value could not be converted.
+    """
+    writes = []
+    failures = []
+    for channeldata, fields in records:
+        for field_name, value in fields.items():
+            try:
+                field = channeldata.get_field(field_name)
+                value = convert_field_value(field, value)
+            except Exception as ex:
+                failures.append((channeldata.pvname, field_name, value, ex))
+            else:
+                writes.append((channeldata, field_name, field, value))
+    return writes, failures
+
+
+async def write_field_values(writes, *, concurrency=DEFAULT_INIT_CONCURRENCY):
+    """
+    Write prepared field values, with at most ``concurrency`` in progress.
+
+    Parameters
+    ----------
+    writes : list
+        From :func:`prepare_field_writes`.
+
+    concurrency : int, optional
+        Maximum number of writes in progress at once.
+
+    Returns
+    -------
+    failures : list of (str, str, value, Exception)
+        The PV name, field name, value and exception for failed writes.
+    """
+    failures = []
+    pending = iter(writes)
+
+    async def worker():
+        for count, (channeldata, field_name, field, value) in enumerate(
+                pending, 1):
+            try:
+                await field.write(value)
+            except Exception as ex:
+                failures.append((channeldata.pvname, field_name, value, ex))
+            if count % INIT_BATCH_SIZE == 0:
+                # Let the server handle requests in the meantime
+                await asyncio.sleep(0)
+
+    await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    return failures
+
+
+def log_field_failures(name, failures, total, *, level=logging.WARNING):
+    """
+    Summarize field initialization failures in one message, logged at
+    ``level``.
+
+    Individual failures are logged at the debug level.
+    """
+    for pvname, field_name, value, ex in failures:
+        logger.debug('Failed to set initial value for: %s.%s => %s (%s)',
+                     pvname, field_name, value, ex)
+
+    if not failures:
+        return
+
+    logger.log(
+        level, '%s: failed to set %d of %d initial field values: %s', name,
+        len(failures), total,
+        format_failure_counts(count_field_failures(failures))
+    )
+
+
+def count_field_failures(failures):
+    """Count field failures by field name and exception type name."""
+    return collections.Counter(
+        (field_name, type(ex).__name__)
+        for _, field_name, _, ex in failures
+    )
+
+
+def format_failure_counts(counts):
+    """Format counts from :func:`count_field_failures`, most common first."""
+    return ', '.join(f'{field_name} ({ex_name}) x{count}'
+                     for (field_name, ex_name), count in counts.most_common())
+
+
+def prepare_startup_fields(group):
+    """
+    Prepare the startup field writes of an IOC from
+    :func:`create_ioc_from_records`, ahead of serving it.
+    """
+    group.startup_writes, group.startup_failures = prepare_field_writes(
+        (getattr(group, attr), fields)
+        for attr, fields in group.startup_fields.items()
+    )
+
+
+def get_aliases(records):
+    """
+    Get the aliases of records.
+
+    Parameters
+    ----------
+    records : iterable of SimpleRecord
+
+    Returns
+    -------
+    dict
+        Alias to record PV name.
+    """
+    aliases = {}
+    for record in records:
+        for alias in record.aliases:
+            if alias in aliases and aliases[alias] != record.pvname:
+                logger.warning('Alias %s of %s is also an alias of %s; '
+                               'ignoring it', alias, record.pvname,
+                               aliases[alias])
+                continue
+            aliases[alias] = record.pvname
+    return aliases
+
+
+def add_aliases(pvdb, aliases):
+    """
+    Add aliases to a PV database, sharing the ChannelData of their record.
+
+    Aliases which clash with a PV, or whose record is not in the database,
+    are skipped with a warning.
+
+    Returns
+    -------
+    int
+        The number of aliases added.
+    """
+    added = 0
+    for alias, pvname in aliases.items():
+        if alias in pvdb:
+            logger.warning('Alias %s of %s clashes with an existing PV; '
+                           'ignoring it', alias, pvname)
+        elif pvname not in pvdb:
+            logger.warning('Record %s of alias %s is not in the database',
+                           pvname, alias)
+        else:
+            pvdb[alias] = pvdb[pvname]
+            added += 1
+    return added
+
+
+async def startup_hook(group, instance, async_lib):
+    """
+    The startup hook of IOCs from :func:`create_ioc_from_records`, which
+    writes all field defaults.
+
+    Once done, the time is written to the hook PV and ``ready_time``.
+    """
+    t0 = time.monotonic()
+    if group.startup_writes is None:
+        prepare_startup_fields(group)
+
+    failures = list(group.startup_failures)
+    failures.extend(
+        await write_field_values(group.startup_writes,
+                                 concurrency=group.init_concurrency)
+    )
+    total = len(group.startup_writes) + len(group.startup_failures)
+    log_field_failures(group.ioc_name, failures, total)
+
+    group.ready_time = time.time()
+    await instance.write(group.ready_time)
+    logger.info(
+        '%s: initialized %d record fields in %.2f s; ready at %s',
+        group.ioc_name, total - len(failures), time.monotonic() - t0,
+        datetime.datetime.fromtimestamp(group.ready_time).isoformat()
+    )
+
+
+def forward_put(input_attr):
+    """
+    Get a putter which writes output record values to their input.
+
+    The value is passed on as-is, so output and input records share the same
+    array rather than each holding a copy.  If the group has a
+    ``put_forwarder``, that coalesces or rate-limits the writes.
+    """
+    async def output_putter(group, instance, value):
+        target = getattr(group, input_attr)
+        if group.put_forwarder is None:
+            await target.write(value)
+        else:
+            await group.put_forwarder.forward(instance.pvname, target, value)
+
+    return output_putter
+
+
+def get_startup_hook_attribute(ioc_name):
+    """Get the startup hook (attribute, PV name) for an IOC."""
+    # PVGroup ignores attributes starting with an underscore
+    return 'startup_hook_' + ioc_name, '_startup_hook_' + ioc_name
+
+
+def iter_record_attributes(record_pairs):
+    """
+    Get the attribute names of records for use in a PVGroup.
+
+    Records without a valid attribute name are skipped.
+
+    Yields
+    ------
+    input_attr : str
+    input_record : SimpleRecord
+    output_attr : str or None
+    output_record : SimpleRecord or None
+    """
+    for input_record, output_record in record_pairs:
+        input_attr = util.pvname_to_attribute(input_record.pvname)
+        if not input_attr:
+            continue
+
+        output_attr = None
+        if output_record:
+            output_attr = util.pvname_to_attribute(output_record.pvname)
+        yield (input_attr, input_record, output_attr or None,
+               output_record if output_attr else None)
+
+
 def create_ioc_from_records(record_pairs, *, class_name, default_values=None,
-                            base_class=None):
+                            base_class=None,
+                            init_concurrency=DEFAULT_INIT_CONCURRENCY):
     '''
     Create an mock-record caproto IOC from a PLC project.
 
@@ -81,135 +664,621 @@ def create_ioc_from_records(record_pairs, *, class_name, default_values=None,
 
     base_class : class, optional
         Base for the IOC, defaults to PVGroup
-    '''
-    class_dict = {}
-
-    if default_values is None:
-        default_values = {
-            'ai': 0.0,
-            'ao': 0.0,
-            'bi': 0,
-            'bo': 0,
-            'calc': 0,
-            'longin': 0,
-            'longout': 0,
-            'stringin': "",
-            'stringout': "",
-            'mbbi': 0,
-            'mbbo': 0,
-            'waveform': {
-                'CHAR': 'unset',
-                'SHORT': [0],
-                'LONG': [0],
-                'FLOAT': [0.],
-                'DOUBLE': [0.],
-            }
-        }
 
-    async def startup_hook(group, instance, async_lib):
-        '''
-        A startup hook which writes all field defaults
-        '''
-        for attr, fields in group.startup_fields.items():
-            prop = getattr(group, attr)
-            for field_name, value in fields.items():
-                field = prop.get_field(field_name)
-                try:
-                    await field.write(value)
-                except Exception as ex:
-                    logger.warning(
-                        'Failed to set initial value for: %s.%s => %s (%s)',
-                        attr, field_name, value, ex
-                    )
+    init_concurrency : int, optional
+        Maximum number of record fields to initialize concurrently.
+    '''
+    # Log under ads_deploy, rather than caproto.server.server
+    class_dict = {'__module__': __name__}
 
     # Fields to write during the startup hook
     startup_fields = {}
+    # Records created, for their aliases
+    records = []
 
-    class_dict['_startup_hook_' + class_name] = pvproperty(
-        name='_startup_hook_' + class_name,
-        value=0,
+    hook_attr, hook_pvname = get_startup_hook_attribute(class_name)
+    class_dict[hook_attr] = pvproperty(
+        name=hook_pvname,
+        value=0.0,
         startup=startup_hook,
     )
 
-    def create_pvproperty(attr, record):
-        startup_fields[attr] = {}
-        default_value = default_values.get(record.record_type, 0)
-        if record.record_type == 'waveform':
-            ftvl = record.fields.get('FTVL', 'SHORT')
-            nelm = int(record.fields.get('NELM', 1))
-            default_value = default_value[ftvl]
-            if ftvl != 'CHAR':
-                default_value = default_value * nelm
-
-        if 'VAL' in record.fields:
-            value = type(default_value)(record.fields['VAL'])
-        else:
-            value = default_value
-
+    def create_pvproperty(attr, record, put=None):
         prop = pvproperty(
             name=record.pvname,
-            value=value,
+            value=get_initial_value(record, default_values),
+            dtype=get_data_type(record),
             record=record.record_type,
+            put=put,
         )
 
-        for field_name, value in record.fields.items():
-            if field_name != 'VAL':
-                startup_fields[attr][field_name] = value
-
-        for alias_idx, alias in enumerate(record.aliases):
-            logger.debug('TODO - aliases: %s %s', record, alias)
-
+        startup_fields[attr] = get_startup_fields(record)
+        records.append(record)
         class_dict[attr] = prop
         return prop
 
-    for input_record, output_record in record_pairs:
-        output_prop = None
+    for (input_attr, input_record, output_attr,
+         output_record) in iter_record_attributes(record_pairs):
         if output_record:
-            output_attr = typhos_gui.pvname_to_attribute(output_record.pvname)
-            if output_attr:
-                output_prop = create_pvproperty(output_attr, output_record)
-
-        input_attr = typhos_gui.pvname_to_attribute(input_record.pvname)
-        if not input_attr:
-            continue
-
-        _ = create_pvproperty(input_attr, input_record)
-        if output_prop:
-            @output_prop.putter
-            async def output_putter(self, instance, value,
-                                    input_attr=input_attr):
-                input_prop = getattr(self, input_attr)
-                await input_prop.write(value)
+            create_pvproperty(output_attr, output_record,
+                              put=forward_put(input_attr))
+        create_pvproperty(input_attr, input_record)
 
     if base_class is None:
         base_class = (PVGroup, )
 
     ioc_class = type(class_name, base_class, class_dict)
+    ioc_class.ioc_name = class_name
     ioc_class.startup_fields = startup_fields
+    ioc_class.aliases = get_aliases(records)
+    # Set by prepare_startup_fields and the startup hook:
+    ioc_class.startup_writes = None
+    ioc_class.startup_failures = []
+    ioc_class.init_concurrency = init_concurrency
+    ioc_class.put_forwarder = None
+    ioc_class.ready_time = None
     return ioc_class
 
 
-def caproto_ioc_from_plc(plc_name, plc_project, macros, *, includes=None,
-                         excludes=None):
-    tmc = pytmc.parser.parse(plc_project.tmc_path)
-    packages, exceptions = typhos_gui.process(
+def get_record_table(record_pairs):
+    """
+    Get a compact table of records, for use with :class:`LazyPVDatabase`.
+
+    Parameters
+    ----------
+    record_pairs : list of (input_record, output_record)
+        Where each is :class:`ads_deploy.util.SimpleRecord` or None.
+
+    Returns
+    -------
+    dict
+        PV name to (record, linked_pvname), where output records link to
+        their input record, and the linked PV name is otherwise None.
+    """
+    table = {}
+    for input_record, output_record in record_pairs:
+        if not util.pvname_to_attribute(input_record.pvname):
+            continue
+        table[input_record.pvname] = (input_record, None)
+        if output_record and util.pvname_to_attribute(
+                output_record.pvname):
+            table[output_record.pvname] = (output_record, input_record.pvname)
+    return table
+
+
+def record_pairs_from_table(table):
+    """
+    Get (input_record, output_record) pairs from a record table.
+
+    This is the inverse of :func:`get_record_table`.
+    """
+    outputs = {
+        linked: record for record, linked in table.values()
+        if linked is not None
+    }
+    return [
+        (record, outputs.get(record.pvname))
+        for record, linked in table.values()
+        if linked is None
+    ]
+
+
+def convert_restored_value(current, value, max_length=None):
+    """
+    Convert a restored value (e.g., from a snapshot) to the type of a record.
+
+    Parameters
+    ----------
+    current : object
+        The current or initial value of the record.
+
+    value : object
+        The value to restore.
+
+    max_length : int, optional
+        Maximum number of array elements.
+
+    Raises
+    ------
+    TypeError
+        If the value does not fit the record, e.g., as its type changed.
+    """
+    if isinstance(current, numpy.ndarray):
+        if not isinstance(value, numpy.ndarray):
+            raise TypeError(f'Expected an array; got {type(value).__name__}')
+        return value[:max_length].astype(current.dtype, copy=False)
+    if isinstance(value, numpy.ndarray) or (isinstance(current, str) !=
+                                            isinstance(value, str)):
+        raise TypeError(f'Expected {type(current).__name__}; got '
+                        f'{type(value).__name__}')
+    return type(current)(value)
+
+
+def set_value(channeldata, value, timestamp=None):
+    """
+    Set the value of a record directly, without putting it.
+
+    This is for restoring values before the record is served: putters (such
+    as output record forwarding) are not called and no monitors are posted.
+    """
+    data = channeldata._data
+    data['value'] = convert_restored_value(
+        data['value'], value, getattr(channeldata, 'max_length', None) or None
+    )
+    if timestamp is not None:
+        data['timestamp'] = timestamp
+
+
+def _save_value(values, pvname, data):
+    values[pvname] = data['value']
+
+
+class LazyPVDatabase(collections.abc.MutableMapping):
+    """
+    A PV database which creates ChannelData when a PV is first searched for.
+
+    Until then, only the compact record table is kept.  Record fields are
+    written as the ChannelData is created.
+
+    With ``idle_timeout`` set, PVs which have not been looked up for that long
+    are released by :meth:`demote_idle`.  A released PV that is still in use
+    (e.g., by a connected client) remains available; otherwise, it is
+    recreated with its last value when next searched for.
+
+    Record aliases are looked up as their record, sharing its ChannelData.
+
+    Field failures of created PVs are summarized periodically by
+    :meth:`report_field_failures`, rather than for each PV.
+
+    Iteration and ``len`` include all records and aliases, whereas ``items``
+    and ``values`` only include PVs which currently exist.  The server uses the
+    latter to find startup hooks, which must not create all PVs.
+
+    Parameters
+    ----------
+    record_table : dict
+        From :func:`get_record_table`.
+
+    name : str, optional
+        Name used for logging.
+
+    default_values : dict, optional
+        A mapping of record_type to default value.
+
+    idle_timeout : float, optional
+        Time in seconds after which PVs which have not been looked up may be
+        released.
+
+    static_pvdb : dict, optional
+        PV name to ChannelData which always exist, such as simulated motors.
+
+    put_forwarder : ads_deploy.put_forwarding.PutForwarder, optional
+        Coalesce or rate-limit the writes of output record values to their
+        input.
+    """
+
+    def __init__(self, record_table, *, name='LazyPVDatabase',
+                 default_values=None, idle_timeout=None, static_pvdb=None,
+                 put_forwarder=None):
+        self.records = record_table
+        self.name = name
+        self.static_pvdb = dict(static_pvdb or {})
+        self.default_values = default_values
+        self.idle_timeout = idle_timeout
+        self.put_forwarder = put_forwarder
+        self.aliases = {}
+        for alias, pvname in get_aliases(
+                record for record, _ in record_table.values()).items():
+            if alias in record_table or alias in self.static_pvdb:
+                logger.warning('Alias %s of %s clashes with an existing PV; '
+                               'ignoring it', alias, pvname)
+            else:
+                self.aliases[alias] = pvname
+        group_class = type(name, (PVGroup, ), {'__module__': __name__})
+        self.group = group_class(prefix='', name=name)
+        self._pvdb = {}
+        self._last_access = {}
+        self._released = weakref.WeakValueDictionary()
+        self._released_values = {}
+        # Field write tasks are referenced until done
+        self._field_tasks = set()
+        self._field_failures = collections.Counter()
+        self._field_totals = collections.Counter()
+
+    def __getitem__(self, pvname):
+        try:
+            return self.static_pvdb[pvname]
+        except KeyError:
+            ...
+
+        pvname = self.aliases.get(pvname, pvname)
+        try:
+            channeldata = self._pvdb[pvname]
+        except KeyError:
+            channeldata = self._released.pop(pvname, None)
+            if channeldata is None:
+                channeldata = self._create(pvname)
+            self._pvdb[pvname] = channeldata
+
+        self._last_access[pvname] = time.monotonic()
+        return channeldata
+
+    def __setitem__(self, pvname, channeldata):
+        # The server caches "record.FIELD" lookups here
+        self._pvdb[pvname] = channeldata
+        self._last_access[pvname] = time.monotonic()
+
+    def __delitem__(self, pvname):
+        del self._pvdb[pvname]
+        self._last_access.pop(pvname, None)
+
+    def __contains__(self, pvname):
+        return (pvname in self.records or pvname in self._pvdb or
+                pvname in self.static_pvdb or pvname in self.aliases)
+
+    def __iter__(self):
+        yield from self.static_pvdb
+        yield from self.records
+        yield from self.aliases
+
+    def __len__(self):
+        return len(self.static_pvdb) + len(self.records) + len(self.aliases)
+
+    def items(self):
+        """Items of PVs which currently exist."""
+        return collections.ChainMap(self._pvdb, self.static_pvdb).items()
+
+    def values(self):
+        """ChannelData of PVs which currently exist."""
+        return collections.ChainMap(self._pvdb, self.static_pvdb).values()
+
+    def record_values(self):
+        """
+        Get the values of records which exist or have been released.
+
+        Returns
+        -------
+        dict
+            PV name to (value, timestamp), where the timestamp is None for
+            records which are not currently created.
+        """
+        values = {
+            pvname: (value, None)
+            for pvname, value in self._released_values.items()
+        }
+        for pvdb in (dict(self._released.items()), self._pvdb):
+            for pvname, channeldata in pvdb.items():
+                if pvname in self.records:
+                    values[pvname] = (channeldata.value,
+                                      channeldata.timestamp)
+        return values
+
+    def set_initial_values(self, values):
+        """
+        Set the values to create records with, e.g., restored from a snapshot.
+
+        Records which currently exist are set directly with :func:`set_value`.
+
+        Parameters
+        ----------
+        values : dict
+            PV name to (value, timestamp).
+
+        Returns
+        -------
+        failures : list of (str, value, Exception)
+            The PV name, value and exception for values which do not fit
+            their record.
+        """
+        failures = []
+        for pvname, (value, timestamp) in values.items():
+            try:
+                channeldata = self._pvdb.get(pvname)
+                if channeldata is None:
+                    channeldata = self._released.get(pvname)
+                if channeldata is not None:
+                    set_value(channeldata, value, timestamp)
+                    continue
+                record, _ = self.records[pvname]
+                initial = get_initial_value(record, self.default_values)
+                self._released_values[pvname] = convert_restored_value(
+                    initial, value, len(initial)
+                    if isinstance(initial, numpy.ndarray) else None)
+            except Exception as ex:
+                failures.append((pvname, value, ex))
+        return failures
+
+    def _create(self, pvname):
+        record, linked_pvname = self.records[pvname]
+        try:
+            value = self._released_values.pop(pvname)
+        except KeyError:
+            value = get_initial_value(record, self.default_values)
+
+        prop = pvproperty(name=pvname, value=value,
+                          dtype=get_data_type(record),
+                          record=record.record_type)
+        if linked_pvname is not None:
+            @prop.putter
+            async def output_putter(group, instance, value):
+                target = self[linked_pvname]
+                if self.put_forwarder is None:
+                    await target.write(value)
+                else:
+                    await self.put_forwarder.forward(pvname, target, value)
+
+        prop.__set_name__(PVGroup, util.pvname_to_attribute(pvname))
+        channeldata = prop.pvspec.create(self.group)
+        logger.debug('Created PV %s', pvname)
+
+        fields = get_startup_fields(record)
+        if fields:
+            task = asyncio.get_running_loop().create_task(
+                self._write_fields(channeldata, fields)
+            )
+            self._field_tasks.add(task)
+            task.add_done_callback(self._field_task_done)
+        return channeldata
+
+    def _field_task_done(self, task):
+        self._field_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('Failed to write the fields of a PV',
+                         exc_info=task.exception())
+
+    async def _write_fields(self, channeldata, fields):
+        writes, failures = prepare_field_writes([(channeldata, fields)])
+        failures.extend(await write_field_values(writes))
+        # Only the startup hook of eager IOCs warns, once for all records
+        log_field_failures(channeldata.pvname, failures, len(fields),
+                           level=logging.DEBUG)
+        self._field_failures.update(count_field_failures(failures))
+        self._field_totals.update(pvs=1, fields=len(fields),
+                                  failures=len(failures))
+
+    def log_field_failures(self):
+        """
+        Summarize the field failures of PVs created since the last summary in
+        one message, if there were any.
+        """
+        totals, self._field_totals = self._field_totals, collections.Counter()
+        failures, self._field_failures = (self._field_failures,
+                                          collections.Counter())
+        if failures:
+            logger.info(
+                '%s: failed to set %d of %d initial field values of %d '
+                'created PVs: %s', self.name, totals['failures'],
+                totals['fields'], totals['pvs'],
+                format_failure_counts(failures)
+            )
+
+    async def report_field_failures(self, interval=FIELD_FAILURE_INTERVAL):
+        """Periodically summarize the field failures of created PVs."""
+        while True:
+            await asyncio.sleep(interval)
+            self.log_field_failures()
+
+    def demote_idle(self, idle_timeout=None):
+        """
+        Release PVs which have not been looked up in ``idle_timeout`` seconds.
+
+        Returns
+        -------
+        int
+            The number of PVs released.
+        """
+        if idle_timeout is None:
+            idle_timeout = self.idle_timeout
+
+        cutoff = time.monotonic() - idle_timeout
+        idle = [pvname for pvname, last_access in self._last_access.items()
+                if last_access < cutoff]
+        for pvname in idle:
+            del self._last_access[pvname]
+            channeldata = self._pvdb.pop(pvname)
+            if pvname in self.records:
+                # Keep it available while in use elsewhere, and its value
+                # once it is no longer
+                self._released[pvname] = channeldata
+                weakref.finalize(channeldata, _save_value,
+                                 self._released_values, pvname,
+                                 channeldata._data)
+        return len(idle)
+
+    async def demote_idle_pvs(self):
+        """Periodically release idle PVs."""
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            count = self.demote_idle()
+            if count:
+                logger.debug('Released %d idle PVs (%d remain)', count,
+                             len(self._pvdb))
+
+
+def _record_pairs_from_tmc(tmc, *, macros, includes, excludes):
+    packages, exceptions = process(
         tmc, allow_errors=True, show_error_context=True)
-    record_pairs = [
-        pair for pair in typhos_gui.records_from_packages(packages, macros)
-        if util.should_filter(includes, excludes, [pair[0].pvname])
+    return [
+        (util.simplify_record(input_record),
+         util.simplify_record(output_record))
+        for input_record, output_record in util.records_from_packages(
+            packages, macros)
+        if util.should_filter(includes, excludes, [input_record.pvname])
     ]
+
+
+def record_pairs_from_plc(tmc_path, *, macros, includes=None, excludes=None,
+                          use_cache=True):
+    """
+    Generate (input_record, output_record) pairs for a PLC.
+
+    This only requires pytmc and its result is picklable, such that it may be
+    run in a worker process.
+
+    Returns
+    -------
+    list of (SimpleRecord, SimpleRecord or None)
+    """
+    tmc = cache.parse(tmc_path, use_cache=use_cache)
+    return _record_pairs_from_tmc(tmc, macros=macros, includes=includes or [],
+                                  excludes=excludes or [])
+
+
+def records_from_plc(plc_name, tmc_path, *, macros, includes=None,
+                     excludes=None, use_cache=True):
+    """
+    Generate the record pairs and motion stages of a PLC.
+
+    Like :func:`record_pairs_from_plc`, this may be run in a worker process.
+
+    Returns
+    -------
+    record_pairs : list of (SimpleRecord, SimpleRecord or None)
+
+    motors : list of str
+        The PV prefixes of the PLC's motion stages.
+    """
+    includes = includes or []
+    excludes = excludes or []
+    tmc = cache.parse(tmc_path, use_cache=use_cache)
+    return (
+        _record_pairs_from_tmc(tmc, macros=macros, includes=includes,
+                               excludes=excludes),
+        util.get_motor_prefixes(plc_name, tmc, includes=includes,
+                                excludes=excludes),
+    )
+
+
+def caproto_ioc_from_plc(plc_name, plc_project, macros, *, includes=None,
+                         excludes=None, use_cache=True):
+    record_pairs = record_pairs_from_plc(
+        plc_project.tmc_path, macros=macros, includes=includes,
+        excludes=excludes, use_cache=use_cache)
     return create_ioc_from_records(record_pairs, class_name=plc_name)
 
 
-def main(project, *, plcs=None, include=None, exclude=None, macro=None):
-    macros = util.split_macros(macro or [])
-    include = include or []
-    exclude = exclude or []
-    solution_path, projects = util.get_tsprojects_from_filename(project.name)
+def merge_pvdbs(pvdbs):
+    """
+    Merge the PV databases of several IOCs, checking for PV name collisions.
+
+    Parameters
+    ----------
+    pvdbs : dict
+        IOC name to PV database.
 
-    ioc_classes = []
-    for tsproj_project in projects:
-        parsed_tsproj = pytmc.parser.parse(tsproj_project)
+    Returns
+    -------
+    pvdb : dict
+        The merged PV database.  For colliding PV names, the IOC which comes
+        first wins.
+
+    collisions : dict
+        PV name to the names of the IOCs which define it.
+    """
+    pvdb = {}
+    owners = {}
+    collisions = {}
+    for ioc_name, ioc_pvdb in pvdbs.items():
+        for pvname, channeldata in ioc_pvdb.items():
+            if pvname in pvdb:
+                collisions.setdefault(pvname, [owners[pvname]]).append(
+                    ioc_name)
+                continue
+            pvdb[pvname] = channeldata
+            owners[pvname] = ioc_name
+    return pvdb, collisions
+
+
+async def run_servers(pvdbs, *, interfaces=None, log_pv_names=False,
+                      tasks=None, contexts=None):
+    """
+    Serve one or more PV databases from the current asyncio event loop.
+
+    Each PV database gets its own server.  This returns when any server
+    exits, or on SIGINT/SIGTERM, after shutting down the remaining servers.
+
+    Parameters
+    ----------
+    pvdbs : list of dict
+        The PV databases.
+
+    interfaces : list of str, optional
+        Interfaces to listen on.
+
+    log_pv_names : bool, optional
+        Log PV names at startup.
+
+    tasks : list of coroutines, optional
+        Additional coroutines to run alongside the servers, which are
+        cancelled on shutdown.
+
+    contexts : list, optional
+        If given, the server Contexts are appended to it, e.g., for
+        reporting statistics.
+    """
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (RuntimeError, ValueError):
+            # Not supported on Windows or outside of the main thread; rely on
+            # KeyboardInterrupt instead.
+            ...
+
+    server_contexts = [Context(pvdb, interfaces) for pvdb in pvdbs]
+    if contexts is not None:
+        contexts.extend(server_contexts)
+
+    servers = [
+        asyncio.ensure_future(ctx.run(log_pv_names=log_pv_names))
+        for ctx in server_contexts
+    ]
+    others = [asyncio.ensure_future(task) for task in tasks or []]
+    stopper = asyncio.ensure_future(stop_event.wait())
+    try:
+        await asyncio.wait(servers + [stopper],
+                           return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in servers + others + [stopper]:
+            task.cancel()
+        results = await asyncio.gather(*servers, *others,
+                                       return_exceptions=True)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(sig)
+            except (RuntimeError, ValueError):
+                ...
+
+    for result in results:
+        if isinstance(result, Exception):
+            raise result
+
+
+def records_from_project(filename, *, plcs=None, macros, includes=None,
+                         excludes=None, use_cache=True, jobs=1):
+    """
+    Generate the record pairs and motion stages for the PLCs of a project.
+
+    Returns
+    -------
+    record_pairs : dict
+        PLC name to a list of pairs, as from :func:`record_pairs_from_plc`.
+        PLCs which fail to process are logged and skipped.
+
+    motors : dict
+        PLC name to a list of motion stage PV prefixes.
+
+    parsed_projects : list of pytmc.parser.TcSmProject
+        The parsed .tsproj projects.
+    """
+    solution_path, projects = util.get_tsprojects_from_filename(filename)
+
+    to_process = []
+    parsed_projects = list(
+        cache.parse_all(projects, use_cache=use_cache, jobs=jobs)
+    )
+    for tsproj_project, parsed_tsproj in zip(projects, parsed_projects):
         for plc_name, plc_project in parsed_tsproj.plcs_by_name.items():
             logger.debug('Project: %s PLC: %s', tsproj_project, plc_name)
 
@@ -217,16 +1286,84 @@ def main(project, *, plcs=None, include=None, exclude=None, macro=None):
                 logger.debug('Skipping; not in valid list: %s', plcs)
                 continue
 
-            try:
-                ioc = caproto_ioc_from_plc(
-                    plc_name, plc_project, macros,
-                    includes=include, excludes=exclude)
-            except Exception:
-                logger.exception('Failed to create IOC for plc %s',
-                                 plc_name)
-            else:
-                ioc_classes.append(ioc)
+            to_process.append((plc_name, plc_project.tmc_path))
+
+    get_records = functools.partial(
+        records_from_plc, macros=macros, includes=includes,
+        excludes=excludes, use_cache=use_cache)
+
+    record_pairs = {}
+    motors = {}
+    results = util.run_jobs(get_records, to_process, jobs=jobs)
+    for (plc_name, _), result in zip(to_process, results):
+        try:
+            record_pairs[plc_name], motors[plc_name] = result.result()
+        except Exception:
+            logger.exception('Failed to get records for plc %s', plc_name)
+    return record_pairs, motors, parsed_projects
+
+
+def load_ioc_module(project, records_kw, *, lazy=False, use_cache=True):
+    """
+    Load the generated module for a mock IOC, generating it if necessary.
+
+    Parameters
+    ----------
+    project : str
+        The .sln or .tsproj file.
+
+    records_kw : dict
+        Keyword arguments for :func:`records_from_project`.
+
+    lazy : bool, optional
+        Load record tables for lazy PV databases, rather than PVGroups.
+
+    use_cache : bool, optional
+        Use an existing module, if up-to-date.  If False, always regenerate.
+
+    Returns
+    -------
+    iocs : dict
+        PLC name to record table if ``lazy``, or otherwise to PVGroup class.
+
+    motors : dict
+        PLC name to a list of motion stage PV prefixes.
+    """
+    filename = caproto_codegen.get_module_filename(
+        project, plcs=records_kw.get('plcs'), macros=records_kw['macros'],
+        includes=records_kw.get('includes'),
+        excludes=records_kw.get('excludes'), lazy=lazy)
 
+    module = caproto_codegen.load_module(filename) if use_cache else None
+    if module is None:
+        t0 = time.monotonic()
+        record_pairs, motors, parsed_projects = records_from_project(
+            project, use_cache=use_cache, **records_kw)
+        source = caproto_codegen.generate_module_source(
+            project, record_pairs,
+            caproto_codegen.get_dependencies(project, parsed_projects),
+            motors=motors, lazy=lazy)
+        caproto_codegen.write_module(filename, source)
+        module = caproto_codegen.import_module(filename)
+        logger.info('Generated mock IOC module %s in %.1f s', filename,
+                    time.monotonic() - t0)
+
+    iocs = module.RECORD_TABLES if lazy else module.IOCS
+    return dict(iocs), dict(module.MOTORS)
+
+
+def get_server_options():
+    """
+    Get the default caproto IOC and server options.
+
+    Returns
+    -------
+    ioc_options : dict
+        Keyword arguments for instantiating PVGroups.
+
+    run_options : dict
+        Server options, including ``interfaces`` (from the environment).
+    """
     parser, split_args = template_arg_parser(
         desc='Auto-generated mock PLC IOC',
         default_prefix='',
@@ -234,28 +1371,279 @@ def main(project, *, plcs=None, include=None, exclude=None, macro=None):
         macros={},
         supported_async_libs=['asyncio']
     )
+    return split_args(parser.parse_args(['--list-pvs']))
+
+
+def create_pvdbs(iocs, motors, *, ioc_options, lazy=False,
+                 single_server=False, idle_timeout=None,
+                 init_concurrency=DEFAULT_INIT_CONCURRENCY,
+                 simulate_motion=False,
+                 motion_tick_rate=motion_sim.DEFAULT_TICK_RATE, replay=None,
+                 replay_speed=1.0, record=None, coalesce_window=0.0,
+                 coalesce=None, max_forward_rate=None, stats=False,
+                 stats_prefix=pvstats.DEFAULT_PREFIX,
+                 stats_top=pvstats.DEFAULT_TOP, stats_file=None,
+                 stats_interval=pvstats.DUMP_INTERVAL, snapshot=None,
+                 snapshot_interval=pvsnapshot.SNAPSHOT_INTERVAL,
+                 snapshot_prefix=pvsnapshot.DEFAULT_PREFIX, restore=None):
+    """
+    Create the PV databases to serve for a set of mock IOCs.
+
+    Parameters
+    ----------
+    iocs : dict
+        PLC name to record table if ``lazy``, or otherwise to PVGroup class.
+
+    motors : dict
+        PLC name to a list of motion stage PV prefixes.
+
+    ioc_options : dict
+        Keyword arguments for instantiating the PVGroups.
+
+    replay : str, optional
+        A PV trace file to replay into the PV databases.
+
+    replay_speed : float, optional
+        Replay speed relative to the recorded rate, or 0 for as fast as
+        possible.
+
+    record : str, optional
+        A PV trace file to record the values put by clients to.
+
+    coalesce_window : float, optional
+        Coalescing window of output records, in seconds.
+
+    coalesce : list of (str, float), optional
+        Coalescing windows of output records matching PV name globs.
+
+    max_forward_rate : float, optional
+        Maximum number of output to input record forwards per second.
+
+    stats : bool, optional
+        Count requests per PV, serving summary PVs with ``stats_prefix``
+        from the first server.
+
+    stats_top : int, optional
+        Number of PVs listed by the top-N summary PVs.
+
+    stats_file : str, optional
+        An OpenMetrics file to write the statistics to, every
+        ``stats_interval`` seconds.  Implies ``stats``.
+
+    snapshot : str, optional
+        A file to write snapshots of the record values to, every
+        ``snapshot_interval`` seconds and on demand by way of PVs with
+        ``snapshot_prefix``.
+
+    restore : list of str, optional
+        Snapshot (or PV trace) files to restore record values from.
+
+    Returns
+    -------
+    pvdbs : dict
+        Server name to PV database.
+
+    tasks : list of coroutines
+        To run alongside the servers, as with :func:`run_servers`.
+    """
+    tasks = []
+    forwarder = None
+    if coalesce_window or coalesce or max_forward_rate:
+        forwarder = put_forwarding.PutForwarder(
+            window=coalesce_window, windows=coalesce,
+            max_rate=max_forward_rate)
+        tasks.append(forwarder.run())
+
+    # PLC name to PV database or, if lazy, record table
+    pvdbs = {}
+    # Where snapshots take record values from and restore them to
+    snapshot_sources = []
+    for plc_name, ioc in iocs.items():
+        if lazy:
+            pvdbs[plc_name] = ioc
+            continue
+        try:
+            ioc.init_concurrency = init_concurrency
+            ioc.put_forwarder = forwarder
+            ioc = ioc(**ioc_options)
+            prepare_startup_fields(ioc)
+            add_aliases(ioc.pvdb, ioc.aliases)
+            pvdbs[plc_name] = ioc.pvdb
+            records = (getattr(ioc, attr) for attr in ioc.startup_fields)
+            snapshot_sources.append(
+                {channeldata.pvname: channeldata for channeldata in records}
+            )
+        except Exception:
+            logger.exception('Failed to create IOC for plc %s',
+                             plc_name)
+
+    # PLC name to PV database of simulated motors
+    motor_pvdbs = {}
+    if simulate_motion:
+        simulator = motion_sim.MotionSimulator(
+            motors, tick_rate=motion_tick_rate)
+        motor_pvdbs = simulator.pvdbs
+        tasks.append(simulator.run())
+        if not lazy:
+            for plc_name, motor_pvdb in motor_pvdbs.items():
+                pvdbs[plc_name] = dict(pvdbs.get(plc_name, {}), **motor_pvdb)
+
+    merged_pvdb, collisions = merge_pvdbs(pvdbs)
+    for pvname, plc_names in sorted(collisions.items()):
+        logger.warning('PV %s is defined in multiple PLCs: %s', pvname,
+                       ', '.join(plc_names))
+    if collisions:
+        logger.warning('%d PV name collision(s) between PLCs',
+                       len(collisions))
+
+    if single_server:
+        logger.info('Serving %d PVs from %d PLC(s) in a single server',
+                    len(merged_pvdb), len(pvdbs))
+        pvdbs = {'MockIOC': merged_pvdb}
+        motor_pvdbs = {'MockIOC': merge_pvdbs(motor_pvdbs)[0]}
+
+    if lazy:
+        pvdbs = {
+            name: LazyPVDatabase(table, name=name, idle_timeout=idle_timeout,
+                                 static_pvdb=motor_pvdbs.get(name),
+                                 put_forwarder=forwarder)
+            for name, table in pvdbs.items()
+        }
+        if idle_timeout is not None:
+            tasks.extend(pvdb.demote_idle_pvs() for pvdb in pvdbs.values())
+        tasks.extend(pvdb.report_field_failures() for pvdb in pvdbs.values())
+        snapshot_sources.extend(pvdbs.values())
+
+    for filename in restore or []:
+        try:
+            values = pvsnapshot.load_snapshot(filename)
+        except (OSError, ValueError):
+            logger.exception('Failed to load snapshot %s', filename)
+            continue
+        count = pvsnapshot.restore_values(snapshot_sources, values)
+        logger.info('Restored %d value(s) from %s', count, filename)
+
+    # Summary and on-demand PVs are served alongside the first PV database,
+    # where a unicast search will find them.  They are added ahead of any
+    # wrapping, such that lazy databases do not release them, and they are
+    # not recorded or counted as the records are.
+    static_groups = []
+    if snapshot:
+        snapshotter = pvsnapshot.Snapshotter(
+            snapshot, interval=snapshot_interval, prefix=snapshot_prefix)
+        snapshotter.sources = snapshot_sources
+        static_groups.append(snapshotter.group)
+        tasks.append(snapshotter.run())
+
+    if stats or stats_file:
+        statistics = pvstats.PVStatistics(
+            prefix=stats_prefix, top=stats_top, filename=stats_file,
+            dump_interval=stats_interval, forwarder=forwarder)
+        static_groups.append(statistics.group)
+        tasks.append(statistics.run())
+
+    static_pvnames = set()
+    if static_groups:
+        if not pvdbs:
+            pvdbs['MockIOC'] = {}
+        first = next(iter(pvdbs.values()))
+        for group in static_groups:
+            getattr(first, 'static_pvdb', first).update(group.pvdb)
+            static_pvnames.update(group.pvdb)
+
+    def wrap_pvdbs(wrap):
+        wrapped = {}
+        for name, pvdb in pvdbs.items():
+            wrapped[name] = wrap(pvdb)
+            wrapped[name].uninstrumented.update(static_pvnames)
+        return wrapped
+
+    if record:
+        recorder = pvtrace.PutRecorder(record)
+        pvdbs = wrap_pvdbs(recorder.wrap)
+        tasks.append(recorder.run())
+
+    if stats or stats_file:
+        pvdbs = wrap_pvdbs(statistics.wrap)
+
+    if replay:
+        replayer = pvtrace.TraceReplayer(
+            pvtrace.Trace(replay), list(pvdbs.values()), speed=replay_speed)
+        tasks.append(replayer.run())
+    return pvdbs, tasks
+
+
+def main(project, *, plcs=None, include=None, exclude=None, macro=None,
+         single_server=False, lazy=False, idle_timeout=None,
+         init_concurrency=DEFAULT_INIT_CONCURRENCY, codegen=False,
+         simulate_motion=False,
+         motion_tick_rate=motion_sim.DEFAULT_TICK_RATE,
+         no_cache=False, jobs=1, shards=1, shard_by='hash', replay=None,
+         replay_speed=1.0, record=None, stats=False,
+         stats_prefix=pvstats.DEFAULT_PREFIX, stats_top=pvstats.DEFAULT_TOP,
+         stats_file=None, stats_interval=pvstats.DUMP_INTERVAL,
+         coalesce_window=0.0, coalesce=None, max_forward_rate=None,
+         snapshot=None, snapshot_interval=pvsnapshot.SNAPSHOT_INTERVAL,
+         snapshot_prefix=pvsnapshot.DEFAULT_PREFIX, restore=None):
+    server_kw = dict(
+        coalesce_window=coalesce_window, coalesce=coalesce,
+        max_forward_rate=max_forward_rate, stats=stats,
+        stats_prefix=stats_prefix, stats_top=stats_top,
+        stats_file=stats_file, stats_interval=stats_interval,
+        snapshot=snapshot, snapshot_interval=snapshot_interval,
+        snapshot_prefix=snapshot_prefix, restore=restore,
+    )
+    records_kw = dict(
+        plcs=plcs, macros=util.split_macros(macro or []),
+        includes=include or [], excludes=exclude or [], jobs=jobs,
+    )
+
+    ioc_options, run_options = get_server_options()
+
+    # Shards are sent record tables, from which they create their PVGroups
+    use_tables = lazy or shards > 1
+
+    # PLC name to PVGroup class or record table
+    if codegen:
+        iocs, motors = load_ioc_module(project.name, records_kw,
+                                       lazy=use_tables,
+                                       use_cache=not no_cache)
+    else:
+        record_pairs, motors, _ = records_from_project(
+            project.name, use_cache=not no_cache, **records_kw)
+        iocs = {}
+        for plc_name, pairs in record_pairs.items():
+            try:
+                iocs[plc_name] = (
+                    get_record_table(pairs) if use_tables
+                    else create_ioc_from_records(pairs, class_name=plc_name)
+                )
+            except Exception:
+                logger.exception('Failed to create IOC for plc %s',
+                                 plc_name)
+
+    if shards > 1:
+        caproto_shards.run_shards(
+            iocs, motors, shards=shards, partition=shard_by, lazy=lazy,
+            idle_timeout=idle_timeout, init_concurrency=init_concurrency,
+            simulate_motion=simulate_motion,
+            motion_tick_rate=motion_tick_rate, replay=replay,
+            replay_speed=replay_speed, record=record, **server_kw)
+        return
 
-    def start_ioc(ioc_class):
-        import asyncio
-        asyncio.set_event_loop(asyncio.new_event_loop())
-        ioc_options, run_options = split_args(
-            parser.parse_args(['--list-pvs']))
-        ioc = ioc_class(**ioc_options)
-        caproto_run(ioc.pvdb, **run_options)
-
-    # if len(ioc_classes) == 1:
-    #   start_ioc(ioc_classes[0])
-    # else:
-    threads = []
-    for ioc_class in ioc_classes:
-        thread = threading.Thread(target=start_ioc,
-                                  kwargs=dict(ioc_class=ioc_class),
-                                  daemon=True)
-        thread.start()
-        threads.append(thread)
+    pvdbs, tasks = create_pvdbs(
+        iocs, motors, ioc_options=ioc_options, lazy=lazy,
+        single_server=single_server, idle_timeout=idle_timeout,
+        init_concurrency=init_concurrency, simulate_motion=simulate_motion,
+        motion_tick_rate=motion_tick_rate, replay=replay,
+        replay_speed=replay_speed, record=record, **server_kw)
 
     try:
-        while any(thread.is_alive() for thread in threads):
-            time.sleep(1)
+        asyncio.run(
+            run_servers(list(pvdbs.values()),
+                        interfaces=run_options['interfaces'],
+                        log_pv_names=run_options['log_pv_names'],
+                        tasks=tasks)
+        )
     except KeyboardInterrupt:
         ...
@@ -0,0 +1,383 @@
+"""
+Sharding of the `ads-deploy caproto` mock IOC across worker processes.
+
+A single caproto server is bound to one core.  With ``--shards N``, the
+records are split into N shards - by a stable hash of the PV name, or by PLC -
+each of which is served from its own worker process.  The parent process
+supervises the workers, restarting those which fail, and aggregates their
+logs and statistics.
+
+All servers share the UDP search port, so clients must search for PVs by
+broadcast (e.g., ``EPICS_CA_ADDR_LIST=127.255.255.255`` on localhost); a
+unicast search only reaches one of them.
+"""
+
+import asyncio
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import pathlib
+import queue
+import signal
+import threading
+import time
+import zlib
+
+from . import caproto_ioc
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS = ('hash', 'plc')
+# Seconds between statistics reports from each shard
+STATS_INTERVAL = 30.0
+# Seconds between checks of the shard processes
+SUPERVISE_PERIOD = 1.0
+# Give up after a shard fails this many times
+MAX_RESTARTS = 5
+# Seconds to wait for shards to exit before killing them
+STOP_TIMEOUT = 5.0
+
+
+def get_shard(name, shards):
+    """Get the shard index for a PV name, stable across runs and hosts."""
+    return zlib.crc32(name.encode('utf-8')) % shards
+
+
+def get_shard_filename(filename, index):
+    """Get the per-shard name of an output file, e.g., trace.shard0.bin."""
+    path = pathlib.Path(filename)
+    return str(path.with_name(f'{path.stem}.shard{index}{path.suffix}'))
+
+
+def _assign_plcs(tables, shards):
+    """Assign PLCs to shards, balancing their record counts."""
+    counts = [0] * shards
+    assignments = {}
+    for plc_name in sorted(tables, key=lambda name: -len(tables[name])):
+        index = counts.index(min(counts))
+        assignments[plc_name] = index
+        counts[index] += len(tables[plc_name])
+    return assignments
+
+
+def partition_records(tables, motors, shards, *, partition='hash'):
+    """
+    Split record tables and motion stages into shards.
+
+    Output records are kept in the shard of the input record they link to.
+
+    Parameters
+    ----------
+    tables : dict
+        PLC name to record table, as from
+        :func:`ads_deploy.caproto_ioc.get_record_table`.
+
+    motors : dict
+        PLC name to a list of motion stage PV prefixes.
+
+    shards : int
+        The number of shards.
+
+    partition : {'hash', 'plc'}, optional
+        Split by a stable hash of the (input record) PV name, or assign whole
+        PLCs to shards.
+
+    Returns
+    -------
+    list of (dict, list)
+        Per shard, the record table and the motion stage PV prefixes.
+    """
+    if partition not in PARTITIONS:
+        raise ValueError(f'Unknown partition: {partition!r}')
+
+    merged, collisions = caproto_ioc.merge_pvdbs(tables)
+    for pvname, plc_names in sorted(collisions.items()):
+        logger.warning('PV %s is defined in multiple PLCs: %s', pvname,
+                       ', '.join(plc_names))
+
+    result = [({}, []) for _ in range(shards)]
+    if partition == 'plc':
+        assignments = _assign_plcs(tables, shards)
+        for plc_name, table in tables.items():
+            result[assignments[plc_name]][0].update(table)
+        for plc_name, prefixes in motors.items():
+            index = assignments.get(plc_name, get_shard(plc_name, shards))
+            result[index][1].extend(prefixes)
+        return result
+
+    for pvname, (record, linked) in merged.items():
+        index = get_shard(linked or pvname, shards)
+        result[index][0][pvname] = (record, linked)
+    for prefixes in motors.values():
+        for prefix in prefixes:
+            result[get_shard(prefix, shards)][1].append(prefix)
+    return result
+
+
+def get_stats(index, pvdbs, contexts):
+    """
+    Get the statistics of a shard.
+
+    Parameters
+    ----------
+    index : int
+        The shard index.
+
+    pvdbs : list of dict
+        The PV databases served.
+
+    contexts : list of caproto.asyncio.server.Context
+        The servers.
+
+    Returns
+    -------
+    dict
+    """
+    circuits = [circuit for ctx in contexts for circuit in ctx.circuits]
+    return {
+        'shard': index,
+        'pid': os.getpid(),
+        'pvs': sum(len(pvdb) for pvdb in pvdbs),
+        'clients': len(circuits),
+        'channels': sum(len(circuit.circuit.channels)
+                        for circuit in circuits),
+        'cpu_time': time.process_time(),
+    }
+
+
+async def report_stats(index, pvdbs, contexts, stats_queue, interval):
+    """Periodically send the statistics of a shard to its supervisor."""
+    while True:
+        stats_queue.put(get_stats(index, pvdbs, contexts))
+        await asyncio.sleep(interval)
+
+
+def _configure_logging(index, log_queue, log_level):
+    """Send all log records of a shard process to its supervisor."""
+    def add_shard(record):
+        record.msg = f'[shard {index}] {record.msg}'
+        return True
+
+    handler = logging.handlers.QueueHandler(log_queue)
+    handler.addFilter(add_shard)
+    logging.getLogger().handlers[:] = [handler]
+    logging.getLogger('ads_deploy').setLevel(log_level)
+
+
+def run_shard(index, table, motors, options, log_queue, stats_queue,
+              log_level, stats_interval=STATS_INTERVAL):
+    """
+    Serve one shard; the entry point of its worker process.
+
+    Parameters
+    ----------
+    index : int
+        The shard index.
+
+    table : dict
+        The record table of the shard.
+
+    motors : list of str
+        The motion stage PV prefixes of the shard.
+
+    options : dict
+        Keyword arguments for :func:`ads_deploy.caproto_ioc.create_pvdbs`.
+
+    log_queue : multiprocessing.Queue
+        Queue for log records.
+
+    stats_queue : multiprocessing.Queue
+        Queue for statistics, from :func:`get_stats`.
+
+    log_level : int
+        Logging level of the ``ads_deploy`` logger.
+
+    stats_interval : float, optional
+        Seconds between statistics reports.
+    """
+    _configure_logging(index, log_queue, log_level)
+    name = f'Shard{index}'
+    # Per-shard output files and summary PVs
+    options = dict(options)
+    for key in ('record', 'stats_file', 'snapshot'):
+        if options.get(key):
+            options[key] = get_shard_filename(options[key], index)
+    for key in ('stats_prefix', 'snapshot_prefix'):
+        if key in options:
+            options[key] += f'SHARD{index}:'
+    try:
+        ioc_options, run_options = caproto_ioc.get_server_options()
+        if options.get('lazy'):
+            ioc = table
+        else:
+            ioc = caproto_ioc.create_ioc_from_records(
+                caproto_ioc.record_pairs_from_table(table), class_name=name)
+        pvdbs, tasks = caproto_ioc.create_pvdbs(
+            {name: ioc}, {name: motors}, ioc_options=ioc_options, **options)
+        pvdbs = list(pvdbs.values())
+        logger.info('Serving %d PVs (pid %d)',
+                    sum(len(pvdb) for pvdb in pvdbs), os.getpid())
+
+        contexts = []
+        tasks.append(
+            report_stats(index, pvdbs, contexts, stats_queue, stats_interval)
+        )
+        asyncio.run(
+            caproto_ioc.run_servers(pvdbs,
+                                    interfaces=run_options['interfaces'],
+                                    tasks=tasks, contexts=contexts)
+        )
+    except KeyboardInterrupt:
+        ...
+    except Exception:
+        logger.exception('Shard failed')
+        raise SystemExit(1)
+
+
+def log_stats(stats, processes, previous=None):
+    """
+    Log the aggregated statistics of the shards.
+
+    Changes in the PV, client or channel counts are logged at the INFO level,
+    and otherwise at DEBUG.
+
+    Returns
+    -------
+    tuple
+        The logged counts, for passing in as ``previous`` next time.
+    """
+    running = sum(proc.is_alive() for proc in processes)
+    counts = tuple(
+        sum(shard[key] for shard in stats.values())
+        for key in ('pvs', 'clients', 'channels')
+    )
+    cpu_times = ', '.join(
+        f'{stats[index]["cpu_time"]:.1f}' if index in stats else '-'
+        for index in range(len(processes))
+    )
+    logger.log(
+        logging.DEBUG if counts == previous else logging.INFO,
+        'Shards: %d/%d running, %d PVs, %d client(s), %d channel(s); '
+        'CPU time per shard: %s s', running, len(processes), *counts,
+        cpu_times
+    )
+    return counts
+
+
+def stop_shards(processes, timeout=STOP_TIMEOUT):
+    """Stop shard processes, killing those which do not exit in time."""
+    for proc in processes:
+        if proc.is_alive():
+            proc.terminate()
+
+    deadline = time.monotonic() + timeout
+    for proc in processes:
+        proc.join(max(deadline - time.monotonic(), 0))
+        if proc.is_alive():
+            logger.warning('Shard process %d did not exit; killing it',
+                           proc.pid)
+            proc.kill()
+            proc.join()
+
+
+def run_shards(tables, motors, *, shards, partition='hash',
+               stats_interval=STATS_INTERVAL, **options):
+    """
+    Serve record tables from several supervised worker processes.
+
+    This returns on SIGINT/SIGTERM or when all shards have exited cleanly.
+    Shards which fail are restarted, up to :data:`MAX_RESTARTS` times each.
+
+    Parameters
+    ----------
+    tables : dict
+        PLC name to record table.
+
+    motors : dict
+        PLC name to a list of motion stage PV prefixes.
+
+    shards : int
+        The number of worker processes.
+
+    partition : {'hash', 'plc'}, optional
+        How to split the records; see :func:`partition_records`.
+
+    stats_interval : float, optional
+        Seconds between statistics reports.
+
+    **options
+        Keyword arguments for :func:`ads_deploy.caproto_ioc.create_pvdbs`.
+    """
+    parts = partition_records(tables, motors, shards, partition=partition)
+    logger.info('Split %d PVs into %d shards by %s: %s',
+                sum(len(table) for table, _ in parts), shards, partition,
+                ', '.join(str(len(table)) for table, _ in parts))
+    if partition == 'plc' and len(tables) < shards:
+        logger.warning('Only %d PLC(s) for %d shards; consider --shard-by '
+                       'hash', len(tables), shards)
+
+    # Spawn, rather than fork, as the workers run their own event loops
+    mp_context = multiprocessing.get_context('spawn')
+    log_queue = mp_context.Queue()
+    stats_queue = mp_context.Queue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *logging.getLogger().handlers)
+    log_level = logging.getLogger('ads_deploy').getEffectiveLevel()
+
+    def start(index):
+        table, shard_motors = parts[index]
+        proc = mp_context.Process(
+            target=run_shard, name=f'ads-deploy-shard{index}',
+            args=(index, table, shard_motors, options, log_queue,
+                  stats_queue, log_level, stats_interval),
+        )
+        proc.start()
+        return proc
+
+    stop_event = threading.Event()
+    previous_handler = signal.signal(signal.SIGTERM,
+                                     lambda *_: stop_event.set())
+    listener.start()
+    processes = []
+    try:
+        processes = [start(index) for index in range(shards)]
+        restarts = [0] * shards
+        stats = {}
+        previous = None
+        next_report = time.monotonic() + stats_interval
+        while not stop_event.is_set():
+            try:
+                shard_stats = stats_queue.get(timeout=SUPERVISE_PERIOD)
+            except queue.Empty:
+                ...
+            else:
+                stats[shard_stats['shard']] = shard_stats
+
+            for index, proc in enumerate(processes):
+                if proc.is_alive() or proc.exitcode == 0:
+                    continue
+                if restarts[index] >= MAX_RESTARTS:
+                    raise RuntimeError(
+                        f'Shard {index} failed {restarts[index] + 1} times'
+                    )
+                restarts[index] += 1
+                logger.warning('Shard %d (pid %d) exited with code %d; '
+                               'restarting it', index, proc.pid,
+                               proc.exitcode)
+                stats.pop(index, None)
+                processes[index] = start(index)
+
+            if not any(proc.is_alive() for proc in processes):
+                logger.info('All shards have exited')
+                break
+
+            if time.monotonic() >= next_report:
+                previous = log_stats(stats, processes, previous)
+                next_report = time.monotonic() + stats_interval
+    except KeyboardInterrupt:
+        ...
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+        stop_shards(processes)
+        listener.stop()
@@ -9,31 +9,40 @@ continuous integration.  LCLS maintains its own tools for that in
 """
 
 import argparse
+import collections
 import functools
+import hashlib
+import json
 import logging
 import pathlib
 import re
 import sys
-from typing import Callable, Dict, List, Optional, Union
+import time
+import weakref
+from typing import (Callable, Dict, Iterable, Iterator, List, Optional,
+                    Pattern, Set, Tuple, Union)
 
 import jinja2
+import jinja2.meta
 import pytmc
-import pytmc.bin.db
-import pytmc.bin.pragmalint
-import pytmc.bin.summary
 from pytmc import RecordPackage
 from pytmc import parser as pytmc_parser
+from pytmc.bin import template as pytmc_template
 from pytmc.bin.template import get_boxes
 from pytmc.bin.template import get_jinja_filters as get_pytmc_jinja_filters
 from pytmc.bin.template import (get_linter_results, get_plc_record_packages,
                                 get_render_context, helpers)
 
-from . import util
+from . import __version__, cache, util
 
 DESCRIPTION = __doc__
 MODULE_PATH = pathlib.Path(__file__).parent
 TEMPLATE_PATH = MODULE_PATH / "templates"
 DEFAULT_TEMPLATES = list(TEMPLATE_PATH.glob("*.rst"))
+IDENTIFIER_RE = re.compile(r"\w+")
+# Records the inputs of each output file, for incremental builds
+MANIFEST_FILENAME = ".ads-deploy-docs.json"
+MANIFEST_VERSION = 1
 logger = logging.getLogger(__name__)
 
 
@@ -87,15 +96,300 @@ def build_arg_parser(parser=None):
         help="Write documentation to this location",
     )
 
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not use the cache of parsed projects",
+    )
+
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Render all files, even if their inputs are unchanged",
+    )
+
+    parser.add_argument(
+        "--bytecode-cache",
+        dest="bytecode_cache_path",
+        default=None,
+        type=str,
+        help="Cache compiled templates in this directory across runs",
+    )
+
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=(
+            "Process one project and PLC at a time, bounding memory usage.  "
+            "General\ntemplates (e.g., index.rst) only get summaries of the "
+            "projects and PLCs"
+        ),
+    )
+
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help=(
+            "Number of worker processes for parsing projects and rendering "
+            "per-PLC\ntemplates (0 for one per CPU).  Per-tsproj and general "
+            "templates then\nonly get summaries of the PLCs [default: 1]"
+        ),
+    )
+
     return parser
 
 
+def get_tsproj_info(
+    tsproj_project: pathlib.Path,
+    parsed_tsproj: pytmc_parser.TcSmProject,
+) -> dict:
+    """
+    Get the rendering context of a tsproj project, without its PLCs.
+
+    Parameters
+    ----------
+    tsproj_project : pathlib.Path
+        The path to the project.
+
+    parsed_tsproj : pytmc.parser.TcSmProject
+        The parsed project.
+
+    Returns
+    -------
+    dict
+        With an empty list of "plcs", filled in with ``iter_plc_info``.
+    """
+    box_by_id = {
+        int(box.attributes["Id"]): box
+        for box in get_boxes(parsed_tsproj)
+    }
+    return dict(
+        directory=tsproj_project.parent,
+        name=tsproj_project.stem,
+        filename=tsproj_project.name,
+        plcs=[],
+        obj=parsed_tsproj,
+        nc=list(parsed_tsproj.find(pytmc_parser.NC)),
+        box_by_id=box_by_id,
+    )
+
+
+class PlcViews:
+    """
+    Precomputed views of a PLC for per-PLC templates, as ``plc.views``.
+
+    Each view is computed on first use and shared by all templates rendered
+    for the PLC, in place of sorting and grouping in the templates.  Sorting
+    and grouping use the jinja filters, so the order matches that of the
+    templates' own ``sort`` and ``groupby``.
+
+    Parameters
+    ----------
+    plc : pytmc.parser.Plc
+        The PLC project.
+    """
+
+    SOURCE_SECTIONS = (
+        ("DUTs", "dut_by_name"),
+        ("GVLs", "gvl_by_name"),
+        ("POUs", "pou_by_name"),
+    )
+    _filter_env = jinja2.Environment()
+
+    def __init__(self, plc: pytmc_parser.Plc):
+        self.plc = plc
+
+    def _call_filter(self, name, value, **kwargs):
+        return self._filter_env.call_filter(name, value, kwargs=kwargs)
+
+    def _getattr(self, obj, attribute):
+        return self._filter_env.getattr(obj, attribute)
+
+    @functools.cached_property
+    def _helpers(self) -> Dict[str, Callable]:
+        return dict(get_render_context())
+
+    @functools.cached_property
+    def sources(self) -> List[Tuple[str, List[Tuple[str, str]]]]:
+        """[(section, [(source name, source code), ...]), ...]"""
+        return [
+            (
+                section,
+                [
+                    (source_name, source.get_source_code())
+                    for source_name, source in self._call_filter(
+                        "dictsort", getattr(self.plc, attr)
+                    )
+                ],
+            )
+            for section, attr in self.SOURCE_SECTIONS
+        ]
+
+    @functools.cached_property
+    def symbol_groups(self) -> List[Tuple[str, list]]:
+        """[(top-level group, symbols sorted by name), ...]"""
+        symbols = self._helpers["get_symbols"](self.plc)
+        return [
+            (group, self._call_filter("sort", items, attribute="name"))
+            for group, items in self._call_filter(
+                "groupby", symbols, attribute="top_level_group"
+            )
+        ]
+
+    @functools.cached_property
+    def records_by_data_type(self) -> list:
+        """[(data type, its records sorted by PV name), ...]"""
+        data_types = list(self._helpers["get_data_types"](self.plc))
+        if self.plc.tmc:
+            data_types.extend(self._helpers["enumerate_types"](self.plc.tmc))
+        return [
+            (
+                data_type,
+                self._call_filter(
+                    "sort",
+                    self._getattr(data_type, "records") or [],
+                    attribute="pvname",
+                ),
+            )
+            for data_type in self._call_filter(
+                "sort", data_types, attribute="qualified_type_name"
+            )
+        ]
+
+    @functools.cached_property
+    def library_versions(self) -> List[dict]:
+        """Library versions, sorted by name."""
+        return self._call_filter(
+            "sort", get_simple_library_versions(self.plc), attribute="name"
+        )
+
+
+def iter_plcs(
+    parsed_tsproj: pytmc_parser.TcSmProject,
+    *,
+    plcs: Optional[List[str]] = None,
+) -> Iterator[Tuple[str, pytmc_parser.Plc]]:
+    """
+    Get the names and parsed PLCs of a project, optionally limited to
+    ``plcs``.
+    """
+    for plc_name, plc_project in parsed_tsproj.plcs_by_name.items():
+        logger.debug("Project: %s PLC: %s", parsed_tsproj.filename, plc_name)
+
+        if plcs and plc_name not in plcs:
+            logger.debug("Skipping; not in valid list: %s", plcs)
+            continue
+
+        yield plc_name, plc_project
+
+
+def iter_plc_info(
+    parsed_tsproj: pytmc_parser.TcSmProject,
+    *,
+    plcs: Optional[List[str]] = None,
+    dbd: Optional[str] = None,
+):
+    """
+    Get the rendering contexts of the PLCs of a project, one at a time.
+
+    Parameters
+    ----------
+    parsed_tsproj : pytmc.parser.TcSmProject
+        The parsed project.
+
+    plcs : list of str, optional
+        List of PLC names to limit to.
+
+    dbd : str, optional
+        The database definition path, if available.
+
+    Yields
+    ------
+    dict
+        The rendering context of each PLC, including its precomputed
+        ``views`` (see :class:`PlcViews`).
+    """
+    for plc_name, plc_project in iter_plcs(parsed_tsproj, plcs=plcs):
+        packages, record_exceptions = get_plc_record_packages(plc_project, dbd)
+        packages = packages or []
+        record_exceptions = record_exceptions or []
+
+        def by_tcname(package: RecordPackage):
+            return package.tcname
+
+        records = {
+            record.pvname: record
+            for package in sorted(packages, key=by_tcname)
+            for record in package.records
+        }
+        plc_info = dict(
+            name=plc_name,
+            obj=plc_project,
+            tmc_path=plc_project.tmc_path,
+            record_packages=packages,
+            records=records,
+            record_exceptions=record_exceptions,
+            views=PlcViews(plc_project),
+        )
+
+        logger.debug(
+            "%s: packages=%d records=%d errors=%d",
+            plc_name,
+            len(packages),
+            len(records),
+            len(record_exceptions),
+        )
+        plc_info.update(**get_linter_results(plc_project))
+        yield plc_info
+
+
+def summarize_plc_info(plc_info: dict, linter_results: bool = False) -> dict:
+    """
+    Get a small summary of a PLC rendering context, for streaming builds.
+
+    The parsed PLC and its records are dropped.  Linter results are only
+    kept if ``linter_results`` is set, as for per-tsproj templates.
+    """
+    keys = ["name", "tmc_path", "pragma_count", "pragma_errors"]
+    if linter_results:
+        keys.append("linter_results")
+    return {key: plc_info[key] for key in keys if key in plc_info}
+
+
+def summarize_tsproj_info(tsproj_info: dict) -> dict:
+    """
+    Get a small summary of a tsproj rendering context, for the general
+    templates of streaming builds.
+    """
+    return dict(
+        directory=tsproj_info["directory"],
+        name=tsproj_info["name"],
+        filename=tsproj_info["filename"],
+        plcs=[summarize_plc_info(plc) for plc in tsproj_info["plcs"]],
+    )
+
+
+def clear_pytmc_caches() -> None:
+    """
+    Clear the ``pytmc template`` helper caches, which hold on to the projects
+    and PLCs they were called with.
+    """
+    for obj in list(vars(pytmc_template).values()):
+        cache_clear = getattr(obj, "cache_clear", None)
+        if callable(cache_clear):
+            cache_clear()
+
+
 def build_template_kwargs(
     solution_path: pathlib.Path,
     projects: List[pathlib.Path],
     *,
     plcs: Optional[List[str]] = None,
-    dbd: Optional[str] = None
+    dbd: Optional[str] = None,
+    use_cache: bool = True,
+    jobs: int = 1,
 ) -> dict:
     """
     Get the top-level template rendering context dictionary.
@@ -114,77 +408,38 @@ def build_template_kwargs(
     dbd : str, optional
         The database definition path, if available.
 
+    use_cache : bool, optional
+        Use the on-disk cache of parsed projects.
+
+    jobs : int, optional
+        Number of worker processes for parsing projects.
+
     Returns
     -------
     dict
         The dictionary used to render all documentation templates.
     """
+    render_args = get_solution_info(solution_path)
+    parsed_projects = cache.parse_all(projects, use_cache=use_cache, jobs=jobs)
+    for tsproj_project, parsed_tsproj in zip(projects, parsed_projects):
+        proj_info = get_tsproj_info(tsproj_project, parsed_tsproj)
+        render_args["tsprojects"].append(proj_info)
+        proj_info["plcs"].extend(
+            iter_plc_info(parsed_tsproj, plcs=plcs, dbd=dbd)
+        )
+
+    return render_args
+
+
+def get_solution_info(solution_path: Optional[pathlib.Path]) -> dict:
+    """Get the top-level rendering context, without any projects."""
     solution_name = solution_path.stem if solution_path is not None else None
-    render_args = {
+    return {
         "solution": solution_path,
         "solution_name": solution_name,
         "tsprojects": [],
     }
 
-    for tsproj_project in projects:
-        parsed_tsproj = pytmc.parser.parse(tsproj_project)
-
-        box_by_id = {
-            int(box.attributes["Id"]): box
-            for box in get_boxes(parsed_tsproj)
-        }
-        proj_info = dict(
-            directory=tsproj_project.parent,
-            name=tsproj_project.stem,
-            filename=tsproj_project.name,
-            plcs=[],  # Filled below
-            obj=parsed_tsproj,
-            nc=list(parsed_tsproj.find(pytmc_parser.NC)),
-            box_by_id=box_by_id,
-        )
-
-        render_args["tsprojects"].append(proj_info)
-        for plc_name, plc_project in parsed_tsproj.plcs_by_name.items():
-            logger.debug("Project: %s PLC: %s", tsproj_project, plc_name)
-
-            if plcs and plc_name not in plcs:
-                logger.debug("Skipping; not in valid list: %s", plcs)
-                continue
-
-            packages, record_exceptions = get_plc_record_packages(plc_project, dbd)
-            packages = packages or []
-            record_exceptions = record_exceptions or []
-
-            def by_tcname(package: RecordPackage):
-                return package.tcname
-
-            records = {
-                record.pvname: record
-                for package in sorted(packages, key=by_tcname)
-                for record in package.records
-            }
-            plc_info = dict(
-                name=plc_name,
-                obj=plc_project,
-                tmc_path=plc_project.tmc_path,
-                record_packages=packages,
-                records=records,
-                record_exceptions=record_exceptions,
-            )
-
-            logger.debug(
-                "%s: packages=%d records=%d errors=%d",
-                plc_name,
-                len(packages),
-                len(records),
-                len(record_exceptions),
-            )
-            proj_info["plcs"].append(plc_info)
-
-            plc_info.update(**get_linter_results(plc_project))
-
-    return render_args
-
 
 def get_jinja_environment(
     templates: List[pathlib.Path],
@@ -218,10 +473,53 @@ def get_jinja_filename_environment(templates) -> jinja2.Environment:
     )
 
 
+def get_source_name_index(
+    plc: pytmc_parser.Plc,
+) -> Dict[str, Dict[str, Optional[Pattern]]]:
+    """
+    Index the source names (DUTs, GVLs, POUs) of a PLC by identifier.
+
+    Names which are not plain identifiers are keyed on their first identifier,
+    along with a regular expression to confirm the full name matches.
+
+    Returns
+    -------
+    dict
+        ``{identifier: {source_name: regex_or_None}}``
+    """
+    index = collections.defaultdict(dict)
+    for source_dict in (plc.dut_by_name, plc.gvl_by_name, plc.pou_by_name):
+        for source_name in source_dict:
+            identifiers = IDENTIFIER_RE.findall(source_name)
+            if not identifiers:
+                continue
+            if identifiers == [source_name]:
+                regex = None
+            else:
+                regex = re.compile(rf"\b{re.escape(source_name)}\b")
+            index[identifiers[0]][source_name] = regex
+    return dict(index)
+
+
+def find_related_source_names(
+    text: str,
+    index: Dict[str, Dict[str, Optional[Pattern]]],
+) -> Set[str]:
+    """
+    Find source names from ``get_source_name_index`` referenced in ``text``.
+    """
+    related = set()
+    for identifier in index.keys() & set(IDENTIFIER_RE.findall(text)):
+        for source_name, regex in index[identifier].items():
+            if regex is None or regex.search(text):
+                related.add(source_name)
+    return related
+
+
 def get_jinja_filters() -> Dict[str, Callable]:
     """ads-deploy jinja filters, including those from ``pytmc template``."""
-    saw_tsproj = set()
-    name_cache = {}
+    # Weakly keyed, so streamed builds may release each PLC once rendered
+    source_name_indexes = weakref.WeakKeyDictionary()
 
     def related_source(
         text,
@@ -229,26 +527,15 @@ def get_jinja_filters() -> Dict[str, Callable]:
         tsproj: pytmc_parser.TcSmProject,
         plc: pytmc_parser.Plc,
     ):
-        if tsproj not in saw_tsproj:
-            saw_tsproj.add(tsproj)
-            to_cache = [
-                ("DUTs", plc.dut_by_name),
-                ("GVLs", plc.gvl_by_name),
-                ("POUs", plc.pou_by_name),
-            ]
-            for plc in tsproj.plcs:
-                for _, source_dict in to_cache:
-                    for source_name in source_dict:
-                        regex = re.compile(rf"\b{source_name}\b")
-                        name_cache[regex] = source_name
-        related = set(
-            name
-            for regex, name in name_cache.items()
-            if regex.search(text)
-        )
+        # tsproj is unused, but remains for compatibility with templates
+        try:
+            index = source_name_indexes[plc]
+        except KeyError:
+            index = source_name_indexes[plc] = get_source_name_index(plc)
 
         return [
-            f"`{name}`_" for name in sorted(related)
+            f"`{name}`_"
+            for name in sorted(find_related_source_names(text, index))
             if name != source_name
         ]
 
@@ -263,15 +550,55 @@ def get_jinja_filters() -> Dict[str, Callable]:
     return filters
 
 
+def compile_template(
+    env: jinja2.Environment,
+    source: str,
+    filename: Optional[str] = None,
+) -> jinja2.Template:
+    """
+    Compile a template from source, using the bytecode cache of the
+    environment, if configured.
+    """
+    bcc = env.bytecode_cache
+    if bcc is None or filename is None:
+        return env.from_string(source)
+
+    bucket = bcc.get_bucket(env, filename, filename, source)
+    if bucket.code is None:
+        bucket.code = env.compile(source, filename, filename)
+        bcc.set_bucket(bucket)
+    else:
+        logger.debug("Loaded compiled template from cache: %s", filename)
+
+    return env.template_class.from_code(
+        env, bucket.code, env.make_globals(None)
+    )
+
+
 def render_template(
     env: jinja2.Environment,
-    template: str,
+    template: Union[str, jinja2.Template],
     context: dict
 ) -> str:
     """
-    Render a template given the jinja environment.
+    Render a template (source or compiled) given the jinja environment.
+    """
+    if isinstance(template, str):
+        template = env.from_string(template)
+    return template.render(context)
+
+
+def generate_template(
+    env: jinja2.Environment,
+    template: Union[str, jinja2.Template],
+    context: dict
+) -> Iterator[str]:
+    """
+    Render a template (source or compiled) in chunks, as they are generated.
     """
-    return env.from_string(template).render(context)
+    if isinstance(template, str):
+        template = env.from_string(template)
+    return template.generate(context)
 
 
 def get_simple_library_versions(plc: pytmc_parser.Plc) -> List[dict]:
@@ -318,6 +645,313 @@ if get_simple_library_versions not in helpers:
     helpers.append(get_simple_library_versions)
 
 
+def get_template_type(template_path: pathlib.Path) -> str:
+    """Get the template type: "per-PLC", "per-tsproj", or "general"."""
+    name = template_path.name.replace(" ", "")
+    if "{plc" in name:
+        return "per-PLC"
+    if "{tsproj" in name:
+        return "per-tsproj"
+    return "general"
+
+
+@functools.lru_cache(maxsize=None)
+def hash_file(filename: Union[str, pathlib.Path]) -> Optional[str]:
+    """SHA-256 of the contents of a file, or None if it does not exist."""
+    try:
+        with open(filename, "rb") as fp:
+            sha256 = hashlib.sha256()
+            for block in iter(functools.partial(fp.read, 1 << 20), b""):
+                sha256.update(block)
+    except OSError:
+        return None
+    return sha256.hexdigest()
+
+
+def get_input_list(filenames) -> List[str]:
+    """Sorted, unique list of input filenames for the manifest."""
+    return sorted(set(str(filename) for filename in filenames))
+
+
+def get_template_dependencies(
+    env: jinja2.Environment,
+    template_path: pathlib.Path,
+) -> List[str]:
+    """
+    Get the template filename and those it imports or includes, by name.
+    """
+    dependencies = [str(template_path)]
+    with open(template_path, "rt") as fp:
+        to_check = [fp.read()]
+
+    seen = set()
+    while to_check:
+        ast = env.parse(to_check.pop())
+        for name in jinja2.meta.find_referenced_templates(ast):
+            if name is None or name in seen:
+                continue
+            seen.add(name)
+            try:
+                source, filename, _ = env.loader.get_source(env, name)
+            except jinja2.TemplateNotFound:
+                continue
+            dependencies.append(filename)
+            to_check.append(source)
+    return dependencies
+
+
+def get_plc_dependencies(plc: pytmc_parser.Plc) -> List[pathlib.Path]:
+    """Get the files which make up a PLC project."""
+    return [
+        plc.filename, plc.project_path, plc.tmc_path, *plc.source_filenames
+    ]
+
+
+def get_tsproj_dependencies(
+    tsproj: pytmc_parser.TcSmProject,
+) -> List[pathlib.Path]:
+    """Get the files which make up a TwinCAT project, including its PLCs."""
+    dependencies = {
+        item.filename
+        for item in tsproj.find(pytmc_parser.TwincatItem)
+        if item.filename is not None
+    }
+    for plc in tsproj.plcs:
+        dependencies.update(get_plc_dependencies(plc))
+    return list(dependencies)
+
+
+def load_manifest(manifest_path: pathlib.Path) -> dict:
+    """Load the manifest of a previous build, or an empty one."""
+    try:
+        with open(manifest_path, "rt") as fp:
+            manifest = json.load(fp)
+    except FileNotFoundError:
+        return {}
+    except Exception as ex:
+        logger.warning(
+            "Ignoring unreadable manifest %s (%s: %s)",
+            manifest_path, type(ex).__name__, ex,
+        )
+        return {}
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def is_output_current(
+    manifest: dict,
+    target_filename: str,
+    output_path: pathlib.Path,
+    options: dict,
+    inputs: Optional[List[str]] = None,
+) -> bool:
+    """
+    Check if an output file is up-to-date with respect to the manifest.
+
+    Parameters
+    ----------
+    manifest : dict
+        The manifest from the previous build.
+
+    target_filename : str
+        The output filename.
+
+    output_path : pathlib.Path
+        The output directory.
+
+    options : dict
+        Versions and command-line options which affect all output.
+
+    inputs : list of str, optional
+        The current inputs from ``get_input_list``, if known.  Otherwise, the
+        inputs recorded in the manifest are checked.
+    """
+    entry = manifest.get("outputs", {}).get(target_filename)
+    if entry is None or entry["options"] != options:
+        return False
+
+    if inputs is not None and inputs != entry["inputs"]:
+        return False
+
+    file_hashes = manifest["files"]
+    if any(hash_file(fn) != file_hashes.get(fn) for fn in entry["inputs"]):
+        return False
+
+    # The output may have been modified or removed in the meantime
+    return hash_file(output_path / target_filename) == entry["sha256"]
+
+
+def get_stale_projects(
+    manifest: dict,
+    projects: List[pathlib.Path],
+    templates: List[pathlib.Path],
+    output_path: pathlib.Path,
+    options: dict,
+) -> Optional[List[pathlib.Path]]:
+    """
+    Determine which projects require parsing, based on the previous build.
+
+    Returns
+    -------
+    list of pathlib.Path or None
+        The projects to parse, or None if all projects must be parsed.
+    """
+    if not manifest or manifest["projects"] != [str(proj) for proj in projects]:
+        return None
+
+    entries_by_template = collections.defaultdict(list)
+    for target_filename, entry in manifest["outputs"].items():
+        entries_by_template[entry["template"]].append((target_filename, entry))
+
+    stale = set()
+    for template_path in templates:
+        template_type = get_template_type(template_path)
+        entries = entries_by_template[str(template_path)]
+        if not entries:
+            return None
+
+        if template_type == "per-tsproj":
+            stale.update(
+                set(manifest["projects"]) -
+                set(entry["tsproj"] for _, entry in entries)
+            )
+
+        for target_filename, entry in entries:
+            if not is_output_current(
+                manifest, target_filename, output_path, options
+            ):
+                if template_type == "general":
+                    return None
+                stale.add(entry["tsproj"])
+
+    return [proj for proj in projects if str(proj) in stale]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_worker_environment(
+    templates: Tuple[pathlib.Path, ...],
+    bytecode_cache_path: Optional[pathlib.Path],
+) -> jinja2.Environment:
+    """The jinja environment of ``main``, once per worker process."""
+    bytecode_cache = None
+    if bytecode_cache_path is not None:
+        bytecode_cache = jinja2.FileSystemBytecodeCache(
+            str(bytecode_cache_path)
+        )
+    return get_jinja_environment(
+        list(templates), bytecode_cache=bytecode_cache
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_worker_template(
+    env: jinja2.Environment, template_path: pathlib.Path
+) -> jinja2.Template:
+    """A compiled template, once per worker process."""
+    with open(template_path, "rt") as fp:
+        source = fp.read()
+    return compile_template(env, source, filename=str(template_path))
+
+
+def _render_plc_in_worker(
+    tsproj_project: pathlib.Path,
+    plc_name: str,
+    solution_path: Optional[pathlib.Path],
+    templates: Tuple[pathlib.Path, ...],
+    renders: List[Tuple[pathlib.Path, pathlib.Path]],
+    dbd: Optional[str],
+    project_data: Optional[bytes],
+    bytecode_cache_path: Optional[pathlib.Path],
+) -> Tuple[List[Tuple[bool, str]], dict]:
+    """
+    Build the context of one PLC in a worker process, rendering its per-PLC
+    templates.
+
+    The context of the project only includes the PLC itself, so per-PLC
+    templates should not refer to the other PLCs or projects (as the
+    default templates do not).
+
+    Parameters
+    ----------
+    renders : list of (template_path, target_path)
+        The outputs to render.
+
+    project_data : bytes, optional
+        The project, serialized by :func:`ads_deploy.cache.dumps`.  If None,
+        it is loaded from the cache.
+
+    Returns
+    -------
+    results : list of (changed, sha256)
+        For each of ``renders``, as in :func:`write_chunks_if_changed`.
+
+    summary : dict
+        The summary of the PLC context, with its linter results, for the
+        per-tsproj and general templates.
+    """
+    if project_data is None:
+        parsed_tsproj = cache.parse(tsproj_project)
+    else:
+        parsed_tsproj = cache.loads(project_data)
+    tsproj = get_tsproj_info(tsproj_project, parsed_tsproj)
+    plc, = iter_plc_info(parsed_tsproj, plcs=[plc_name], dbd=dbd)
+    ctx = dict(get_render_context())
+    ctx.update(get_solution_info(solution_path))
+    ctx.update(tsproj=tsproj, plc=plc)
+
+    env = _get_worker_environment(templates, bytecode_cache_path)
+    results = []
+    for template_path, target_path in renders:
+        template = _get_worker_template(env, template_path)
+        results.append(
+            write_chunks_if_changed(
+                target_path, generate_template(env, template, context=ctx)
+            )
+        )
+    return results, summarize_plc_info(plc, linter_results=True)
+
+
+class _Unchanged(Exception):
+    """Discards the atomic write of an unchanged file."""
+
+
+def write_chunks_if_changed(
+    target_path: pathlib.Path, chunks: Iterable[str]
+) -> Tuple[bool, str]:
+    """
+    Atomically write streamed ``chunks`` to ``target_path``, unless it
+    already has their contents.
+
+    Chunks are written to a temporary file as they come, such that the
+    contents are never held in memory in full, and an interrupted write never
+    leaves a partially-written ``target_path``.
+
+    Returns
+    -------
+    changed : bool
+        True if the file was written.
+
+    sha256 : str
+        SHA-256 of the (UTF-8 encoded) contents.
+    """
+    # Not cached: the file is replaced below
+    existing_hash = hash_file.__wrapped__(target_path)
+    sha256 = hashlib.sha256()
+    try:
+        with util.atomic_write(target_path, "wb") as f:
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                sha256.update(data)
+                f.write(data)
+            if sha256.hexdigest() == existing_hash:
+                raise _Unchanged()
+    except _Unchanged:
+        return False, existing_hash
+    return True, sha256.hexdigest()
+
+
 def main(
     project: pathlib.Path,
     output_path: Union[str, pathlib.Path],
@@ -325,19 +959,34 @@ def main(
     plcs: Optional[List[str]] = None,
     templates: Optional[List[pathlib.Path]] = None,
     dbd: Optional[str] = None,
-    dry_run: bool = False
+    dry_run: bool = False,
+    no_cache: bool = False,
+    jobs: int = 1,
+    force: bool = False,
+    bytecode_cache_path: Optional[str] = None,
+    stream: bool = False,
 ) -> None:
     """
     ``ads-deploy docs`` entrypoint.
     """
     templates = [
-        pathlib.Path(item) for item in (templates or DEFAULT_TEMPLATES)
+        pathlib.Path(item).resolve()
+        for item in (templates or DEFAULT_TEMPLATES)
     ]
 
     if not templates:
         raise ValueError("No templates provided.")
 
-    jinja_env = get_jinja_environment(templates)
+    if bytecode_cache_path is not None:
+        bytecode_cache_path = pathlib.Path(bytecode_cache_path)
+        bytecode_cache_path.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(
+            str(bytecode_cache_path)
+        )
+    else:
+        bytecode_cache = None
+
+    jinja_env = get_jinja_environment(templates, bytecode_cache=bytecode_cache)
     jinja_filename_env = get_jinja_filename_environment(templates)
 
     output_path = pathlib.Path(output_path)
@@ -351,19 +1000,79 @@ def main(
         sys.exit(1)
 
     solution_path, projects = util.get_tsprojects_from_filename(project)
-
-    full_render_args = build_template_kwargs(
-        solution_path, projects, plcs=plcs, dbd=dbd
+    projects = [pathlib.Path(proj).resolve() for proj in projects]
+
+    # Inputs from previous runs may have changed since
+    hash_file.cache_clear()
+    options = {
+        "ads-deploy": __version__,
+        "pytmc": str(pytmc.__version__),
+        "jinja2": jinja2.__version__,
+        "plcs": sorted(plcs or []),
+        "dbd": hash_file(dbd) if dbd else None,
+    }
+    manifest_path = output_path / MANIFEST_FILENAME
+    manifest = {} if (force or dry_run) else load_manifest(manifest_path)
+    to_parse = get_stale_projects(
+        manifest, projects, templates, output_path, options
     )
+    if to_parse is None:
+        to_parse = projects
+    elif not to_parse:
+        logger.info("All outputs are up-to-date")
+        return
+    else:
+        logger.info(
+            "Regenerating outputs of: %s",
+            ", ".join(proj.name for proj in to_parse),
+        )
+
+    # Outputs which are not regenerated below carry over to the new manifest
+    regenerate_all = len(to_parse) == len(projects)
+    not_parsed = set(str(proj) for proj in projects if proj not in to_parse)
+    outputs = {
+        target_filename: entry
+        for target_filename, entry in manifest.get("outputs", {}).items()
+        if entry["tsproj"] in not_parsed or
+        (entry["tsproj"] is None and not regenerate_all)
+    }
+    template_inputs = {
+        template_path: get_template_dependencies(jinja_env, template_path)
+        for template_path in templates
+    }
+    templates_by_type = collections.defaultdict(list)
+    for template_path in templates:
+        templates_by_type[get_template_type(template_path)].append(
+            template_path
+        )
+    logger.debug("All templates: %s", templates)
+
+    tsproj_inputs = {}
+    timing = collections.Counter()
 
     @functools.lru_cache(maxsize=None)
-    def get_template_source(template_path: pathlib.Path) -> str:
+    def get_template(template_path: pathlib.Path) -> jinja2.Template:
         with open(template_path, "rt") as fp:
-            return fp.read()
+            source = fp.read()
+
+        t0 = time.perf_counter()
+        template = compile_template(
+            jinja_env, source, filename=str(template_path)
+        )
+        timing["compile"] += time.perf_counter() - t0
+        return template
 
-    def write_file(template_path, render_args, template_type=""):
+    def check_output(template_path, render_args, template_type, inputs):
+        """Target filename and inputs of an output, or None if current."""
         tpl = jinja_filename_env.get_template(template_path.name)
         target_filename = tpl.render(**render_args)
+        inputs = get_input_list(list(template_inputs[template_path]) + inputs)
+        if not dry_run and is_output_current(
+            manifest, target_filename, output_path, options, inputs=inputs
+        ):
+            logger.info("Up-to-date: %s", target_filename)
+            outputs[target_filename] = manifest["outputs"][target_filename]
+            return None, inputs
 
         logger.info(
             "Rendering %s template: %s -> %s",
@@ -371,37 +1080,247 @@ def main(
             template_path.name,
             target_filename,
         )
+        return target_filename, inputs
+
+    def add_output(target_filename, template_path, inputs, tsproj, changed,
+                   sha256):
+        if not changed:
+            logger.info("Unchanged: %s", target_filename)
+
+        outputs[target_filename] = dict(
+            template=str(template_path),
+            tsproj=tsproj,
+            inputs=inputs,
+            options=options,
+            sha256=sha256,
+        )
 
-        # template = jinja_env.get_template(template_path.name)
-        template = get_template_source(template_path)
-        # contents = template.render(**render_args)
+    def write_file(template_path, render_args, template_type, inputs,
+                   tsproj=None):
+        target_filename, inputs = check_output(
+            template_path, render_args, template_type, inputs
+        )
+        if target_filename is None:
+            return
+
+        template = get_template(template_path)
         ctx = dict(get_render_context())
         ctx.update(render_args)
-        contents = render_template(jinja_env, template, context=ctx)
+        # Rendered in chunks, which are written out as they are generated
+        chunks = generate_template(jinja_env, template, context=ctx)
+        t0 = time.perf_counter()
         if dry_run:
             print("** dry run ** file:", target_filename)
-            print(contents)
+            sys.stdout.writelines(chunks)
+            print()
         else:
-            with open(output_path / target_filename, "wt") as f:
-                f.write(contents)
+            changed, sha256 = write_chunks_if_changed(
+                output_path / target_filename, chunks
+            )
+        # Includes writing, as rendering is interleaved with it
+        timing["render"] += time.perf_counter() - t0
+        timing["rendered"] += 1
+        if not dry_run:
+            add_output(target_filename, template_path, inputs, tsproj,
+                       changed, sha256)
+
+    def write_plc_files(base_args, tsproj, plc):
+        # A bit of hacking: generate template per PLC
+        tsproj_filename = str(tsproj["directory"] / tsproj["filename"])
+        for template_path in templates_by_type["per-PLC"]:
+            render_args = dict(base_args)
+            render_args["tsproj"] = tsproj
+            render_args["plc"] = plc
+            inputs = [tsproj_filename, *get_plc_dependencies(plc["obj"])]
+            write_file(template_path, render_args, "per-PLC", inputs,
+                       tsproj=tsproj_filename)
+
+    def get_plc_task(base_args, tsproj, plc_name, plc_project):
+        """Outputs of a PLC to render in a worker, and the PLC summary."""
+        tsproj_filename = str(tsproj["directory"] / tsproj["filename"])
+        # Only what the output filenames may refer to; the worker builds the
+        # full context
+        plc = dict(name=plc_name, obj=plc_project,
+                   tmc_path=plc_project.tmc_path)
+        inputs = [tsproj_filename, *get_plc_dependencies(plc_project)]
+        renders = []
+        for template_path in templates_by_type["per-PLC"]:
+            render_args = dict(base_args, tsproj=tsproj, plc=plc)
+            target_filename, plc_inputs = check_output(
+                template_path, render_args, "per-PLC", inputs
+            )
+            if target_filename is not None:
+                renders.append((template_path, target_filename, plc_inputs))
+        return tsproj, plc_name, renders
+
+    def write_worker_plc_files(plc_tasks, project_data):
+        t0 = time.perf_counter()
+        args_list = [
+            (
+                tsproj["directory"] / tsproj["filename"],
+                plc_name,
+                solution_path,
+                tuple(templates),
+                [
+                    (template_path, output_path / target_filename)
+                    for template_path, target_filename, _ in renders
+                ],
+                dbd,
+                project_data.get(tsproj["directory"] / tsproj["filename"]),
+                bytecode_cache_path,
+            )
+            for tsproj, plc_name, renders in plc_tasks
+        ]
+        futures = util.run_jobs(_render_plc_in_worker, args_list, jobs=jobs)
+        for (tsproj, _, renders), future in zip(plc_tasks, futures):
+            tsproj_filename = str(tsproj["directory"] / tsproj["filename"])
+            results, summary = future.result()
+            for (template_path, target_filename, inputs), result in zip(
+                renders, results
+            ):
+                add_output(target_filename, template_path, inputs,
+                           tsproj_filename, *result)
+                timing["rendered"] += 1
+            tsproj["plcs"].append(summary)
+        timing["render"] += time.perf_counter() - t0
+
+    def write_tsproj_files(base_args, tsproj):
+        # A bit of hacking: generate template per tsproj
+        tsproj_filename = str(tsproj["directory"] / tsproj["filename"])
+        for template_path in templates_by_type["per-tsproj"]:
+            render_args = dict(base_args)
+            render_args["tsproj"] = tsproj
+            write_file(template_path, render_args, "per-tsproj",
+                       tsproj_inputs[tsproj_filename],
+                       tsproj=tsproj_filename)
+
+    def write_projects_in_workers(render_args, parsed_projects):
+        """
+        Render the per-PLC templates of projects in worker processes, then
+        their per-tsproj templates with summaries of the PLCs.
+        """
+        tsprojects = []
+        plc_tasks = []
+        # Without the cache, workers get the parsed project rather than
+        # parsing it again for each PLC
+        project_data = {}
+        for tsproj_project, parsed_tsproj in parsed_projects:
+            tsproj = get_tsproj_info(tsproj_project, parsed_tsproj)
+            tsprojects.append(tsproj)
+            tsproj_inputs[str(tsproj_project)] = get_tsproj_dependencies(
+                parsed_tsproj
+            )
+            if no_cache:
+                project_data[tsproj_project] = cache.dumps(parsed_tsproj)
+            plc_tasks.extend(
+                get_plc_task(render_args, tsproj, plc_name, plc_project)
+                for plc_name, plc_project in iter_plcs(parsed_tsproj,
+                                                       plcs=plcs)
+            )
 
-    logger.debug("All templates: %s", templates)
-    for template_path in templates:
-        if "{plc" in template_path.name.replace(" ", ""):
-            # A bit of hacking: generate template per PLC
-            for tsproj in full_render_args["tsprojects"]:
-                for plc in tsproj["plcs"]:
-                    render_args = dict(full_render_args)
-                    render_args["tsproj"] = tsproj
-                    render_args["plc"] = plc
-                    write_file(template_path, render_args, "per-PLC")
-        elif "{tsproj" in template_path.name.replace(" ", ""):
-            # A bit of hacking: generate template per tsproj
-            for tsproj in full_render_args["tsprojects"]:
-                render_args = dict(full_render_args)
-                render_args["tsproj"] = tsproj
-                write_file(template_path, render_args, "per-tsproj")
+        write_worker_plc_files(plc_tasks, project_data)
+        for tsproj in tsprojects:
+            write_tsproj_files(render_args, tsproj)
+            render_args["tsprojects"].append(summarize_tsproj_info(tsproj))
+
+    def write_general_files(render_args):
+        if not regenerate_all:
+            return
+        inputs = [
+            filename
+            for filenames in tsproj_inputs.values()
+            for filename in filenames
+        ]
+        if solution_path is not None:
+            inputs.append(solution_path)
+        for template_path in templates_by_type["general"]:
+            write_file(template_path, render_args, "general", inputs)
+
+    if jobs != 1 and not dry_run:
+        # Per-PLC contexts are only built by the worker processes, each of
+        # which renders all of the outputs of a PLC.  As with streaming,
+        # per-tsproj and general templates get summaries of the PLCs.
+        render_args = get_solution_info(solution_path)
+        parsed_projects = cache.parse_all(
+            to_parse, use_cache=not no_cache, jobs=jobs
+        )
+        if stream:
+            # One project at a time, with its PLCs rendered in parallel
+            for tsproj_project in to_parse:
+                write_projects_in_workers(
+                    render_args,
+                    [(tsproj_project, next(parsed_projects))]
+                )
+                clear_pytmc_caches()
         else:
-            write_file(template_path, full_render_args, "general")
+            write_projects_in_workers(
+                render_args, zip(to_parse, parsed_projects)
+            )
+    elif stream:
+        # One project, and one PLC of it, in memory at a time.  General
+        # templates only get summaries of the projects and PLCs.
+        render_args = get_solution_info(solution_path)
+        parsed_projects = cache.parse_all(
+            to_parse, use_cache=not no_cache, jobs=jobs
+        )
+        for tsproj_project in to_parse:
+            # Not zip(), as its reused result tuple would keep the previous
+            # project alive while the next one is parsed
+            parsed_tsproj = next(parsed_projects)
+            tsproj = get_tsproj_info(tsproj_project, parsed_tsproj)
+            tsproj_inputs[str(tsproj_project)] = get_tsproj_dependencies(
+                parsed_tsproj
+            )
+            for plc in iter_plc_info(parsed_tsproj, plcs=plcs, dbd=dbd):
+                write_plc_files(render_args, tsproj, plc)
+                tsproj["plcs"].append(
+                    summarize_plc_info(plc, linter_results=True)
+                )
+                del plc
+
+            write_tsproj_files(render_args, tsproj)
+            render_args["tsprojects"].append(summarize_tsproj_info(tsproj))
+            del tsproj, parsed_tsproj
+            clear_pytmc_caches()
+    else:
+        render_args = build_template_kwargs(
+            solution_path,
+            to_parse,
+            plcs=plcs,
+            dbd=dbd,
+            use_cache=not no_cache,
+            jobs=jobs,
+        )
+        for tsproj in render_args["tsprojects"]:
+            tsproj_inputs[str(tsproj["directory"] / tsproj["filename"])] = (
+                get_tsproj_dependencies(tsproj["obj"])
+            )
+            for plc in tsproj["plcs"]:
+                write_plc_files(render_args, tsproj, plc)
+            write_tsproj_files(render_args, tsproj)
+
+    write_general_files(render_args)
+
+    logger.debug(
+        "Compiled %d templates in %.3f s; rendered %d files in %.3f s",
+        get_template.cache_info().currsize,
+        timing["compile"],
+        timing["rendered"],
+        timing["render"],
+    )
+
+    if not dry_run:
+        manifest = dict(
+            version=MANIFEST_VERSION,
+            projects=[str(proj) for proj in projects],
+            files={
+                filename: hash_file(filename)
+                for entry in outputs.values()
+                for filename in entry["inputs"]
+            },
+            outputs=outputs,
+        )
+        with open(manifest_path, "wt") as f:
+            json.dump(manifest, f, sort_keys=True)
 
     logger.info("Done")
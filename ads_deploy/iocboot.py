@@ -11,9 +11,8 @@ import pathlib
 import sys
 
 import jinja2
-import pytmc
 
-from . import util
+from . import cache, util
 
 DESCRIPTION = __doc__
 logger = logging.getLogger(__name__)
@@ -84,6 +83,20 @@ def build_arg_parser(parser=None):
         help='Specify an additional macro for the template (VAR=VALUE)'
     )
 
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use the cache of parsed projects'
+    )
+
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help=('Number of worker processes for parsing projects '
+              '(0 for one per CPU) [default: 1]')
+    )
+
     return parser
 
 
@@ -217,7 +230,7 @@ def get_template_paths(ioc_template_path, makefile_name='Makefile.ioc'):
 
 def main(project, ioc_template_path, *, destination=None, prefix='ioc-',
          overwrite=False, makefile_name='Makefile.ioc', dry_run=False,
-         plcs=None, macro=None):
+         plcs=None, macro=None, no_cache=False, jobs=1):
     solution_path, projects = util.get_tsprojects_from_filename(project.name)
 
     if not destination:
@@ -241,8 +254,9 @@ def main(project, ioc_template_path, *, destination=None, prefix='ioc-',
     logger.debug('Makefile path: %s', makefile_path)
     logger.debug('Settings     : %s', iocboot_settings)
 
-    for tsproj_project in projects:
-        parsed_tsproj = pytmc.parser.parse(tsproj_project)
+    parsed_projects = cache.parse_all(projects, use_cache=not no_cache,
+                                      jobs=jobs)
+    for tsproj_project, parsed_tsproj in zip(projects, parsed_projects):
         for plc_name, plc_project in parsed_tsproj.plcs_by_name.items():
             logger.debug('Project: %s PLC: %s', tsproj_project, plc_name)
 
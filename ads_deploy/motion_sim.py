@@ -0,0 +1,245 @@
+"""
+Simulation of DUT_MotionStage axes for the `ads-deploy caproto` mock IOC.
+
+Each axis is served as a motor record at its PV prefix, as the ADS IOC would.
+The state of all axes is kept in a single NumPy structured array, advanced
+by one fixed-rate tick for all axes at once.  Readback (RBV) and done-moving
+(DMOV/MOVN) updates for the axes which changed are then written as one batch.
+
+Moves run at constant velocity (VELO) without acceleration, and targets are
+clipped to the user limits (HLM/LLM) unless these are equal, which disables
+them as for the motor record.
+"""
+
+import asyncio
+import logging
+
+import numpy
+from caproto.server import PVGroup, pvproperty
+
+from . import caproto_ioc, util
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TICK_RATE = 10.0
+DEFAULT_VELOCITY = 1.0
+
+STATE_DTYPE = numpy.dtype([
+    ('position', 'f8'),
+    ('target', 'f8'),
+    ('velocity', 'f8'),
+    ('low_limit', 'f8'),
+    ('high_limit', 'f8'),
+    ('done', '?'),
+])
+
+
+class MotionSimulator:
+    """
+    Simulate motion stages, serving each as a motor record.
+
+    Parameters
+    ----------
+    motors : dict
+        IOC (PLC) name to a list of motor PV prefixes, as from
+        :func:`ads_deploy.util.get_motor_prefixes`.
+
+    tick_rate : float, optional
+        Simulation updates per second.
+
+    velocity : float, optional
+        Initial velocity of all axes, in EGU/s.
+
+    Attributes
+    ----------
+    state : numpy.ndarray
+        The state of all axes, with dtype :data:`STATE_DTYPE`.
+
+    prefixes : list of str
+        The motor PV prefixes, in the order of ``state``.
+
+    pvdbs : dict
+        IOC name to a PV database of its motor records.
+    """
+
+    def __init__(self, motors, *, tick_rate=DEFAULT_TICK_RATE,
+                 velocity=DEFAULT_VELOCITY):
+        self.tick_rate = tick_rate
+        self.prefixes = []
+        self.records = []
+        self.pvdbs = {}
+
+        group_class = type('MotionSimulator', (PVGroup, ),
+                           {'__module__': __name__})
+        self.group = group_class(prefix='', name='MotionSimulator')
+        for ioc_name, prefixes in motors.items():
+            pvdb = self.pvdbs.setdefault(ioc_name, {})
+            for prefix in prefixes:
+                if '.' in prefix:
+                    # e.g., a symbol name, without a pragma or NC axis
+                    logger.warning('Not simulating motion stage %s of %s: '
+                                   'not a valid record name', prefix,
+                                   ioc_name)
+                    continue
+                if prefix in pvdb:
+                    logger.warning('Duplicate motion stage %s in %s', prefix,
+                                   ioc_name)
+                    continue
+                pvdb[prefix] = self._create(prefix, len(self.prefixes))
+                self.prefixes.append(prefix)
+                self.records.append(pvdb[prefix])
+
+        self.state = numpy.zeros(len(self.prefixes), dtype=STATE_DTYPE)
+        self.state['velocity'] = velocity
+        self.state['done'] = True
+
+    def _create(self, prefix, idx):
+        async def put(group, instance, value):
+            self.move([idx], [value])
+            fields = instance.field_inst
+            await fields.done_moving_to_value.write(0)
+            await fields.motor_is_moving.write(1)
+            return float(self.state['target'][idx])
+
+        prop = pvproperty(name=prefix, value=0.0, record='motor', put=put,
+                          precision=3)
+        prop.__set_name__(PVGroup, util.pvname_to_attribute(prefix))
+        return prop.pvspec.create(self.group)
+
+    def move(self, indices, targets):
+        """
+        Start moving axes to new targets.
+
+        The velocity and limits are taken from each motor record's VELO,
+        HLM and LLM fields.
+
+        Parameters
+        ----------
+        indices : sequence of int
+            Indices of the axes in ``state``.
+
+        targets : sequence of float
+            The target positions.
+        """
+        indices = numpy.asarray(indices, dtype=int)
+        fields = [self.records[idx].field_inst for idx in indices]
+        velocity = numpy.array([f.velocity.value for f in fields], dtype=float)
+        low = numpy.array([f.user_low_limit.value for f in fields],
+                          dtype=float)
+        high = numpy.array([f.user_high_limit.value for f in fields],
+                           dtype=float)
+
+        targets = numpy.asarray(targets, dtype=float)
+        limited = low != high
+        targets[limited] = numpy.clip(targets[limited], low[limited],
+                                      high[limited])
+
+        state = self.state
+        state['target'][indices] = targets
+        state['velocity'][indices] = numpy.where(
+            velocity > 0, velocity, state['velocity'][indices])
+        state['low_limit'][indices] = low
+        state['high_limit'][indices] = high
+        state['done'][indices] = False
+
+    def stop(self, indices):
+        """Stop axes at their current position."""
+        state = self.state
+        state['target'][indices] = state['position'][indices]
+
+    def step(self, dt):
+        """
+        Advance all moving axes by ``dt`` seconds.
+
+        Returns
+        -------
+        moved : numpy.ndarray
+            Indices of the axes which were moving.
+
+        finished : numpy.ndarray
+            Indices of the axes which reached their target.
+        """
+        state = self.state
+        moved = numpy.flatnonzero(~state['done'])
+        if not len(moved):
+            return moved, moved
+
+        position = state['position'][moved]
+        target = state['target'][moved]
+        delta = target - position
+        max_step = state['velocity'][moved] * dt
+        arrived = numpy.abs(delta) <= max_step
+
+        state['position'][moved] = numpy.where(
+            arrived, target, position + numpy.sign(delta) * max_step)
+        finished = moved[arrived]
+        state['done'][finished] = True
+        return moved, finished
+
+    def _check_stop(self, moving):
+        """Stop moving axes which had their STOP field set."""
+        stopped = [idx for idx in moving
+                   if self.records[idx].field_inst.stop.value]
+        if stopped:
+            self.stop(stopped)
+        return stopped
+
+    async def publish(self, moved, finished, stopped=()):
+        """Write the readbacks of moved axes and the status of others."""
+        writes = []
+        position = self.state['position']
+        for idx in moved:
+            fields = self.records[idx].field_inst
+            value = float(position[idx])
+            writes.append((self.records[idx], 'RBV',
+                           fields.user_readback_value, value))
+            writes.append((self.records[idx], 'DRBV',
+                           fields.dial_readback_value, value))
+
+        for idx in stopped:
+            fields = self.records[idx].field_inst
+            writes.append((self.records[idx], 'STOP', fields.stop, 0))
+
+        for idx in finished:
+            fields = self.records[idx].field_inst
+            writes.append((self.records[idx], 'MOVN', fields.motor_is_moving,
+                           0))
+            writes.append((self.records[idx], 'DMOV',
+                           fields.done_moving_to_value, 1))
+
+        # In order, such that DMOV follows the final readback
+        failures = await caproto_ioc.write_field_values(writes, concurrency=1)
+        for pvname, field_name, value, ex in failures:
+            logger.warning('Failed to update %s.%s => %s (%s)', pvname,
+                           field_name, value, ex)
+
+    async def _initialize(self):
+        writes = []
+        for record, velocity in zip(self.records, self.state['velocity']):
+            fields = record.field_inst
+            writes.append((record, 'VELO', fields.velocity, float(velocity)))
+            writes.append((record, 'DMOV', fields.done_moving_to_value, 1))
+        await caproto_ioc.write_field_values(writes, concurrency=1)
+
+    async def run(self):
+        """Run the simulation at ``tick_rate`` until cancelled."""
+        await self._initialize()
+        logger.info('Simulating %d motion stage(s) at %g Hz',
+                    len(self.prefixes), self.tick_rate)
+
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        while True:
+            next_tick += period
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # Running behind; skip the missed ticks, rather than catch up
+                next_tick -= delay
+                delay = 0
+            await asyncio.sleep(delay)
+
+            stopped = self._check_stop(numpy.flatnonzero(~self.state['done']))
+            moved, finished = self.step(period)
+            if len(moved) or stopped:
+                await self.publish(moved, finished, stopped)
@@ -0,0 +1,225 @@
+"""
+Coalescing and rate limiting of output to input record puts, for the
+`ads-deploy caproto` mock IOC.
+
+By default, each put to an output record is written to its input record
+straight away.  Clients which put in quick succession (e.g., a slider in a
+typhos screen) then cause as many monitor updates of the input record.
+
+With a coalescing window, an input record is written at most once per window:
+a put is forwarded immediately if the window since the last forward to that
+record has passed, and otherwise the latest value is held back and forwarded
+at the end of the window.  Values replaced before that are counted as
+*merged*.
+
+With a maximum rate, forwards to all input records share a token bucket.
+Values which are held back for lack of tokens, and replaced by a later put
+before they are forwarded, are counted as *dropped*.
+"""
+
+import asyncio
+import fnmatch
+import logging
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for held back values which are due
+TICK_PERIOD = 0.01
+# Burst size of the rate limit, in seconds at the maximum rate
+BURST_TIME = 0.1
+# Seconds between logging the counters, if changed
+LOG_INTERVAL = 60.0
+
+COUNTERS = ('forwarded', 'merged', 'dropped', 'failed')
+
+
+def parse_window(value):
+    """
+    Parse a per-PV coalescing window of the form ``GLOB=SECONDS``.
+
+    Returns
+    -------
+    (str, float)
+    """
+    pattern, sep, seconds = value.rpartition('=')
+    if not sep or not pattern:
+        raise ValueError(f'Expected GLOB=SECONDS: {value!r}')
+    return pattern, float(seconds)
+
+
+class PutForwarder:
+    """
+    Forward values put to output records to their input records.
+
+    Parameters
+    ----------
+    window : float, optional
+        Default coalescing window of all output records, in seconds.  0
+        disables coalescing.
+
+    windows : list of (str, float), optional
+        Coalescing windows for output records with PV names matching glob
+        patterns, overriding ``window``.  The first match is used.
+
+    max_rate : float, optional
+        Maximum number of forwards per second, over all records.
+
+    Attributes
+    ----------
+    counters : dict
+        Count of values forwarded, merged (within a coalescing window),
+        dropped (held back by the rate limit) and failed to be written.
+    """
+
+    def __init__(self, *, window=0.0, windows=None, max_rate=None):
+        self.window = window
+        self.windows = list(windows or [])
+        self.max_rate = max_rate
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._windows_by_pvname = {}
+        # Input ChannelData to [value, time due]
+        self._pending = {}
+        # Input ChannelData to the time of its last forward
+        self._last_forward = weakref.WeakKeyDictionary()
+        self._tokens = self._burst
+        self._token_time = time.monotonic()
+        # Set by run(), in the event loop
+        self._wakeup = None
+
+    @property
+    def _burst(self):
+        if self.max_rate is None:
+            return float('inf')
+        return max(self.max_rate * BURST_TIME, 1.0)
+
+    def get_window(self, pvname):
+        """Get the coalescing window of an output record."""
+        try:
+            return self._windows_by_pvname[pvname]
+        except KeyError:
+            ...
+
+        window = self.window
+        for pattern, seconds in self.windows:
+            if fnmatch.fnmatchcase(pvname, pattern):
+                window = seconds
+                break
+        self._windows_by_pvname[pvname] = window
+        return window
+
+    def _take_token(self, now):
+        if self.max_rate is None:
+            return True
+
+        self._tokens = min(
+            self._burst,
+            self._tokens + (now - self._token_time) * self.max_rate
+        )
+        self._token_time = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def _write(self, target, value, now):
+        self._last_forward[target] = now
+        try:
+            await target.write(value)
+        except Exception:
+            self.counters['failed'] += 1
+            raise
+        self.counters['forwarded'] += 1
+
+    async def forward(self, pvname, target, value):
+        """
+        Forward a value put to an output record.
+
+        Parameters
+        ----------
+        pvname : str
+            The output record PV name.
+
+        target : caproto.ChannelData
+            The input record.
+
+        value :
+            The value put.
+        """
+        window = self.get_window(pvname)
+        if not window and self.max_rate is None:
+            try:
+                await target.write(value)
+            except Exception:
+                self.counters['failed'] += 1
+                raise
+            self.counters['forwarded'] += 1
+            return
+
+        now = time.monotonic()
+        pending = self._pending.get(target)
+        if pending is not None:
+            self.counters['merged' if pending[1] > now else 'dropped'] += 1
+            pending[0] = value
+            return
+
+        due = self._last_forward.get(target, -window) + window
+        if due <= now and self._take_token(now):
+            await self._write(target, value, now)
+            return
+
+        self._pending[target] = [value, max(due, now)]
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self, now=None):
+        """Forward held back values which are due, subject to the rate."""
+        if now is None:
+            now = time.monotonic()
+        due = sorted(
+            ((item[1], target) for target, item in self._pending.items()
+             if item[1] <= now),
+            key=lambda pair: pair[0]
+        )
+        for _, target in due:
+            if not self._take_token(now):
+                break
+            value, _ = self._pending.pop(target)
+            try:
+                await self._write(target, value, now)
+            except Exception as ex:
+                logger.debug('Failed to forward %r to %s: %s', value,
+                             target.pvname, ex)
+
+    def log_counters(self, level=logging.INFO):
+        """Log the counters."""
+        logger.log(level, 'Put forwarding: %(forwarded)d forwarded, '
+                   '%(merged)d merged, %(dropped)d dropped, %(failed)d '
+                   'failed', self.counters)
+
+    async def run(self):
+        """Forward held back values as they become due."""
+        self._wakeup = asyncio.Event()
+        logged = dict(self.counters)
+        next_log = time.monotonic() + LOG_INTERVAL
+        try:
+            while True:
+                if not self._pending:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(),
+                                               LOG_INTERVAL)
+                    except asyncio.TimeoutError:
+                        ...
+                else:
+                    await asyncio.sleep(TICK_PERIOD)
+                    await self.flush()
+
+                if time.monotonic() >= next_log:
+                    next_log = time.monotonic() + LOG_INTERVAL
+                    if self.counters != logged:
+                        logged = dict(self.counters)
+                        self.log_counters()
+        finally:
+            self.log_counters()
@@ -0,0 +1,250 @@
+"""
+Autosave-style snapshots of the record values of the `ads-deploy caproto`
+mock IOC.
+
+With ``--snapshot FILE``, the values of all records which have been set (or,
+with ``--lazy``, created) are written to FILE every ``--snapshot-interval``
+seconds, on shutdown, and on demand when a value is put to the ``SAVE`` PV
+under ``--snapshot-prefix``.  Values are gathered on the event loop, but
+converted and written by a separate thread, such that large snapshots do not
+hold up Channel Access requests.
+
+With ``--restore FILE``, the values of a snapshot are loaded in bulk before
+the servers start.  They are set directly, rather than put, so output records
+are not forwarded to their input and no monitors are posted.
+
+Snapshots are PV trace files (see :mod:`ads_deploy.pvtrace`) with one sample
+per record, so the final values of a recorded trace may be restored as well.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import time
+
+import numpy
+from caproto.server import PVGroup, pvproperty
+
+from . import caproto_ioc, pvtrace
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFIX = 'ADS_DEPLOY:SNAPSHOT:'
+# Seconds between periodic snapshots
+SNAPSHOT_INTERVAL = 60.0
+
+
+def get_record_values(source):
+    """
+    Get the values of the records of a snapshot source.
+
+    Parameters
+    ----------
+    source : dict or LazyPVDatabase
+        Record PV name to ChannelData, or a lazy PV database.
+
+    Returns
+    -------
+    dict
+        PV name to (value, timestamp), where the timestamp may be None.
+    """
+    if isinstance(source, caproto_ioc.LazyPVDatabase):
+        return source.record_values()
+    return {
+        pvname: (channeldata.value, channeldata.timestamp)
+        for pvname, channeldata in source.items()
+    }
+
+
+def restore_values(sources, values):
+    """
+    Restore record values into snapshot sources, ahead of serving them.
+
+    Values of PVs which are not in any source are skipped, as are those which
+    no longer fit their record (e.g., as its type changed).
+
+    Parameters
+    ----------
+    sources : list of dict or LazyPVDatabase
+        As for :func:`get_record_values`.
+
+    values : dict
+        PV name to (value, timestamp).
+
+    Returns
+    -------
+    int
+        The number of values restored.
+    """
+    restored = 0
+    failures = []
+    remaining = dict(values)
+    for source in sources:
+        if isinstance(source, caproto_ioc.LazyPVDatabase):
+            source_values = {
+                pvname: remaining.pop(pvname) for pvname in list(remaining)
+                if pvname in source.records
+            }
+            source_failures = source.set_initial_values(source_values)
+            restored += len(source_values) - len(source_failures)
+            failures.extend(source_failures)
+            continue
+
+        for pvname in [pvname for pvname in remaining if pvname in source]:
+            value, timestamp = remaining.pop(pvname)
+            try:
+                caproto_ioc.set_value(source[pvname], value, timestamp)
+            except Exception as ex:
+                failures.append((pvname, value, ex))
+            else:
+                restored += 1
+
+    for pvname, value, ex in failures:
+        logger.debug('Failed to restore %s => %r (%s)', pvname, value, ex)
+    if failures:
+        logger.warning('Failed to restore %d value(s), e.g., %s (%s)',
+                       len(failures), failures[0][0], failures[0][2])
+    if remaining:
+        # Expected with --shards, where each shard serves a part
+        logger.info('Skipping %d restored value(s) of PVs which are not '
+                    'served', len(remaining))
+    return restored
+
+
+def load_snapshot(filename):
+    """
+    Load the values of a snapshot, or the last values of a trace.
+
+    Returns
+    -------
+    dict
+        PV name to (value, timestamp).
+    """
+    with pvtrace.Trace(filename) as trace:
+        return {
+            pvname: (pvtrace.get_value(channel, -1),
+                     float(channel.timestamps[-1]))
+            for pvname, channel in trace.channels.items()
+            if len(channel.timestamps)
+        }
+
+
+def write_snapshot(filename, values, *, metadata=None):
+    """
+    Write a snapshot file.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        The file to (atomically) write.
+
+    values : dict
+        PV name to (value, timestamp), where a timestamp of None is taken as
+        now.
+    """
+    now = time.time()
+    pvtrace.write_trace(
+        filename,
+        ((pvname, [now if timestamp is None else timestamp], [value])
+         for pvname, (value, timestamp) in values.items()),
+        metadata=dict(metadata or {}, snapshot_time=now),
+    )
+
+
+class SnapshotGroup(PVGroup):
+    """PVs for taking snapshots on demand."""
+
+    save = pvproperty(name='SAVE', value=0,
+                      doc='Put any value to write a snapshot now')
+    last_save = pvproperty(name='LAST_SAVE', value=0.0, read_only=True,
+                           units='s', doc='UNIX time of the last snapshot')
+    pvs = pvproperty(name='PVS', value=0, read_only=True,
+                     doc='Number of records in the last snapshot')
+
+    @save.putter
+    async def save(self, instance, value):
+        await self.snapshotter.save()
+        return value
+
+
+class Snapshotter:
+    """
+    Write snapshots of the record values of the mock IOC.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        The snapshot file.
+
+    interval : float, optional
+        Seconds between periodic snapshots, or 0 to only write them on demand
+        and on shutdown.
+
+    prefix : str, optional
+        Prefix of the PVs for taking snapshots on demand.
+
+    Attributes
+    ----------
+    sources : list of dict or LazyPVDatabase
+        Where to take the record values from; see :func:`get_record_values`.
+
+    group : SnapshotGroup
+        The on-demand PVs, served from ``group.pvdb``.
+    """
+
+    def __init__(self, filename, *, interval=SNAPSHOT_INTERVAL,
+                 prefix=DEFAULT_PREFIX):
+        self.filename = filename
+        self.interval = interval
+        self.sources = []
+        self.group = SnapshotGroup(prefix=prefix)
+        self.group.snapshotter = self
+        # One writer thread, such that the file is written in order
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def collect(self):
+        """Gather the current record values, copying arrays."""
+        values = {}
+        for source in self.sources:
+            for pvname, (value, timestamp) in get_record_values(
+                    source).items():
+                if isinstance(value, numpy.ndarray):
+                    value = value.copy()
+                values[pvname] = (value, timestamp)
+        return values
+
+    def _write(self, values):
+        try:
+            write_snapshot(self.filename, values)
+        except OSError:
+            logger.exception('Failed to write snapshot %s', self.filename)
+            return False
+        return True
+
+    async def save(self):
+        """Write a snapshot, returning once it is written."""
+        values = self.collect()
+        written = await asyncio.wrap_future(
+            self._executor.submit(self._write, values)
+        )
+        if written:
+            logger.debug('Wrote %d value(s) to %s', len(values),
+                         self.filename)
+            await self.group.pvs.write(len(values))
+            await self.group.last_save.write(time.time())
+
+    async def run(self):
+        """Write snapshots periodically, and when cancelled on shutdown."""
+        try:
+            while True:
+                if self.interval:
+                    await asyncio.sleep(self.interval)
+                    await self.save()
+                else:
+                    await asyncio.sleep(3600)
+        finally:
+            values = self.collect()
+            self._executor.submit(self._write, values)
+            self._executor.shutdown(wait=True)
+            logger.info('Saved %d value(s) to %s', len(values),
+                        self.filename)
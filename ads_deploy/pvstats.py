@@ -0,0 +1,433 @@
+"""
+Per-PV runtime statistics for the `ads-deploy caproto` mock IOC.
+
+With ``--stats``, client reads, puts (with their latency) and subscriptions
+are counted per PV, in one row of a NumPy structured array per PV which has
+been looked up.  A few summary PVs, served under ``--stats-prefix``, report
+the totals, the current rates and the hottest PVs.  With ``--stats-file``,
+all counters are also written periodically in the OpenMetrics text format,
+e.g., for node_exporter's textfile collector.
+
+Counting a request costs about as much as a dictionary lookup, such that the
+statistics may be left enabled for load tests.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import time
+
+import numpy
+from caproto import ChannelType
+from caproto.server import PVGroup, pvproperty
+
+from . import util
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PREFIX = 'ADS_DEPLOY:STATS:'
+DEFAULT_TOP = 10
+# Seconds between updates of the summary PVs
+SUMMARY_PERIOD = 1.0
+# Seconds between writes of the OpenMetrics file
+DUMP_INTERVAL = 15.0
+# Maximum length of the top-N summary PVs
+TOP_LENGTH = 4096
+# Initial number of rows of a counter table
+INITIAL_SIZE = 1024
+
+COUNTER_DTYPE = numpy.dtype([
+    ('reads', 'u8'),
+    ('writes', 'u8'),
+    ('put_errors', 'u8'),
+    ('subscriptions', 'u8'),
+    ('put_time', 'f8'),
+    ('put_time_max', 'f8'),
+])
+
+# OpenMetrics family, type, counter column and help, in order of output
+METRICS = [
+    ('ads_deploy_pv_reads', 'counter', 'reads', 'Client reads of the PV.'),
+    ('ads_deploy_pv_writes', 'counter', 'writes', 'Client puts to the PV.'),
+    ('ads_deploy_pv_put_errors', 'counter', 'put_errors',
+     'Client puts to the PV which failed.'),
+    ('ads_deploy_pv_subscriptions', 'counter', 'subscriptions',
+     'Subscriptions to the PV.'),
+    ('ads_deploy_pv_put_max_seconds', 'gauge', 'put_time_max',
+     'Longest time taken by a client put to the PV.'),
+]
+
+
+class CounterTable:
+    """
+    Per-PV counters, in one row of a structured array per PV.
+
+    Attributes
+    ----------
+    counts : numpy.ndarray
+        The counters, with dtype :data:`COUNTER_DTYPE`.  Only the first
+        ``len(table)`` rows are in use.  The array is replaced as the table
+        grows, so look this up rather than keeping it.
+
+    pvnames : list of str
+        PV name of each row.
+    """
+
+    def __init__(self, size=INITIAL_SIZE):
+        self.counts = numpy.zeros(size, dtype=COUNTER_DTYPE)
+        self.pvnames = []
+        self._index = {}
+        self._set_columns()
+
+    def _set_columns(self):
+        # Views per column are much cheaper to update than rows
+        for name in COUNTER_DTYPE.names:
+            setattr(self, name, self.counts[name])
+
+    def __len__(self):
+        return len(self.pvnames)
+
+    def index(self, pvname):
+        """Get the row of a PV, adding it if necessary."""
+        try:
+            return self._index[pvname]
+        except KeyError:
+            ...
+
+        index = len(self.pvnames)
+        if index == len(self.counts):
+            counts = numpy.zeros(2 * len(self.counts), dtype=COUNTER_DTYPE)
+            counts[:index] = self.counts
+            self.counts = counts
+            self._set_columns()
+
+        self.pvnames.append(pvname)
+        self._index[pvname] = index
+        return index
+
+    def snapshot(self):
+        """Get a copy of the counters in use, with their PV names."""
+        return self.counts[:len(self.pvnames)].copy(), list(self.pvnames)
+
+
+def top_pvs(pvnames, values, count):
+    """
+    Get the PVs with the highest (nonzero) values, highest first.
+
+    Returns
+    -------
+    list of (str, float)
+    """
+    count = min(count, len(values))
+    if not count:
+        return []
+    indices = numpy.argpartition(values, -count)[-count:]
+    indices = indices[numpy.argsort(-values[indices], kind='stable')]
+    return [(pvnames[idx], values[idx].item()) for idx in indices
+            if values[idx] > 0]
+
+
+def format_top(top, max_length=TOP_LENGTH):
+    """Format PVs and values as ``PV=value`` pairs, truncated to fit."""
+    text = ' '.join(f'{pvname}={value:.3g}' for pvname, value in top)
+    if len(text) >= max_length:
+        text = text[:max_length - 1].rsplit(' ', 1)[0]
+    return text
+
+
+def _escape_label(value):
+    return (value.replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'))
+
+
+def format_openmetrics(counts, pvnames, forward_counters=None):
+    """
+    Format counters in the OpenMetrics text format.
+
+    PVs with no activity are left out.
+
+    Parameters
+    ----------
+    counts : numpy.ndarray
+        Counters with dtype :data:`COUNTER_DTYPE`.
+
+    pvnames : list of str
+        PV name of each row.
+
+    forward_counters : dict, optional
+        The counters of a :class:`ads_deploy.put_forwarding.PutForwarder`.
+
+    Returns
+    -------
+    str
+    """
+    active = numpy.flatnonzero(
+        (counts['reads'] > 0) | (counts['writes'] > 0) |
+        (counts['subscriptions'] > 0)
+    )
+    labels = [f'{{pv="{_escape_label(pvnames[idx])}"}}' for idx in active]
+
+    def samples(name, column):
+        values = counts[column][active].tolist()
+        return [f'{name}{label} {value}'
+                for label, value in zip(labels, values)]
+
+    lines = []
+    for family, metric_type, column, help_text in METRICS:
+        lines.append(f'# TYPE {family} {metric_type}')
+        lines.append(f'# HELP {family} {help_text}')
+        suffix = '_total' if metric_type == 'counter' else ''
+        lines.extend(samples(family + suffix, column))
+
+    family = 'ads_deploy_pv_put_seconds'
+    lines.append(f'# TYPE {family} summary')
+    lines.append(f'# HELP {family} Time taken by client puts to the PV.')
+    lines.append(f'# UNIT {family} seconds')
+    lines.extend(samples(f'{family}_count', 'writes'))
+    lines.extend(samples(f'{family}_sum', 'put_time'))
+
+    if forward_counters is not None:
+        family = 'ads_deploy_put_forwards'
+        lines.append(f'# TYPE {family} counter')
+        lines.append(f'# HELP {family} Puts to output records, by what '
+                     'became of them.')
+        lines.extend(f'{family}_total{{result="{result}"}} {count}'
+                     for result, count in forward_counters.items())
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+class StatsPVDatabase(util.InstrumentedPVDatabase):
+    """
+    A PV database which counts client requests per PV.
+
+    Parameters
+    ----------
+    pvdb : dict
+        The PV database to wrap.
+
+    table : CounterTable
+        Where to count the requests.
+    """
+
+    def __init__(self, pvdb, table):
+        super().__init__(pvdb)
+        self.table = table
+
+    def instrument(self, pvname, channeldata):
+        table = self.table
+        index = table.index(pvname)
+        auth_read = channeldata.auth_read
+        auth_write = channeldata.auth_write
+        subscribe = channeldata.subscribe
+
+        async def counted_auth_read(*args, **kwargs):
+            table.reads[index] += 1
+            return await auth_read(*args, **kwargs)
+
+        async def counted_auth_write(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await auth_write(*args, **kwargs)
+            except Exception:
+                table.put_errors[index] += 1
+                raise
+            finally:
+                elapsed = time.perf_counter() - t0
+                table.writes[index] += 1
+                table.put_time[index] += elapsed
+                if elapsed > table.put_time_max[index]:
+                    table.put_time_max[index] = elapsed
+
+        async def counted_subscribe(*args, **kwargs):
+            table.subscriptions[index] += 1
+            return await subscribe(*args, **kwargs)
+
+        channeldata.auth_read = counted_auth_read
+        channeldata.auth_write = counted_auth_write
+        channeldata.subscribe = counted_subscribe
+
+
+class StatsGroup(PVGroup):
+    """Summary PVs of the per-PV statistics."""
+
+    pvs = pvproperty(name='PVS', value=0, read_only=True,
+                     doc='Number of PVs looked up by clients')
+    reads = pvproperty(name='READS', value=0, read_only=True,
+                       doc='Total client reads')
+    writes = pvproperty(name='WRITES', value=0, read_only=True,
+                        doc='Total client puts')
+    put_errors = pvproperty(name='PUT_ERRORS', value=0, read_only=True,
+                            doc='Total failed client puts')
+    subscriptions = pvproperty(name='SUBSCRIPTIONS', value=0, read_only=True,
+                               doc='Total subscriptions')
+    read_rate = pvproperty(name='READ_RATE', value=0.0, read_only=True,
+                           units='Hz', precision=1,
+                           doc='Client reads per second')
+    write_rate = pvproperty(name='WRITE_RATE', value=0.0, read_only=True,
+                            units='Hz', precision=1,
+                            doc='Client puts per second')
+    subscription_rate = pvproperty(name='SUBSCRIPTION_RATE', value=0.0,
+                                   read_only=True, units='Hz', precision=1,
+                                   doc='Subscriptions per second')
+    put_latency = pvproperty(name='PUT_LATENCY', value=0.0, read_only=True,
+                             units='ms', precision=3,
+                             doc='Mean time taken by recent client puts')
+    put_latency_max = pvproperty(name='PUT_LATENCY_MAX', value=0.0,
+                                 read_only=True, units='ms', precision=3,
+                                 doc='Longest time taken by a client put')
+    top_reads = pvproperty(name='TOP_READS', value='', read_only=True,
+                           dtype=ChannelType.CHAR, max_length=TOP_LENGTH,
+                           report_as_string=True,
+                           doc='PVs with the most reads per second')
+    top_writes = pvproperty(name='TOP_WRITES', value='', read_only=True,
+                            dtype=ChannelType.CHAR, max_length=TOP_LENGTH,
+                            report_as_string=True,
+                            doc='PVs with the most puts per second')
+    top_subscriptions = pvproperty(
+        name='TOP_SUBSCRIPTIONS', value='', read_only=True,
+        dtype=ChannelType.CHAR, max_length=TOP_LENGTH, report_as_string=True,
+        doc='PVs with the most subscriptions'
+    )
+    forwarded = pvproperty(name='FORWARDED', value=0, read_only=True,
+                           doc='Puts forwarded from output to input records')
+    merged = pvproperty(name='MERGED', value=0, read_only=True,
+                        doc='Puts merged within a coalescing window')
+    dropped = pvproperty(name='DROPPED', value=0, read_only=True,
+                         doc='Puts dropped by the forwarding rate limit')
+
+
+class PVStatistics:
+    """
+    Per-PV runtime statistics of the mock IOC.
+
+    Parameters
+    ----------
+    prefix : str, optional
+        Prefix of the summary PVs.
+
+    top : int, optional
+        Number of PVs listed by the top-N summary PVs.
+
+    filename : str or pathlib.Path, optional
+        OpenMetrics file to write every ``dump_interval`` seconds and on
+        shutdown.
+
+    dump_interval : float, optional
+        Seconds between writes of ``filename``.
+
+    forwarder : ads_deploy.put_forwarding.PutForwarder, optional
+        Also report the counters of put forwarding.
+
+    Attributes
+    ----------
+    table : CounterTable
+        The per-PV counters.
+
+    group : StatsGroup
+        The summary PVs, served from ``group.pvdb``.
+    """
+
+    def __init__(self, *, prefix=DEFAULT_PREFIX, top=DEFAULT_TOP,
+                 filename=None, dump_interval=DUMP_INTERVAL, forwarder=None):
+        self.table = CounterTable()
+        self.forwarder = forwarder
+        self.group = StatsGroup(prefix=prefix)
+        self.top = top
+        self.filename = filename
+        self.dump_interval = dump_interval
+        # One writer thread, such that the file is written in order
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def wrap(self, pvdb):
+        """Wrap a PV database, counting requests to it."""
+        return StatsPVDatabase(pvdb, self.table)
+
+    async def update_summary(self, counts, pvnames, previous, elapsed):
+        """
+        Update the summary PVs.
+
+        Parameters
+        ----------
+        counts : numpy.ndarray
+            The current counters.
+
+        pvnames : list of str
+            PV name of each row.
+
+        previous : numpy.ndarray
+            The counters ``elapsed`` seconds ago, which may have fewer rows.
+
+        elapsed : float
+            Seconds since ``previous``.
+        """
+        deltas = {}
+        for name in ('reads', 'writes', 'subscriptions', 'put_time'):
+            delta = counts[name].astype('f8')
+            delta[:len(previous)] -= previous[name]
+            deltas[name] = delta
+
+        group = self.group
+        writes = deltas['writes'].sum()
+        await group.pvs.write(len(pvnames))
+        for name in ('reads', 'writes', 'put_errors', 'subscriptions'):
+            await getattr(group, name).write(int(counts[name].sum()))
+        await group.read_rate.write(deltas['reads'].sum() / elapsed)
+        await group.write_rate.write(writes / elapsed)
+        await group.subscription_rate.write(
+            deltas['subscriptions'].sum() / elapsed)
+        if writes:
+            await group.put_latency.write(
+                1e3 * deltas['put_time'].sum() / writes)
+        await group.put_latency_max.write(
+            1e3 * counts['put_time_max'].max(initial=0.0))
+
+        for name in ('reads', 'writes', 'subscriptions'):
+            top = top_pvs(pvnames, deltas[name] / elapsed, self.top)
+            await getattr(group, f'top_{name}').write(format_top(top))
+
+        if self.forwarder is not None:
+            for name in ('forwarded', 'merged', 'dropped'):
+                await getattr(group, name).write(
+                    self.forwarder.counters[name])
+
+    def _forward_counters(self):
+        if self.forwarder is not None:
+            return dict(self.forwarder.counters)
+
+    def _write(self, counts, pvnames, forward_counters):
+        try:
+            with util.atomic_write(self.filename, 'wt') as f:
+                f.write(format_openmetrics(counts, pvnames,
+                                           forward_counters))
+        except OSError:
+            logger.exception('Failed to write statistics to %s',
+                             self.filename)
+
+    async def run(self):
+        """
+        Update the summary PVs and write the OpenMetrics file periodically,
+        and the file again when cancelled on shutdown.
+        """
+        previous = self.table.snapshot()[0]
+        last_update = last_dump = time.monotonic()
+        try:
+            while True:
+                await asyncio.sleep(SUMMARY_PERIOD)
+                counts, pvnames = self.table.snapshot()
+                now = time.monotonic()
+                await self.update_summary(counts, pvnames, previous,
+                                          now - last_update)
+                previous, last_update = counts, now
+
+                if self.filename and now - last_dump >= self.dump_interval:
+                    last_dump = now
+                    await asyncio.wrap_future(
+                        self._executor.submit(self._write, counts, pvnames,
+                                              self._forward_counters())
+                    )
+        finally:
+            if self.filename:
+                self._executor.submit(self._write, *self.table.snapshot(),
+                                      self._forward_counters())
+            self._executor.shutdown(wait=True)
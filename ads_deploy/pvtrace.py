@@ -0,0 +1,517 @@
+"""
+Compact binary traces of PV values, for the `ads-deploy caproto` mock IOC.
+
+With ``--replay FILE``, a trace is streamed into the PV databases of the mock
+IOC at its recorded rate, N times faster, or as fast as possible.  Samples
+which are due are posted in one batch per tick, in order of time.  With
+``--record FILE``, values put by clients are captured in the same format.
+Recorded samples are held in memory and the file is rewritten in full on each
+flush, so recordings are limited to ``MAX_RECORDED_SAMPLES`` puts; later puts
+are dropped.
+
+Trace files are column-oriented, such that they can be memory-mapped and
+read without parsing::
+
+    magic (8 bytes) | version (uint32) | header size (uint32) | header | data
+
+The JSON header lists the channels (PVs), each with its number of samples and
+the dtype, shape and data offsets of its columns: timestamps (float64 UNIX
+time, in ascending order), values and, for arrays, the number of valid
+elements of each sample.  Columns are aligned to 8 bytes.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import json
+import logging
+import mmap
+import struct
+import time
+import weakref
+
+import numpy
+
+from . import caproto_ioc, util
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ADSTRACE'
+VERSION = 1
+ALIGNMENT = 8
+DEFAULT_TICK_RATE = 10.0
+# Seconds between writes of the trace file while recording
+FLUSH_INTERVAL = 60.0
+# Puts kept while recording, bounding memory usage and the size of each flush
+MAX_RECORDED_SAMPLES = 1_000_000
+
+_PREAMBLE = struct.Struct('<8sII')
+
+# Columns are read-only views of the trace file; lengths is None for scalars
+TraceChannel = collections.namedtuple(
+    'TraceChannel', 'pvname timestamps values lengths'
+)
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _to_column(values):
+    """Convert sample values to a column and, for arrays, their lengths."""
+    if any(isinstance(value, (numpy.ndarray, list, tuple))
+           for value in values):
+        arrays = [numpy.atleast_1d(value) for value in values]
+        lengths = numpy.array([len(array) for array in arrays], dtype='<u4')
+        dtypes = {array.dtype for array in arrays}
+        # result_type would drop a non-native byte order
+        dtype = dtypes.pop() if len(dtypes) == 1 else numpy.result_type(*arrays)
+        column = numpy.zeros((len(arrays), int(lengths.max(initial=0))),
+                             dtype=dtype)
+        for row, array in zip(column, arrays):
+            row[:len(array)] = array
+        return column, lengths
+
+    column = numpy.asarray(values)
+    if column.dtype.kind in 'OU':
+        column = numpy.char.encode(column.astype(str), 'utf-8')
+    return column, None
+
+
+def write_trace(filename, channels, *, metadata=None):
+    """
+    Write a trace file.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        The file to (atomically) write.
+
+    channels : iterable of (pvname, timestamps, values)
+        The samples of each PV.
+
+    metadata : dict, optional
+        JSON-serializable information stored in the header.
+    """
+    header_channels = []
+    columns = []
+    size = 0
+    for pvname, timestamps, values in channels:
+        timestamps = numpy.asarray(timestamps, dtype='<f8')
+        column, lengths = _to_column(list(values))
+        if numpy.any(timestamps[1:] < timestamps[:-1]):
+            order = numpy.argsort(timestamps, kind='stable')
+            timestamps = timestamps[order]
+            column = column[order]
+            lengths = lengths[order] if lengths is not None else None
+
+        entry = {
+            'pvname': pvname,
+            'samples': len(timestamps),
+            'dtype': column.dtype.str,
+            'shape': list(column.shape[1:]),
+        }
+        for key, array in (('timestamps', timestamps), ('values', column),
+                           ('lengths', lengths)):
+            if array is not None:
+                entry[key] = size
+                columns.append((size, array))
+                size = _align(size + array.nbytes)
+        header_channels.append(entry)
+
+    header = json.dumps(
+        {'metadata': metadata or {}, 'channels': header_channels}
+    ).encode('utf-8')
+    data_offset = _align(_PREAMBLE.size + len(header))
+    with util.atomic_write(filename, 'wb') as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for offset, array in columns:
+            f.seek(data_offset + offset)
+            f.write(numpy.ascontiguousarray(array).data)
+        f.truncate(data_offset + size)
+
+
+class Trace:
+    """
+    A memory-mapped trace file.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        The trace file.
+
+    Attributes
+    ----------
+    channels : dict
+        PV name to :class:`TraceChannel`.
+
+    metadata : dict
+        The metadata stored with the trace.
+    """
+
+    def __init__(self, filename):
+        self.filename = str(filename)
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._load()
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def _load(self):
+        buf = self._mmap
+        try:
+            magic, version, header_size = _PREAMBLE.unpack_from(buf)
+        except struct.error:
+            magic = None
+        if magic != MAGIC:
+            raise ValueError(f'{self.filename} is not a PV trace file')
+        if version > VERSION:
+            raise ValueError(
+                f'{self.filename} is a version {version} trace; only up to '
+                f'version {VERSION} is supported'
+            )
+
+        header_end = _PREAMBLE.size + header_size
+        header = json.loads(bytes(buf[_PREAMBLE.size:header_end]))
+        data_offset = _align(header_end)
+
+        def column(entry, key, dtype, shape=()):
+            if key not in entry:
+                return None
+            shape = (entry['samples'], *shape)
+            return numpy.frombuffer(
+                buf, dtype=dtype, count=int(numpy.prod(shape)),
+                offset=data_offset + entry[key],
+            ).reshape(shape)
+
+        self.metadata = header['metadata']
+        self.channels = {
+            entry['pvname']: TraceChannel(
+                pvname=entry['pvname'],
+                timestamps=column(entry, 'timestamps', '<f8'),
+                values=column(entry, 'values', entry['dtype'],
+                              entry['shape']),
+                lengths=column(entry, 'lengths', '<u4'),
+            )
+            for entry in header['channels']
+        }
+
+    @property
+    def start_time(self):
+        """Timestamp of the first sample, or None if there are none."""
+        times = [channel.timestamps[0] for channel in self.channels.values()
+                 if len(channel.timestamps)]
+        return float(min(times)) if times else None
+
+    @property
+    def end_time(self):
+        """Timestamp of the last sample, or None if there are none."""
+        times = [channel.timestamps[-1] for channel in self.channels.values()
+                 if len(channel.timestamps)]
+        return float(max(times)) if times else None
+
+    def close(self):
+        self.channels = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Columns are still referenced; the mapping is released with them
+            ...
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def get_value(channel, index):
+    """Get a sample of a :class:`TraceChannel` as a value for ChannelData."""
+    value = channel.values[index]
+    if channel.lengths is not None:
+        # Copy out of the file, which may be closed while the value is in use
+        return numpy.array(value[:channel.lengths[index]])
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value.item()
+
+
+class TraceWriter:
+    """
+    Accumulate PV samples in memory, to be written as a trace.
+
+    Parameters
+    ----------
+    max_samples : int, optional
+        Maximum number of samples to keep; further samples are dropped and
+        counted in ``dropped``.
+    """
+
+    def __init__(self, *, max_samples=None):
+        self._samples = {}
+        self._count = 0
+        self.max_samples = max_samples
+        self.dropped = 0
+
+    def add(self, pvname, value, timestamp=None):
+        """Add a sample of a PV, by default timestamped now."""
+        if self.max_samples is not None and self._count >= self.max_samples:
+            if not self.dropped:
+                logger.warning('Trace is full (%d samples); dropping further '
+                               'samples', self.max_samples)
+            self.dropped += 1
+            return
+        if isinstance(value, numpy.ndarray):
+            value = value.copy()
+        timestamps, values = self._samples.setdefault(pvname, ([], []))
+        timestamps.append(time.time() if timestamp is None else timestamp)
+        values.append(value)
+        self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def snapshot(self):
+        """
+        Copy the samples, for :func:`write_trace`.
+
+        Take the snapshot on the thread which adds samples, such that it is
+        consistent; it may then be written from another thread.
+        """
+        return [
+            (pvname, list(timestamps), list(values))
+            for pvname, (timestamps, values) in self._samples.items()
+        ]
+
+    def write(self, filename, *, metadata=None):
+        write_trace(filename, self.snapshot(), metadata=metadata)
+
+
+class TraceReplayer:
+    """
+    Stream a trace into PV databases.
+
+    PVs of the trace which are not in any of the PV databases are skipped.
+
+    Parameters
+    ----------
+    trace : Trace
+        The trace to replay.
+
+    pvdbs : list of dict
+        The PV databases.
+
+    speed : float, optional
+        Speed relative to the recorded rate, or 0 for as fast as possible.
+
+    tick_rate : float, optional
+        Batches of samples posted per second.
+    """
+
+    def __init__(self, trace, pvdbs, *, speed=1.0,
+                 tick_rate=DEFAULT_TICK_RATE):
+        self.trace = trace
+        self.speed = speed
+        self.tick_rate = tick_rate
+        self.channels = []
+        self._pvdbs = []
+
+        missing = []
+        for pvname, channel in trace.channels.items():
+            pvdb = next((pvdb for pvdb in pvdbs if pvname in pvdb), None)
+            if pvdb is None:
+                missing.append(pvname)
+            elif len(channel.timestamps):
+                self.channels.append(channel)
+                self._pvdbs.append(pvdb)
+
+        if missing:
+            # Expected with --shards, where each shard serves a part
+            logger.info('Skipping %d PV(s) of the trace which are not '
+                        'served', len(missing))
+            logger.debug('Skipped PVs: %s', ', '.join(missing))
+
+        self.cursors = numpy.zeros(len(self.channels), dtype=int)
+        self.next_times = numpy.array(
+            [channel.timestamps[0] for channel in self.channels], dtype=float
+        )
+        self.samples = 0
+
+    def next_batch(self, until):
+        """
+        Take the samples up to a trace time.
+
+        Returns
+        -------
+        list of (timestamp, channel index, sample index)
+            In order of time.
+        """
+        batch = []
+        for idx in numpy.flatnonzero(self.next_times <= until):
+            timestamps = self.channels[idx].timestamps
+            start = self.cursors[idx]
+            stop = int(numpy.searchsorted(timestamps, until, side='right'))
+            batch.extend(
+                (timestamps[sample], idx, sample)
+                for sample in range(start, stop)
+            )
+            self.cursors[idx] = stop
+            self.next_times[idx] = (
+                timestamps[stop] if stop < len(timestamps) else numpy.inf
+            )
+        batch.sort()
+        return batch
+
+    async def post(self, batch):
+        """Write a batch of samples, in order."""
+        writes = []
+        for _, idx, sample in batch:
+            channel = self.channels[idx]
+            channeldata = self._pvdbs[idx][channel.pvname]
+            writes.append((channeldata, 'VAL', channeldata,
+                           get_value(channel, sample)))
+
+        failures = await caproto_ioc.write_field_values(writes, concurrency=1)
+        self.samples += len(batch) - len(failures)
+        if failures:
+            self._skip_failed(failures)
+
+    def _skip_failed(self, failures):
+        """Stop replaying PVs which failed to accept their samples."""
+        failed = {pvname for pvname, *_ in failures}
+        for idx, channel in enumerate(self.channels):
+            if channel.pvname in failed:
+                self.cursors[idx] = len(channel.timestamps)
+                self.next_times[idx] = numpy.inf
+
+        pvname, _, value, ex = failures[0]
+        logger.warning('Skipping %d PV(s) which failed to replay, e.g., '
+                       '%s => %r (%s)', len(failed), pvname, value, ex)
+
+    async def run(self):
+        """Replay the trace to its end, unless cancelled."""
+        if not self.channels:
+            logger.warning('Nothing to replay from %s', self.trace.filename)
+            return
+
+        logger.info('Replaying %d PV(s) from %s at %s', len(self.channels),
+                    self.trace.filename,
+                    f'{self.speed:g}x' if self.speed else 'full speed')
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.tick_rate
+        trace_start = self.next_times.min()
+        start = next_tick = loop.time()
+        while self.next_times.min() < numpy.inf:
+            if self.speed:
+                next_tick += period
+                delay = next_tick - loop.time()
+                if delay < 0:
+                    # Running behind; the next batch makes up for it
+                    next_tick -= delay
+                    delay = 0
+                await asyncio.sleep(delay)
+                until = trace_start + (loop.time() - start) * self.speed
+            else:
+                await asyncio.sleep(0)
+                until = self.next_times.min() + period
+
+            batch = self.next_batch(until)
+            if batch:
+                await self.post(batch)
+
+        logger.info('Replayed %d sample(s) of %d PV(s) in %.1f s',
+                    self.samples, len(self.channels), loop.time() - start)
+
+
+class RecordingPVDatabase(util.InstrumentedPVDatabase):
+    """
+    A PV database which records the values put by clients.
+
+    Parameters
+    ----------
+    pvdb : dict
+        The PV database to wrap.
+
+    writer : TraceWriter
+        Where to add the values.
+    """
+
+    def __init__(self, pvdb, writer):
+        super().__init__(pvdb)
+        self.writer = writer
+
+    def instrument(self, pvname, channeldata):
+        auth_write = channeldata.auth_write
+        ref = weakref.ref(channeldata)
+        writer = self.writer
+
+        async def recorded_auth_write(*args, **kwargs):
+            result = await auth_write(*args, **kwargs)
+            channeldata = ref()
+            if channeldata is not None:
+                writer.add(pvname, channeldata.value, channeldata.timestamp)
+            return result
+
+        channeldata.auth_write = recorded_auth_write
+
+
+class PutRecorder:
+    """
+    Record the values put by clients to a trace file.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        The trace file, written every ``flush_interval`` seconds and on
+        shutdown.
+
+    flush_interval : float, optional
+        Seconds between writes of the trace file.
+
+    max_samples : int, optional
+        Maximum number of puts to record.
+    """
+
+    def __init__(self, filename, *, flush_interval=FLUSH_INTERVAL,
+                 max_samples=MAX_RECORDED_SAMPLES):
+        self.filename = filename
+        self.flush_interval = flush_interval
+        self.writer = TraceWriter(max_samples=max_samples)
+        # One writer thread, such that the file is written in order
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def wrap(self, pvdb):
+        """Wrap a PV database, recording puts to it."""
+        return RecordingPVDatabase(pvdb, self.writer)
+
+    def _write(self, channels):
+        try:
+            write_trace(self.filename, channels)
+        except OSError:
+            logger.exception('Failed to write trace %s', self.filename)
+
+    async def run(self):
+        """Write the trace periodically, and when cancelled on shutdown."""
+        written = 0
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                if len(self.writer) != written:
+                    written = len(self.writer)
+                    # Copied on the event loop, where samples are added
+                    await asyncio.wrap_future(
+                        self._executor.submit(self._write,
+                                              self.writer.snapshot())
+                    )
+        finally:
+            if len(self.writer) != written:
+                self._executor.submit(self._write, self.writer.snapshot())
+            self._executor.shutdown(wait=True)
+            logger.info('Recorded %d put(s) to %s', len(self.writer),
+                        self.filename)
+            if self.writer.dropped:
+                logger.warning('Dropped %d put(s) beyond the limit of %d',
+                               self.writer.dropped, self.writer.max_samples)
@@ -0,0 +1,222 @@
+import asyncio
+import pickle
+import struct
+import types
+
+import pytest
+
+pytest.importorskip('pytmc')
+
+from .. import ads_sim  # noqa: E402
+
+SYMBOLS = [
+    ads_sim.AdsSymbol('MAIN.fValue', ads_sim.ADSIGRP_PLC_RW, 0, 8, 'LREAL'),
+    ads_sim.AdsSymbol('MAIN.stAxis', ads_sim.ADSIGRP_PLC_RW, 8, 6,
+                      'ST_Axis'),
+    ads_sim.AdsSymbol('MAIN.stAxis.nState', ads_sim.ADSIGRP_PLC_RW, 8, 2,
+                      'INT'),
+    ads_sim.AdsSymbol('MAIN.stAxis.bEnable', ads_sim.ADSIGRP_PLC_RW, 10, 1,
+                      'BOOL'),
+    ads_sim.AdsSymbol('GVL.nInput', ads_sim.ADSIGRP_IOIMAGE_RWIB, 0, 4,
+                      'DINT'),
+]
+
+
+def test_symbol_table():
+    table = ads_sim.SymbolTable(SYMBOLS)
+    assert len(table.areas[ads_sim.ADSIGRP_PLC_RW]) == 14
+
+    handle_data = table.read_write(ads_sim.ADSIGRP_SYM_HNDBYNAME, 0, 4,
+                                   b'main.stAxis.nState\0')
+    handle, = struct.unpack('<I', handle_data)
+    table.write(ads_sim.ADSIGRP_SYM_VALBYHND, handle, struct.pack('<h', -3))
+    assert table.read(ads_sim.ADSIGRP_PLC_RW, 8, 2) == struct.pack('<h', -3)
+    assert table.read_write(ads_sim.ADSIGRP_SYM_VALBYNAME, 0, 2,
+                            b'MAIN.stAxis.nState\0') == struct.pack('<h', -3)
+
+    with pytest.raises(ads_sim.AdsError) as ex:
+        table.read(ads_sim.ADSIGRP_SYM_VALBYHND, handle, 4)
+    assert ex.value.code == ads_sim.ADSERR_DEVICE_INVALIDSIZE
+    with pytest.raises(ads_sim.AdsError) as ex:
+        table.read_write(ads_sim.ADSIGRP_SYM_HNDBYNAME, 0, 4, b'MAIN.nope')
+    assert ex.value.code == ads_sim.ADSERR_DEVICE_SYMBOLNOTFOUND
+
+    entry = table.read_write(ads_sim.ADSIGRP_SYM_INFOBYNAMEEX, 0, 1024,
+                             b'GVL.nInput\0')
+    (length, index_group, offset, size, data_type, _, name_length,
+     _, _) = struct.unpack_from('<IIIIIIHHH', entry)
+    assert length == len(entry)
+    assert (index_group, offset, size, data_type) == (
+        ads_sim.ADSIGRP_IOIMAGE_RWIB, 0, 4, 3)
+    assert entry[30:30 + name_length] == b'GVL.nInput'
+
+    count, upload_size = struct.unpack(
+        '<II', table.read(ads_sim.ADSIGRP_SYM_UPLOADINFO, 0, 8))
+    assert count == len(SYMBOLS)
+    assert len(table.read(ads_sim.ADSIGRP_SYM_UPLOAD, 0,
+                          upload_size)) == upload_size
+
+
+def test_on_change_notification():
+    table = ads_sim.SymbolTable(SYMBOLS)
+    area, offset = table.locate(ads_sim.ADSIGRP_PLC_RW, 8, 2)
+    notification = ads_sim.Notification(1, 851, table, area, offset, 2,
+                                        on_change=True, cycle_time=0.0)
+    assert notification.poll(0.0) == b'\0\0'
+    # Unchanged table, then a write elsewhere which leaves the value as is
+    assert notification.poll(1.0) is None
+    table.write(ads_sim.ADSIGRP_PLC_RW, 0, struct.pack('<d', 1.0))
+    assert notification.poll(2.0) is None
+    table.write(ads_sim.ADSIGRP_PLC_RW, 8, struct.pack('<h', 5))
+    assert notification.poll(3.0) == struct.pack('<h', 5)
+    # Directly modified memory is only sent once the table is written
+    area[offset] = 6
+    assert notification.poll(4.0) is None
+    table.update_numeric()
+    assert notification.poll(5.0) == struct.pack('<h', 7)
+
+
+def _text(value):
+    return [types.SimpleNamespace(text=str(value))]
+
+
+def test_array_elements():
+    def item(name, type_name, bit_size, bit_offset=0, data_type=None,
+             **kwargs):
+        return types.SimpleNamespace(
+            name=name, type_name=type_name, BitSize=_text(bit_size),
+            BitOffs=_text(bit_offset), data_type=data_type, **kwargs)
+
+    axis = types.SimpleNamespace(SubItem=[
+        item('nState', 'INT', 16),
+        item('bEnable', 'BOOL', 8, bit_offset=16),
+    ])
+    axes = item('astAxes', 'ST_Axis', 2 * 32, data_type=axis,
+                ArrayInfo=[types.SimpleNamespace(LBound=_text(1),
+                                                 Elements=_text(2))])
+    grid = item('anGrid', 'INT', 2 * 3 * 16, ArrayInfo=[
+        types.SimpleNamespace(LBound=_text(0), Elements=_text(2)),
+        types.SimpleNamespace(LBound=_text(1), Elements=_text(3)),
+    ])
+
+    members = list(ads_sim._walk_members(axes, 'GVL.astAxes', 64))
+    assert members[0] == ('GVL.astAxes', 64, 64,
+                          'ARRAY [1..2] OF ST_Axis')
+    assert members[1:] == [
+        ('GVL.astAxes[1]', 64, 32, 'ST_Axis'),
+        ('GVL.astAxes[1].nState', 64, 16, 'INT'),
+        ('GVL.astAxes[1].bEnable', 80, 8, 'BOOL'),
+        ('GVL.astAxes[2]', 96, 32, 'ST_Axis'),
+        ('GVL.astAxes[2].nState', 96, 16, 'INT'),
+        ('GVL.astAxes[2].bEnable', 112, 8, 'BOOL'),
+    ]
+    assert ads_sim.get_ads_type(members[0][3]) == (ads_sim.ADST_BIGTYPE,
+                                                   None)
+
+    members = list(ads_sim._walk_members(grid, 'MAIN.anGrid', 0))
+    names = [name for name, *_ in members[1:]]
+    assert names[:2] == ['MAIN.anGrid[0,1]', 'MAIN.anGrid[0,2]']
+    assert members[-1] == ('MAIN.anGrid[1,3]', 80, 16, 'INT')
+    assert ads_sim.get_ads_type(members[0][3]) == (2, None)
+
+
+def test_ads_error_pickle():
+    error = pickle.loads(pickle.dumps(
+        ads_sim.AdsError(ads_sim.ADSERR_DEVICE_SYMBOLNOTFOUND)))
+    assert error.code == ads_sim.ADSERR_DEVICE_SYMBOLNOTFOUND
+    assert str(error) == 'ADS error 0x710'
+
+
+def test_sum_requests():
+    table = ads_sim.SymbolTable(SYMBOLS)
+    table.update_numeric()
+    requests = struct.pack(
+        '<IIIIIIIII',
+        ads_sim.ADSIGRP_PLC_RW, 0, 8,
+        ads_sim.ADSIGRP_IOIMAGE_RWIB, 0, 4,
+        0x1234, 0, 2,
+    )
+    response = table.read_write(ads_sim.ADSIGRP_SUMUP_READ, 3, 1024,
+                                requests)
+    assert struct.unpack_from('<III', response) == (
+        0, 0, ads_sim.ADSERR_DEVICE_INVALIDGRP)
+    assert struct.unpack_from('<di', response, 12) == (1.0, 1)
+    assert len(response) == 12 + 8 + 4 + 2
+
+    names = [b'MAIN.fValue\0', b'GVL.nInput\0']
+    requests = b''.join(
+        struct.pack('<IIII', ads_sim.ADSIGRP_SYM_HNDBYNAME, 0, 4, len(name))
+        for name in names
+    ) + b''.join(names)
+    response = table.read_write(ads_sim.ADSIGRP_SUMUP_READWRITE, 2, 1024,
+                                requests)
+    assert struct.unpack('<IIIIII', response) == (0, 4, 0, 4, 1, 5)
+
+
+def test_server():
+    table = ads_sim.SymbolTable(SYMBOLS)
+    simulator = ads_sim.AdsSimulator({851: table}, tick_rate=1000)
+    client_net_id = bytes([10, 0, 0, 1, 1, 1])
+
+    def request(command, data, invoke_id):
+        header = ads_sim._AMS_HEADER.pack(
+            bytes(6), 851, client_net_id, 30000, command, 0x0004,
+            len(data), 0, invoke_id)
+        return ads_sim._TCP_HEADER.pack(0, len(header) + len(data)) + \
+            header + data
+
+    async def read_packet(reader):
+        _, length = ads_sim._TCP_HEADER.unpack(await reader.readexactly(6))
+        packet = await reader.readexactly(length)
+        header = ads_sim._AMS_HEADER.unpack_from(packet)
+        return header, packet[ads_sim._AMS_HEADER.size:]
+
+    async def test():
+        server = await simulator.start('127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        notifier = asyncio.ensure_future(simulator.send_notifications())
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            writer.write(request(ads_sim.ADSSRVID_READWRITE, struct.pack(
+                '<IIII', ads_sim.ADSIGRP_SYM_HNDBYNAME, 0, 4, 12) +
+                b'MAIN.fValue\0', invoke_id=1))
+            header, data = await read_packet(reader)
+            assert header[-1] == 1
+            result, length, handle = struct.unpack('<III', data)
+            assert result == 0
+
+            writer.write(request(ads_sim.ADSSRVID_ADDDEVICENOTE,
+                                 struct.pack('<IIIIII16x',
+                                             ads_sim.ADSIGRP_SYM_VALBYHND,
+                                             handle, 8,
+                                             ads_sim.ADSTRANS_SERVERONCHA,
+                                             0, 0),
+                                 invoke_id=2))
+            header, data = await read_packet(reader)
+            assert struct.unpack('<II', data)[0] == 0
+
+            async def read_notification():
+                header, data = await read_packet(reader)
+                assert header[4] == ads_sim.ADSSRVID_DEVICENOTE
+                _, stamps, _, samples, _, size = struct.unpack_from(
+                    '<IIQIII', data)
+                assert (stamps, samples, size) == (1, 1, 8)
+                return struct.unpack_from('<d', data, 28)[0]
+
+            # The initial value, then on change
+            assert await read_notification() == 0.0
+            writer.write(request(ads_sim.ADSSRVID_WRITE, struct.pack(
+                '<IIId', ads_sim.ADSIGRP_SYM_VALBYHND, handle, 8, 2.5),
+                invoke_id=3))
+            header, data = await read_packet(reader)
+            assert header[-1] == 3
+            assert data == bytes(4)
+            assert await read_notification() == 2.5
+        finally:
+            writer.close()
+            notifier.cancel()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(test())
+    assert simulator.counters[ads_sim.ADSSRVID_WRITE] >= 1
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('caproto')
+
+from .. import bench_ca  # noqa: E402
+
+
+def test_summarize_latencies():
+    assert bench_ca.summarize_latencies([]) == {'count': 0}
+    summary = bench_ca.summarize_latencies([0.001 * idx for idx in range(101)])
+    assert summary['count'] == 101
+    assert summary['min_ms'] == 0
+    assert summary['p50_ms'] == pytest.approx(50)
+    assert summary['p99_ms'] == pytest.approx(99)
+    assert summary['max_ms'] == pytest.approx(100)
+
+
+def test_run_requests():
+    in_progress = 0
+    max_in_progress = 0
+
+    async def request(item):
+        nonlocal in_progress, max_in_progress
+        in_progress += 1
+        max_in_progress = max(in_progress, max_in_progress)
+        await asyncio.sleep(0)
+        in_progress -= 1
+        if item % 5 == 0:
+            raise ValueError(item)
+
+    latencies, failed = asyncio.run(
+        bench_ca._run_requests(range(20), request, concurrency=3))
+    assert len(latencies) == 16
+    assert failed == [0, 5, 10, 15]
+    assert max_in_progress == 3
@@ -0,0 +1,101 @@
+import gc
+import os
+import weakref
+
+import pytest
+
+pytest.importorskip('pytmc')
+
+from .. import cache  # noqa: E402
+
+TMC_SOURCE = '''\
+<?xml version="1.0"?>
+<TcModuleClass>
+  <DataTypes>
+    <DataType>
+      <Name>{name}</Name>
+      <BitSize>16</BitSize>
+    </DataType>
+  </DataTypes>
+</TcModuleClass>
+'''
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    path = tmp_path / 'cache'
+    monkeypatch.setattr(cache, 'CACHE_PATH', path)
+    return path
+
+
+@pytest.fixture
+def tmc_file(tmp_path):
+    filename = tmp_path / 'project.tmc'
+    filename.write_text(TMC_SOURCE.format(name='ST_Test'))
+    return filename
+
+
+def get_data_type_name(tmc):
+    return tmc.DataTypes[0].DataType[0].name
+
+
+def test_cache_roundtrip(cache_path, tmc_file):
+    assert cache.load(tmc_file) is None
+
+    tmc = cache.parse(tmc_file)
+    assert cache.get_stats()['entries'] == 1
+
+    cached = cache.load(tmc_file)
+    assert cached is not None
+    assert type(cached).__name__ == type(tmc).__name__
+    assert get_data_type_name(cached) == get_data_type_name(tmc) == 'ST_Test'
+
+
+def test_cache_invalidation(cache_path, tmc_file):
+    cache.parse(tmc_file)
+    tmc_file.write_text(TMC_SOURCE.format(name='ST_Modified'))
+    assert cache.load(tmc_file) is None
+    assert get_data_type_name(cache.parse(tmc_file)) == 'ST_Modified'
+
+
+def test_cache_eviction(cache_path, tmp_path):
+    filenames = []
+    for idx in range(3):
+        filename = tmp_path / f'project{idx}.tmc'
+        filename.write_text(TMC_SOURCE.format(name=f'ST_Test{idx}'))
+        cache.parse(filename)
+        # Ensure distinct access times for LRU ordering
+        cache_filename = cache.get_cache_filename(filename)
+        os.utime(cache_filename, ns=(idx * 10 ** 9, idx * 10 ** 9))
+        filenames.append(filename)
+
+    entry_size = cache.get_stats()['size'] // 3
+    cache.evict(max_size=2 * entry_size + entry_size // 2)
+    assert cache.load(filenames[0]) is None
+    assert cache.load(filenames[2]) is not None
+
+    cache.clear()
+    assert cache.get_stats()['entries'] == 0
+
+
+def test_cached_project_released(cache_path, tmc_file):
+    cache.parse(tmc_file)
+    tmc = cache.load(tmc_file)
+    assert tmc is not None
+    ref = weakref.ref(tmc)
+    del tmc
+    gc.collect()
+    assert ref() is None
+
+
+def test_entries_removed_concurrently(cache_path, tmc_file, monkeypatch):
+    cache.parse(tmc_file)
+    stat = cache.pathlib.Path.stat
+
+    def removed(path, *args, **kwargs):
+        if path.suffix == cache.CACHE_SUFFIX:
+            raise FileNotFoundError(path)
+        return stat(path, *args, **kwargs)
+
+    monkeypatch.setattr(cache.pathlib.Path, 'stat', removed)
+    assert cache.get_entries() == []
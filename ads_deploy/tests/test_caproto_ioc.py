@@ -0,0 +1,222 @@
+import asyncio
+import gc
+import logging
+
+import pytest
+
+pytest.importorskip('caproto')
+
+from .. import caproto_codegen, caproto_ioc  # noqa: E402
+
+
+def test_merge_pvdbs():
+    pvdb, collisions = caproto_ioc.merge_pvdbs({
+        'plc1': {'A': 1, 'B': 2},
+        'plc2': {'B': 3, 'C': 4},
+        'plc3': {'B': 5},
+    })
+    assert pvdb == {'A': 1, 'B': 2, 'C': 4}
+    assert collisions == {'B': ['plc1', 'plc2', 'plc3']}
+
+
+def make_record_pairs():
+    SimpleRecord = caproto_ioc.util.SimpleRecord
+    return [
+        (SimpleRecord('PLC:VAL_RBV', 'ai', {'EGU': 'mm', 'PREC': '3'}, []),
+         SimpleRecord('PLC:VAL', 'ao', {'EGU': 'mm'}, [])),
+        (SimpleRecord('PLC:WAVE_RBV', 'waveform',
+                      {'FTVL': 'LONG', 'NELM': '4'}, []), None),
+    ]
+
+
+def test_lazy_pvdb():
+    async def test():
+        table = caproto_ioc.get_record_table(make_record_pairs())
+        pvdb = caproto_ioc.LazyPVDatabase(table, idle_timeout=60)
+        assert set(pvdb) == {'PLC:VAL_RBV', 'PLC:VAL', 'PLC:WAVE_RBV'}
+        assert 'PLC:VAL' in pvdb
+        assert not dict(pvdb.items())
+
+        await pvdb['PLC:VAL'].write(2.5)
+        assert set(dict(pvdb.items())) == {'PLC:VAL', 'PLC:VAL_RBV'}
+        assert pvdb['PLC:VAL_RBV'].value == 2.5
+        assert list(pvdb['PLC:WAVE_RBV'].value) == [0] * 4
+
+        # Allow the fields to be written
+        await asyncio.sleep(0.1)
+        assert pvdb['PLC:VAL_RBV'].fields['EGU'].value == 'mm'
+
+        assert pvdb.demote_idle(idle_timeout=0) == 3
+        assert not dict(pvdb.items())
+        gc.collect()
+        assert pvdb['PLC:VAL_RBV'].value == 2.5
+
+    asyncio.run(test())
+
+
+def test_startup_fields(caplog):
+    pairs = make_record_pairs()
+    pairs[0][0].fields['NOPE'] = '1'
+    ioc_class = caproto_ioc.create_ioc_from_records(
+        pairs, class_name='Test', init_concurrency=2)
+    ioc = ioc_class(prefix='')
+    caproto_ioc.prepare_startup_fields(ioc)
+    # Converted ahead of time:
+    assert ('PREC', 3) in [(field_name, value) for _, field_name, _, value
+                           in ioc.startup_writes]
+    assert [(pvname, field_name) for pvname, field_name, _, _
+            in ioc.startup_failures] == [('PLC:VAL_RBV', 'NOPE')]
+
+    async def test():
+        hook = ioc.pvdb['_startup_hook_Test']
+        await hook.startup(hook, None)
+        assert hook.value == ioc.ready_time
+        assert ioc.pvdb['PLC:VAL_RBV'].fields['PREC'].value == 3
+        assert ioc.pvdb['PLC:VAL'].fields['EGU'].value == 'mm'
+
+    asyncio.run(test())
+    assert 'failed to set 1 of 6 initial field values: NOPE' in caplog.text
+
+
+def test_lazy_field_failures(caplog):
+    pairs = make_record_pairs()
+    pairs[0][0].fields['NOPE'] = '1'
+    table = caproto_ioc.get_record_table(pairs)
+
+    async def test():
+        pvdb = caproto_ioc.LazyPVDatabase(table, name='Lazy')
+        pvdb['PLC:VAL_RBV']
+        pvdb['PLC:VAL']
+        # Referenced until done
+        assert len(pvdb._field_tasks) == 2
+        await asyncio.sleep(0.1)
+        assert not pvdb._field_tasks
+        pvdb.log_field_failures()
+        # Only logged when there are new failures
+        pvdb.log_field_failures()
+
+    caplog.set_level(logging.DEBUG, logger=caproto_ioc.logger.name)
+    asyncio.run(test())
+    # Not a warning per lazily-created PV, but one summary
+    assert 'PLC:VAL_RBV: failed to set 1 of' in caplog.text
+    assert not [record for record in caplog.records
+                if record.levelno >= logging.WARNING]
+    summaries = [record.getMessage() for record in caplog.records
+                 if record.levelno == logging.INFO]
+    assert summaries == [
+        'Lazy: failed to set 1 of 4 initial field values of 2 created PVs: '
+        'NOPE (KeyError) x1'
+    ]
+
+
+def test_waveform_put():
+    SimpleRecord = caproto_ioc.util.SimpleRecord
+    fields = {'FTVL': 'FLOAT', 'NELM': '100000'}
+    ioc_class = caproto_ioc.create_ioc_from_records(
+        [(SimpleRecord('PLC:ARR_RBV', 'waveform', fields, []),
+          SimpleRecord('PLC:ARR', 'waveform', fields, []))],
+        class_name='Test')
+    ioc = ioc_class(prefix='')
+    rbv = ioc.pvdb['PLC:ARR_RBV']
+    assert rbv.data_type == caproto_ioc.caproto.ChannelType.FLOAT
+    assert rbv.value.dtype == caproto_ioc.numpy.dtype('>f4')
+    assert rbv.value.shape == (100000, )
+
+    async def test():
+        value = caproto_ioc.numpy.arange(100000, dtype='>f4')
+        await ioc.pvdb['PLC:ARR'].write(value)
+        # Passed from the output to the input record without copying
+        assert rbv.value is value
+
+    asyncio.run(test())
+
+
+def test_codegen(tmp_path):
+    tmc = tmp_path / 'plc.tmc'
+    tmc.write_text('<TcModuleClass/>')
+    dependencies = {str(tmc): caproto_codegen.hash_file(tmc)}
+
+    filename = tmp_path / 'mock_ioc.py'
+    caproto_codegen.write_module(
+        filename,
+        caproto_codegen.generate_module_source(
+            'plc.tsproj', {'plc': make_record_pairs()}, dependencies)
+    )
+    assert caproto_codegen.get_stale_dependencies(filename) == []
+
+    module = caproto_codegen.load_module(filename)
+    ioc = module.IOCS['plc'](prefix='')
+    assert set(ioc.pvdb) >= {'_startup_hook_plc', 'PLC:VAL_RBV', 'PLC:VAL',
+                             'PLC:WAVE_RBV'}
+    assert ioc.startup_fields['PLC_VAL_RBV'] == {'EGU': 'mm', 'PREC': '3'}
+    assert ioc.pvdb['PLC:WAVE_RBV'].value.dtype.str == '>i4'
+
+    async def test():
+        await ioc.pvdb['PLC:VAL'].write(1.5)
+        assert ioc.pvdb['PLC:VAL_RBV'].value == 1.5
+
+    asyncio.run(test())
+
+    tmc.write_text('<TcModuleClass></TcModuleClass>')
+    assert caproto_codegen.get_stale_dependencies(filename) == [str(tmc)]
+    assert caproto_codegen.load_module(filename) is None
+
+
+def test_aliases(tmp_path):
+    SimpleRecord = caproto_ioc.util.SimpleRecord
+    pairs = [
+        (SimpleRecord('PLC:VAL_RBV', 'ai', {}, ['ALT:VAL_RBV']),
+         SimpleRecord('PLC:VAL', 'ao', {}, ['ALT:VAL', 'PLC:VAL_RBV'])),
+    ]
+    table = caproto_ioc.get_record_table(pairs)
+    filename = tmp_path / 'mock_ioc.py'
+    caproto_codegen.write_module(
+        filename,
+        caproto_codegen.generate_module_source('plc.tsproj', {'plc': pairs},
+                                               {})
+    )
+    eager = caproto_ioc.create_ioc_from_records(pairs, class_name='Test')
+    generated = caproto_codegen.load_module(filename).IOCS['plc']
+
+    async def test(pvdb):
+        # The same ChannelData, rather than a copy
+        assert pvdb['ALT:VAL'] is pvdb['PLC:VAL']
+        await pvdb['ALT:VAL'].write(1.5)
+        assert pvdb['ALT:VAL_RBV'].value == 1.5
+        assert pvdb['ALT:VAL_RBV'] is pvdb['PLC:VAL_RBV']
+
+    for ioc_class in (eager, generated):
+        ioc = ioc_class(prefix='')
+        # The alias clashing with a record is skipped
+        assert caproto_ioc.add_aliases(ioc.pvdb, ioc.aliases) == 2
+        asyncio.run(test(ioc.pvdb))
+
+    pvdb = caproto_ioc.LazyPVDatabase(table)
+    assert set(pvdb) == {'PLC:VAL_RBV', 'PLC:VAL', 'ALT:VAL_RBV', 'ALT:VAL'}
+    asyncio.run(test(pvdb))
+
+
+def test_static_pvs_record_stats_lazy(tmp_path):
+    async def test():
+        table = caproto_ioc.get_record_table(make_record_pairs())
+        pvdbs, tasks = caproto_ioc.create_pvdbs(
+            {'plc': table}, {}, ioc_options={}, lazy=True, idle_timeout=60,
+            record=str(tmp_path / 'trace.bin'), stats=True,
+            stats_prefix='STATS:')
+        for task in tasks:
+            task.close()
+
+        pvdb = pvdbs['plc']
+        lazy = pvdb.pvdb.pvdb
+        assert isinstance(lazy, caproto_ioc.LazyPVDatabase)
+        assert 'STATS:READS' in lazy.static_pvdb
+        reads = pvdb['STATS:READS']
+        pvdb['PLC:VAL']
+        # Summary PVs are neither released nor instrumented
+        assert lazy.demote_idle(idle_timeout=0) >= 1
+        assert 'PLC:VAL' not in dict(lazy.items())
+        assert pvdb['STATS:READS'] is reads
+        assert reads not in pvdb._instrumented
+        assert reads not in pvdb.pvdb._instrumented
+
+    asyncio.run(test())
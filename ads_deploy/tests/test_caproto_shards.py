@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip('caproto')
+
+from .. import caproto_ioc, caproto_shards  # noqa: E402
+
+
+def make_table(prefix, count):
+    SimpleRecord = caproto_ioc.util.SimpleRecord
+    return caproto_ioc.get_record_table([
+        (SimpleRecord(f'{prefix}:VAL{idx}_RBV', 'ai', {}, []),
+         SimpleRecord(f'{prefix}:VAL{idx}', 'ao', {}, []))
+        for idx in range(count)
+    ])
+
+
+def test_record_pairs_from_table():
+    table = make_table('PLC', 3)
+    pairs = caproto_ioc.record_pairs_from_table(table)
+    assert len(pairs) == 3
+    assert caproto_ioc.get_record_table(pairs) == table
+
+
+@pytest.mark.parametrize('partition', caproto_shards.PARTITIONS)
+def test_partition_records(partition):
+    tables = {'plc1': make_table('PLC1', 50), 'plc2': make_table('PLC2', 20),
+              'plc3': make_table('PLC3', 20)}
+    motors = {'plc1': ['PLC1:M1', 'PLC1:M2'], 'plc3': ['PLC3:M1']}
+    parts = caproto_shards.partition_records(tables, motors, 2,
+                                             partition=partition)
+    assert parts == caproto_shards.partition_records(
+        tables, motors, 2, partition=partition)
+
+    shard_tables = [table for table, _ in parts]
+    assert sum(len(table) for table in shard_tables) == 180
+    assert all(shard_tables)
+    for table in shard_tables:
+        # Outputs are kept with their input records
+        for _record, linked in table.values():
+            assert linked is None or linked in table
+
+    assert sorted(sum((prefixes for _, prefixes in parts), [])) == [
+        'PLC1:M1', 'PLC1:M2', 'PLC3:M1']
+    if partition == 'plc':
+        assert len(shard_tables[0]) == 100
+        assert parts[0][1] == ['PLC1:M1', 'PLC1:M2']
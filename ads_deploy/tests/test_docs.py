@@ -0,0 +1,238 @@
+import gc
+import os
+import pathlib
+import types
+import weakref
+
+import jinja2
+import pytest
+
+pytest.importorskip('pytmc')
+
+from .. import docs  # noqa: E402
+
+
+class FakePlc:
+    def __init__(self, dut_by_name=None, gvl_by_name=None, pou_by_name=None):
+        self.dut_by_name = dut_by_name or {}
+        self.gvl_by_name = gvl_by_name or {}
+        self.pou_by_name = pou_by_name or {}
+
+
+def test_get_source_name_index():
+    plc = FakePlc(dut_by_name={'ST_Axis': None},
+                  gvl_by_name={'GVL': None, 'GVL.Sub': None},
+                  pou_by_name={'...': None})
+    index = docs.get_source_name_index(plc)
+    assert set(index) == {'ST_Axis', 'GVL'}
+    assert index['ST_Axis'] == {'ST_Axis': None}
+    assert index['GVL']['GVL'] is None
+    assert index['GVL']['GVL.Sub'].search('x := GVL.Sub;')
+
+
+def test_find_related_source_names():
+    index = {
+        'FB_Motion': {'FB_Motion': None},
+        'GVL': {'GVL': None,
+                'GVL.Sub': docs.re.compile(r'\bGVL\.Sub\b')},
+    }
+    text = 'fbMotion : FB_Motion; x := GVL.Subtract; FB_MotionStage'
+    assert docs.find_related_source_names(text, index) == {'FB_Motion', 'GVL'}
+    related = docs.find_related_source_names('GVL.Sub', index)
+    assert related == {'GVL', 'GVL.Sub'}
+
+
+def test_related_source_per_plc():
+    related_source = docs.get_jinja_filters()['related_source']
+    plc1 = FakePlc(pou_by_name={'MAIN': None, 'FB_A': None})
+    plc2 = FakePlc(pou_by_name={'MAIN': None, 'FB_B': None})
+    text = 'fbA : FB_A; fbB : FB_B; MAIN();'
+    # No links to the sources of other PLCs, nor to the source itself
+    assert related_source(text, 'MAIN', None, plc1) == ['`FB_A`_']
+    assert related_source(text, 'MAIN', None, plc2) == ['`FB_B`_']
+
+
+def test_compile_template_bytecode_cache(tmp_path):
+    env = jinja2.Environment(
+        bytecode_cache=jinja2.FileSystemBytecodeCache(str(tmp_path))
+    )
+    filename = str(tmp_path / 'test.rst')
+    for _ in range(2):
+        template = docs.compile_template(env, '{{ a }}-{{ b }}', filename)
+        assert docs.render_template(env, template, dict(a=1, b=2)) == '1-2'
+
+    assert len(list(tmp_path.iterdir())) == 1
+    # A changed source must not use the stale compiled template
+    template = docs.compile_template(env, '{{ b }}', filename)
+    assert template.render(b=3) == '3'
+
+
+def test_template_type():
+    assert docs.get_template_type(
+        docs.pathlib.Path('{{ tsproj.name }}_{{plc.name}}.rst')) == 'per-PLC'
+    assert docs.get_template_type(
+        docs.pathlib.Path('{{tsproj.name}}.rst')) == 'per-tsproj'
+    assert docs.get_template_type(
+        docs.pathlib.Path('index.rst')) == 'general'
+
+
+def test_summarize_tsproj_info():
+    plc = dict(name='plc', obj=object(), tmc_path='plc.tmc', records={},
+               pragma_count=3, pragma_errors=0, linter_results=[])
+    tsproj = dict(directory=docs.pathlib.Path('.'), name='proj',
+                  filename='proj.tsproj', obj=object(), nc=[], box_by_id={},
+                  plcs=[docs.summarize_plc_info(plc, linter_results=True)])
+    assert tsproj['plcs'][0]['linter_results'] == []
+    summary = docs.summarize_tsproj_info(tsproj)
+    assert summary['plcs'] == [
+        dict(name='plc', tmc_path='plc.tmc', pragma_count=3, pragma_errors=0)
+    ]
+    assert 'obj' not in summary
+
+
+def test_write_chunks_if_changed(tmp_path):
+    target = tmp_path / 'source.rst'
+    changed, sha256 = docs.write_chunks_if_changed(target, iter(['a', 'b']))
+    assert changed and target.read_text() == 'ab'
+    assert sha256 == docs.hashlib.sha256(b'ab').hexdigest()
+    mtime = target.stat().st_mtime_ns
+    # Unchanged files are not rewritten
+    assert docs.write_chunks_if_changed(target, ['a', 'b']) == (False, sha256)
+    assert target.stat().st_mtime_ns == mtime
+    changed, _ = docs.write_chunks_if_changed(target, ['new ', 'ab'])
+    assert changed and target.read_text() == 'new ab'
+    assert docs.write_chunks_if_changed(target, ['ab']) == (True, sha256)
+
+    def interrupted():
+        yield 'partial'
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        docs.write_chunks_if_changed(target, interrupted())
+    assert target.read_text() == 'ab'
+    assert [item.name for item in tmp_path.iterdir()] == ['source.rst']
+
+
+def test_plc_views_sources():
+    class Source:
+        calls = 0
+
+        def __init__(self, text):
+            self.text = text
+
+        def get_source_code(self):
+            Source.calls += 1
+            return self.text
+
+    plc = types.SimpleNamespace(
+        dut_by_name={'b': Source('b'), 'A': Source('a')},
+        gvl_by_name={}, pou_by_name={'MAIN': Source('main')},
+    )
+    views = docs.PlcViews(plc)
+    for _ in range(2):
+        assert views.sources == [
+            ('DUTs', [('A', 'a'), ('b', 'b')]),
+            ('GVLs', []),
+            ('POUs', [('MAIN', 'main')]),
+        ]
+    assert Source.calls == 3
+
+
+@pytest.fixture
+def sample_solution(tmp_path, monkeypatch):
+    """A solution of pytmc's sample projects, with templates of each type."""
+    pytmc = pytest.importorskip('pytmc')
+    project_root = pathlib.Path(pytmc.__file__).parent / 'tests' / 'projects'
+    tsprojs = [
+        project_root.joinpath('lcls-twincat-pmps', 'lcls-twincat-pmps',
+                              'lcls-twincat-pmps.tsproj'),
+        project_root / 'lcls-plc-lfe-arbiter' / 'Arbiter' / 'Arbiter.tsproj',
+    ]
+    if not all(tsproj.exists() for tsproj in tsprojs):
+        pytest.skip('pytmc test projects are not installed')
+
+    solution = tmp_path / 'sample.sln'
+    # Solutions hold Windows paths, relative to the solution
+    solution.write_text(''.join(
+        f'Project("{{B1E792BE-AA5F-4E3C-8C82-674BF9C0715B}}") = '
+        f'"{tsproj.stem}", "{os.path.relpath(tsproj, tmp_path)}", '
+        f'"{{00000000-0000-0000-0000-00000000000{idx}}}"\nEndProject\n'
+        for idx, tsproj in enumerate(tsprojs)
+    ))
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 'index.rst').write_text(
+        '{% for tsproj in tsprojects %}{{ tsproj.name }}\n{% endfor %}'
+    )
+    (templates / '{{tsproj.name}}.rst').write_text(
+        '{% for plc in tsproj.plcs %}'
+        '{{ plc.name }}: {{ plc.pragma_count }} pragmas\n'
+        '{% endfor %}'
+    )
+    (templates / '{{tsproj.name}}_{{plc.name}}.rst').write_text(
+        '{{ plc.name }}: {{ plc.records | length }} records'
+    )
+    monkeypatch.setattr(docs.cache, 'CACHE_PATH', tmp_path / 'cache')
+    return solution, sorted(templates.iterdir()), tsprojs
+
+
+def read_outputs(path):
+    return {
+        filename.name: filename.read_text()
+        for filename in path.iterdir()
+        if filename.name != docs.MANIFEST_FILENAME
+    }
+
+
+@pytest.mark.parametrize('no_cache', [False, True])
+def test_jobs_build_plc_contexts_in_workers(tmp_path, monkeypatch,
+                                            sample_solution, no_cache):
+    solution, templates, _ = sample_solution
+    serial = tmp_path / 'serial'
+    serial.mkdir()
+    docs.main(solution, serial, templates=templates, no_cache=no_cache)
+
+    # The parent process only finds the PLCs and their outputs
+    parent_pid = os.getpid()
+    get_plc_record_packages = docs.get_plc_record_packages
+
+    def in_worker_only(*args, **kwargs):
+        assert os.getpid() != parent_pid
+        return get_plc_record_packages(*args, **kwargs)
+
+    monkeypatch.setattr(docs, 'get_plc_record_packages', in_worker_only)
+    parallel = tmp_path / 'parallel'
+    parallel.mkdir()
+    docs.main(solution, parallel, templates=templates, no_cache=no_cache,
+              jobs=2)
+    assert read_outputs(parallel) == read_outputs(serial)
+
+
+def test_stream_releases_projects(tmp_path, monkeypatch, sample_solution):
+    solution, templates, tsprojs = sample_solution
+    output = tmp_path / 'output'
+    output.mkdir()
+
+    parse_all = docs.cache.parse_all
+    refs = []
+    released = []
+
+    def check_released(*args, **kwargs):
+        # Each project must be collectable before the next one is in use
+        for parsed in parse_all(*args, **kwargs):
+            gc.collect()
+            released.append(all(ref() is None for ref in refs))
+            refs.append(weakref.ref(parsed))
+            yield parsed
+
+    monkeypatch.setattr(docs.cache, 'parse_all', check_released)
+    # Parse and cache the projects, then build again from the cache
+    for force in (False, True):
+        docs.main(solution, output, stream=True, force=force,
+                  templates=templates)
+    gc.collect()
+    assert released == [True] * 4
+    assert all(ref() is None for ref in refs)
+    assert (output / 'index.rst').read_text().split() == [
+        tsproj.stem for tsproj in tsprojs
+    ]
@@ -0,0 +1,43 @@
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('pytmc')
+
+# Modules which should never be loaded by the lightweight subcommands
+HEAVY_MODULES = {'ophyd', 'typhos', 'pcdsdevices', 'qtpy', 'PyQt5', 'PySide2'}
+
+IMPORT_CHECK = '''
+import sys
+sys.argv = ['ads-deploy'] + {argv!r}
+from ads_deploy.__main__ import main
+try:
+    main()
+except SystemExit:
+    pass
+print()
+print(' '.join(sorted(sys.modules)))
+'''
+
+
+def get_imported_modules(argv):
+    result = subprocess.run(
+        [sys.executable, '-c', IMPORT_CHECK.format(argv=argv)],
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+    return set(result.stdout.splitlines()[-1].split())
+
+
+@pytest.mark.parametrize(
+    'argv',
+    [pytest.param(['--help'], id='top-level'),
+     pytest.param(['tsproj', '--help'], id='tsproj'),
+     pytest.param(['config', '--help'], id='config'),
+     ]
+)
+def test_lightweight_startup(argv):
+    imported = get_imported_modules(argv)
+    assert not (imported & HEAVY_MODULES)
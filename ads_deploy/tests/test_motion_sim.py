@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('caproto')
+
+from .. import motion_sim  # noqa: E402
+
+
+def test_step():
+    sim = motion_sim.MotionSimulator({'plc': ['M1', 'M2', 'M3']},
+                                     velocity=2.0)
+    assert list(sim.pvdbs['plc']) == ['M1', 'M2', 'M3']
+
+    sim.move([0, 1], [1.0, -3.0])
+    moved, finished = sim.step(1.0)
+    assert list(moved) == [0, 1]
+    assert list(finished) == [0]
+    assert list(sim.state['position']) == [1.0, -2.0, 0.0]
+
+    moved, finished = sim.step(1.0)
+    assert list(finished) == [1]
+    assert sim.state['done'].all()
+    assert list(sim.state['position']) == [1.0, -3.0, 0.0]
+
+
+def test_put_and_publish():
+    sim = motion_sim.MotionSimulator({'plc': ['M1']}, velocity=1.0)
+    motor = sim.pvdbs['plc']['M1']
+    fields = motor.field_inst
+
+    async def test():
+        await sim._initialize()
+        await fields.user_high_limit.write(5.0)
+        await motor.write(10.0)
+        # Clipped to the user limits
+        assert motor.value == 5.0
+        assert fields.done_moving_to_value.value == 0
+
+        for _ in range(6):
+            await sim.publish(*sim.step(1.0))
+        assert fields.user_readback_value.value == 5.0
+        assert fields.done_moving_to_value.value == 1
+        assert fields.motor_is_moving.value == 0
+
+        await motor.write(0.0)
+        await sim.publish(*sim.step(1.0))
+        await fields.stop.write(1)
+        stopped = sim._check_stop([0])
+        await sim.publish(*sim.step(1.0), stopped)
+        assert fields.user_readback_value.value == 4.0
+        assert fields.done_moving_to_value.value == 1
+        assert fields.stop.value == 0
+
+    asyncio.run(test())
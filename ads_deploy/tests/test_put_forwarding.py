@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip('caproto')
+
+from caproto import ChannelDouble  # noqa: E402
+
+from .. import put_forwarding  # noqa: E402
+
+
+def test_parse_window():
+    assert put_forwarding.parse_window('A:*:B=0.5') == ('A:*:B', 0.5)
+    with pytest.raises(ValueError):
+        put_forwarding.parse_window('0.5')
+
+
+def test_windows():
+    forwarder = put_forwarding.PutForwarder(
+        window=1.0, windows=[('SLOW:*', 2.0), ('*', 3.0)])
+    assert forwarder.get_window('SLOW:VAL') == 2.0
+    assert forwarder.get_window('OTHER') == 3.0
+
+
+def test_coalesce():
+    forwarder = put_forwarding.PutForwarder(window=10.0)
+    target = ChannelDouble(value=0.0)
+
+    async def test():
+        for value in (1.0, 2.0, 3.0):
+            await forwarder.forward('OUT', target, value)
+        assert target.value == 1.0
+        await forwarder.flush()
+        assert target.value == 1.0
+        await forwarder.flush(time.monotonic() + 10.0)
+        assert target.value == 3.0
+
+    asyncio.run(test())
+    assert forwarder.counters == {'forwarded': 2, 'merged': 1, 'dropped': 0,
+                                  'failed': 0}
+
+
+def test_rate_limit():
+    forwarder = put_forwarding.PutForwarder(max_rate=1.0)
+    targets = [ChannelDouble(value=0.0) for _ in range(2)]
+
+    async def test():
+        for value in (1.0, 2.0):
+            for target in targets:
+                await forwarder.forward('OUT', target, value)
+        assert [target.value for target in targets] == [1.0, 0.0]
+        # The longest held back value is forwarded first
+        await forwarder.flush(time.monotonic() + 1.0)
+        assert [target.value for target in targets] == [1.0, 2.0]
+        await forwarder.flush(time.monotonic() + 2.0)
+        assert [target.value for target in targets] == [2.0, 2.0]
+
+    asyncio.run(test())
+    assert forwarder.counters == {'forwarded': 3, 'merged': 0, 'dropped': 1,
+                                  'failed': 0}
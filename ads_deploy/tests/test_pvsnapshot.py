@@ -0,0 +1,73 @@
+import asyncio
+
+import numpy
+import pytest
+
+pytest.importorskip('caproto')
+
+from .. import caproto_ioc, pvsnapshot  # noqa: E402
+
+
+def make_record_pairs():
+    SimpleRecord = caproto_ioc.util.SimpleRecord
+    return [
+        (SimpleRecord('SNAP:VAL_RBV', 'ai', {}, []),
+         SimpleRecord('SNAP:VAL', 'ao', {}, [])),
+        (SimpleRecord('SNAP:STR', 'stringin', {}, []), None),
+        (SimpleRecord('SNAP:WAVE', 'waveform',
+                      {'FTVL': 'LONG', 'NELM': '4'}, []), None),
+    ]
+
+
+def test_snapshot_and_restore(tmp_path):
+    filename = tmp_path / 'snapshot.bin'
+    ioc = caproto_ioc.create_ioc_from_records(make_record_pairs(),
+                                              class_name='Snap')(prefix='')
+    snapshotter = pvsnapshot.Snapshotter(filename, interval=0,
+                                         prefix='SNAPSHOT:')
+    snapshotter.sources.append(
+        {channeldata.pvname: channeldata
+         for channeldata in (getattr(ioc, attr)
+                             for attr in ioc.startup_fields)}
+    )
+
+    async def test():
+        await ioc.pvdb['SNAP:VAL'].write(2.5)
+        await ioc.pvdb['SNAP:STR'].write('abc')
+        await ioc.pvdb['SNAP:WAVE'].write(numpy.arange(3))
+        await snapshotter.group.pvdb['SNAPSHOT:SAVE'].write(1)
+        assert snapshotter.group.pvs.value == 4
+
+    asyncio.run(test())
+    values = pvsnapshot.load_snapshot(filename)
+    assert values['SNAP:VAL_RBV'][0] == 2.5
+    assert values['SNAP:STR'][0] == 'abc'
+    assert list(values['SNAP:WAVE'][0]) == [0, 1, 2]
+
+    # Restored directly, without forwarding output to input records
+    values['SNAP:VAL'] = (1.5, values['SNAP:VAL'][1])
+    values['SNAP:MISSING'] = (1.0, None)
+    fresh = caproto_ioc.create_ioc_from_records(make_record_pairs(),
+                                                class_name='Snap')(prefix='')
+    source = {fresh.pvdb[pvname].pvname: fresh.pvdb[pvname]
+              for pvname in ('SNAP:VAL', 'SNAP:VAL_RBV', 'SNAP:STR',
+                             'SNAP:WAVE')}
+    assert pvsnapshot.restore_values([source], values) == 4
+    assert fresh.pvdb['SNAP:VAL'].value == 1.5
+    assert fresh.pvdb['SNAP:VAL_RBV'].value == 2.5
+    assert fresh.pvdb['SNAP:WAVE'].value.dtype == numpy.dtype('>i4')
+
+    table = caproto_ioc.get_record_table(make_record_pairs())
+    lazy = caproto_ioc.LazyPVDatabase(table)
+    # A value which no longer fits its record is skipped
+    values['SNAP:STR'] = (numpy.arange(2), None)
+    assert pvsnapshot.restore_values([lazy], values) == 3
+    assert not dict(lazy.items())
+    assert set(lazy.record_values()) == {'SNAP:VAL', 'SNAP:VAL_RBV',
+                                         'SNAP:WAVE'}
+
+    async def test_lazy():
+        assert lazy['SNAP:VAL_RBV'].value == 2.5
+        assert list(lazy['SNAP:WAVE'].value) == [0, 1, 2]
+
+    asyncio.run(test_lazy())
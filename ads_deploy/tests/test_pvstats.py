@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('caproto')
+
+from caproto import ChannelDouble, ChannelType  # noqa: E402
+
+from .. import pvstats  # noqa: E402
+
+
+def test_counter_table():
+    table = pvstats.CounterTable(size=2)
+    assert [table.index(f'PV{idx}') for idx in range(5)] == list(range(5))
+    assert table.index('PV1') == 1
+    table.reads[table.index('PV4')] += 3
+    counts, pvnames = table.snapshot()
+    assert len(counts) == len(pvnames) == 5
+    assert counts['reads'].tolist() == [0, 0, 0, 0, 3]
+
+
+def test_count_requests(tmp_path):
+    stats = pvstats.PVStatistics(prefix='STATS:', top=2,
+                                 filename=tmp_path / 'stats.prom')
+    pvdb = stats.wrap({'PV:A': ChannelDouble(value=0.0),
+                       'PV:B': ChannelDouble(value=0.0)})
+
+    async def test():
+        for _ in range(3):
+            await pvdb['PV:A'].auth_read('host', 'user', ChannelType.DOUBLE)
+        await pvdb['PV:B'].auth_read('host', 'user', ChannelType.DOUBLE)
+        await pvdb['PV:B'].auth_write('host', 'user', [2.0],
+                                      ChannelType.DOUBLE, None)
+        counts, pvnames = stats.table.snapshot()
+        await stats.update_summary(counts, pvnames, counts[:0], 1.0)
+        assert stats.group.reads.value == 4
+        assert stats.group.writes.value == 1
+        assert stats.group.top_reads.value == 'PV:A=3 PV:B=1'
+        assert stats.group.top_writes.value == 'PV:B=1'
+
+        task = asyncio.ensure_future(stats.run())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(test())
+    text = (tmp_path / 'stats.prom').read_text()
+    assert 'ads_deploy_pv_reads_total{pv="PV:A"} 3\n' in text
+    assert 'ads_deploy_pv_put_seconds_count{pv="PV:B"} 1\n' in text
+    assert text.endswith('# EOF\n')
@@ -0,0 +1,102 @@
+import asyncio
+
+import numpy
+import pytest
+
+pytest.importorskip('caproto')
+
+from caproto import (ChannelData, ChannelDouble, ChannelString,  # noqa: E402
+                     ChannelType)
+
+from .. import pvtrace  # noqa: E402
+
+
+def make_trace(filename):
+    writer = pvtrace.TraceWriter()
+    writer.add('TRACE:VAL', 1.5, timestamp=102.0)
+    writer.add('TRACE:VAL', 0.5, timestamp=101.0)
+    writer.add('TRACE:STR', 'abc', timestamp=100.0)
+    writer.add('TRACE:ARR', numpy.arange(3, dtype='>f8'), timestamp=100.5)
+    writer.add('TRACE:ARR', numpy.arange(5, dtype='>f8'), timestamp=101.5)
+    writer.write(filename)
+    return writer
+
+
+def test_roundtrip(tmp_path):
+    filename = tmp_path / 'trace.bin'
+    assert len(make_trace(filename)) == 5
+
+    with pvtrace.Trace(filename) as trace:
+        assert trace.start_time == 100.0
+        assert trace.end_time == 102.0
+
+        val = trace.channels['TRACE:VAL']
+        assert list(val.timestamps) == [101.0, 102.0]
+        assert [pvtrace.get_value(val, idx) for idx in range(2)] == [0.5, 1.5]
+        assert pvtrace.get_value(trace.channels['TRACE:STR'], 0) == 'abc'
+
+        arr = trace.channels['TRACE:ARR']
+        assert list(arr.lengths) == [3, 5]
+        value = pvtrace.get_value(arr, 0)
+        assert value.dtype == numpy.dtype('>f8')
+        assert list(value) == [0, 1, 2]
+
+
+def test_not_a_trace(tmp_path):
+    filename = tmp_path / 'trace.bin'
+    filename.write_bytes(b'not a trace')
+    with pytest.raises(ValueError):
+        pvtrace.Trace(filename)
+
+
+def test_replay(tmp_path):
+    filename = tmp_path / 'trace.bin'
+    make_trace(filename)
+    pvdb = {
+        'TRACE:VAL': ChannelDouble(value=0.0),
+        'TRACE:STR': ChannelString(value=''),
+        'TRACE:ARR': ChannelData(value=numpy.zeros(5)),
+    }
+
+    replayer = pvtrace.TraceReplayer(pvtrace.Trace(filename), [pvdb],
+                                     speed=0)
+    batch = replayer.next_batch(100.5)
+    assert [replayer.channels[idx].pvname for _, idx, _ in batch] == [
+        'TRACE:STR', 'TRACE:ARR']
+
+    asyncio.run(replayer.run())
+    assert replayer.samples == 3
+    assert pvdb['TRACE:VAL'].value == 1.5
+    assert list(pvdb['TRACE:ARR'].value) == [0, 1, 2, 3, 4]
+
+
+def test_record_puts(tmp_path):
+    recorder = pvtrace.PutRecorder(tmp_path / 'trace.bin')
+    pvdb = recorder.wrap({'REC:VAL': ChannelDouble(value=0.0)})
+
+    async def test():
+        await pvdb['REC:VAL'].auth_write('host', 'user', [2.0],
+                                         ChannelType.DOUBLE, None)
+        # Writes other than client puts are not recorded
+        await pvdb['REC:VAL'].write(3.0)
+        task = asyncio.ensure_future(recorder.run())
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(test())
+    with pvtrace.Trace(tmp_path / 'trace.bin') as trace:
+        channel = trace.channels['REC:VAL']
+        assert len(channel.timestamps) == 1
+        assert pvtrace.get_value(channel, 0) == 2.0
+
+
+def test_writer_max_samples():
+    writer = pvtrace.TraceWriter(max_samples=2)
+    for value in range(4):
+        writer.add('TRACE:VAL', float(value), timestamp=float(value))
+    assert len(writer) == 2
+    assert writer.dropped == 2
+    snapshot = writer.snapshot()
+    writer.add('TRACE:OTHER', 1.0)
+    assert snapshot == [('TRACE:VAL', [0.0, 1.0], [0.0, 1.0])]
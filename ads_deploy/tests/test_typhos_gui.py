@@ -0,0 +1,51 @@
+import pytest
+
+pytest.importorskip('typhos')
+
+from .. import typhos_gui  # noqa: E402
+
+
+def make_pairs(*pvnames):
+    return {
+        typhos_gui.pvname_to_attribute(pvname): (
+            typhos_gui.SimpleRecord(pvname, 'ai', {}, []), None)
+        for pvname in pvnames
+    }
+
+
+def test_node_sizes():
+    root = typhos_gui.Node.build_tree(
+        make_pairs('A:B:C', 'A:B:D', 'A:E', 'A:F:G:H', 'I')
+    )
+    assert root.size == 5
+    assert root.children['A'].size == 4
+    assert root.children['A'].children['B'].size == 2
+    assert root.children['A'].children['F'].size == 1
+
+    root.add(['A', 'B', 'J'], None)
+    assert root.size == 6
+    assert root.children['A'].children['B'].size == 3
+
+
+def test_node_squash():
+    pvnames = ['A:B:C', 'A:B:D', 'A:E', 'A:F:G:H']
+    root = typhos_gui.Node.build_tree(make_pairs(*pvnames))
+    node = root.children['A']
+    node._squash_children()
+    assert not node.children
+    assert node.size == 4
+    assert [inp.pvname for inp, _ in node.pairs] == [
+        'A:E', 'A:B:C', 'A:B:D', 'A:F:G:H'
+    ]
+
+
+def test_node_device_class():
+    pvnames = [f'PLC:SUB{idx % 3}:VAL{idx}' for idx in range(60)]
+    root = typhos_gui.Node.build_tree(make_pairs(*pvnames))
+    device_cls = root.create_device_class(threshold=50, components={})
+    # The top-level is large enough to be split up by sub-device...
+    assert list(device_cls.component_names) == ['PLC']
+    plc_cls = device_cls.PLC.cls
+    assert list(plc_cls.component_names) == ['SUB0', 'SUB1', 'SUB2']
+    # ... while the sub-devices are squashed
+    assert len(plc_cls.SUB0.cls.component_names) == 20
@@ -0,0 +1,25 @@
+import pytest
+
+pytest.importorskip('pytmc')
+
+from .. import util  # noqa: E402
+
+
+def _square_or_fail(value):
+    if value < 0:
+        raise ValueError(value)
+    return value ** 2
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_run_jobs(jobs):
+    futures = util.run_jobs(_square_or_fail, [(3, ), (-1, ), (2, ), (1, )],
+                            jobs=jobs)
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except ValueError as ex:
+            results.append(ex.args)
+
+    assert results == [9, (-1, ), 4, 1]
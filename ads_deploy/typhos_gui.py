@@ -4,16 +4,17 @@ TwinCAT solution (or tsproj project).
 """
 
 import argparse
+import functools
 import logging
 
 import ophyd
-import pytmc
-import pytmc.bin.stcmd
 import typhos
 import typhos.cli
 from pytmc.bin.db import process
 
-from . import util
+from . import cache, util
+from .util import (SimpleRecord, pvname_to_attribute,  # noqa: F401
+                   records_from_packages, simplify_record)
 
 try:
     import pcdsdevices
@@ -77,33 +78,21 @@ def build_arg_parser(parser=None):
         help='Create a flat device hierarchy'
     )
 
-    return parser
-
-
-def records_from_packages(packages, macros):
-    for package in sorted(packages, key=lambda pkg: pkg.pvname):
-        try:
-            package.pvname = util.expand_macros(package.pvname, macros)
-        except ValueError:
-            logger.exception('Macro missing for: %s %s',
-                             package.tcname, package.pvname)
-            continue
-
-        pkg_records = package.records
-        try:
-            input_record, output_record = pkg_records
-        except ValueError:
-            input_record, output_record = pkg_records[0], None
-
-        yield input_record, output_record
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not use the cache of parsed projects'
+    )
 
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help=('Number of worker processes for processing PLC projects '
+              '(0 for one per CPU) [default: 1]')
+    )
 
-def pvname_to_attribute(pvname):
-    name = pvname.strip(' "')
-    attr = name.replace(':', '_')
-    if not attr.isidentifier():
-        return f'_{attr}'
-    return attr
+    return parser
 
 
 def component_from_record_pair(input_record, output_record):
@@ -130,26 +119,39 @@ class Node:
         self.pairs = []
         self.prefix = prefix
         self.device_class = None
+        self._size = None
 
     @property
     def size(self):
-        child_size = sum(child.size for child in self.children.values())
-        return len(self.pairs) + child_size
+        """The number of record pairs in this subtree (memoized)."""
+        if self._size is None:
+            self.update_sizes()
+        return self._size
+
+    def update_sizes(self):
+        """Compute subtree sizes bottom-up, for this node and descendents."""
+        for node in self.walk_depth_first():
+            node._size = len(node.pairs) + sum(
+                child._size for child in node.children.values()
+            )
 
     def add(self, item, pair):
-        prefix, *suffix = item
-        if not suffix:
-            return self.pairs.append(pair)
-
-        if prefix not in self.children:
-            self.children[prefix] = Node(prefix=self.prefix + [prefix],
-                                         parent=self)
-        self.children[prefix].add(suffix, pair)
+        node = self
+        for prefix in item[:-1]:
+            node._size = None
+            child = node.children.get(prefix)
+            if child is None:
+                child = Node(prefix=node.prefix + [prefix], parent=node)
+                node.children[prefix] = child
+            node = child
+
+        node._size = None
+        node.pairs.append(pair)
 
     def _create_device_class(self, threshold, components):
         components = dict(components)
-        for prefix, child in sorted(self.children.items(),
-                                    key=lambda kv: kv[1].prefix[-1]):
+        for _prefix, child in sorted(self.children.items(),
+                                     key=lambda kv: kv[1].prefix[-1]):
             attr = pvname_to_attribute(child.prefix[-1])
             components[attr] = ophyd.Component(
                 child.create_device_class(threshold=threshold,
@@ -171,13 +173,11 @@ class Node:
         return self.device_class
 
     def _squash_children(self):
-        def add_pairs(descendent):
-            self.pairs.extend(descendent.pairs)
-
         for child in self.children.values():
-            add_pairs(child)
+            self.pairs.extend(child.pairs)
             for descendent in child.walk_depth_first():
-                add_pairs(descendent)
+                if descendent is not child:
+                    self.pairs.extend(descendent.pairs)
         self.children.clear()
 
     def create_device_class(self, threshold, components):
@@ -186,28 +186,53 @@ class Node:
         return self._create_device_class(threshold, components)
 
     def walk_depth_first(self):
-        for prefix, child in self.children.items():
-            yield from child.walk_depth_first()
-        yield self
+        """Post-order walk of this node and its descendents."""
+        stack = [(self, iter(self.children.values()))]
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is not None:
+                stack.append((child, iter(child.children.values())))
+            else:
+                stack.pop()
+                yield node
 
     @classmethod
     def build_tree(cls, attr_to_pairs, delim=':'):
         root = cls(prefix=[])
-        for attr, (input_record, output_record) in attr_to_pairs.items():
+        for input_record, output_record in attr_to_pairs.values():
             root.add(input_record.pvname.split(delim), (input_record,
                                                         output_record))
+        root.update_sizes()
         return root
 
 
-def ophyd_device_from_plc(plc_name, plc_project, macros, *, includes=None,
-                          excludes=None, flat=False):
-    tmc = pytmc.parser.parse(plc_project.tmc_path)
+def records_from_plc(plc_name, tmc_path, *, macros, includes=None,
+                     excludes=None, use_cache=True):
+    """
+    Generate the records and motors of a PLC for use in an ophyd device.
+
+    This only requires pytmc and its result is picklable, such that it may be
+    run in a worker process.
+
+    Returns
+    -------
+    attr_to_pairs : dict
+        Attribute name to (input_record, output_record) SimpleRecord pairs.
+
+    motors : dict
+        Attribute name to motor PV prefix.
+    """
+    includes = includes or []
+    excludes = excludes or []
+    tmc = cache.parse(tmc_path, use_cache=use_cache)
 
     packages, exceptions = process(tmc, allow_errors=True,
                                    show_error_context=True)
 
     attr_to_pairs = {
-        pvname_to_attribute(input_record.pvname): (input_record, output_record)
+        pvname_to_attribute(input_record.pvname): (
+            simplify_record(input_record), simplify_record(output_record))
         for input_record, output_record in records_from_packages(packages,
                                                                  macros)
         if pvname_to_attribute(input_record.pvname)
@@ -219,20 +244,24 @@ def ophyd_device_from_plc(plc_name, plc_project, macros, *, includes=None,
         if util.should_filter(includes, excludes, [attr, input_record.pvname])
     }
 
-    motors = {}
-    for motor in tmc.find(pytmc.parser.Symbol_DUT_MotionStage):
-        if motor.is_pointer:
-            continue
+    motors = {
+        pvname_to_attribute(prefix): prefix
+        for prefix in util.get_motor_prefixes(plc_name, tmc, includes=includes,
+                                              excludes=excludes)
+    }
 
-        if not util.should_filter(includes, excludes, ['motor', motor.name]):
-            continue
+    return attr_to_pairs, motors
 
-        prefix = ''.join(
-            pytmc.bin.stcmd.get_name(motor, {'prefix': plc_name, 'delim': ':'})
-        )
 
-        attr = pvname_to_attribute(prefix)
-        motors[attr] = ophyd.Component(MOTOR_CLASS, prefix)
+def ophyd_device_from_records(plc_name, attr_to_pairs, motors, *,
+                              flat=False):
+    """
+    Create an ophyd device from the result of :func:`records_from_plc`.
+    """
+    motors = {
+        attr: ophyd.Component(MOTOR_CLASS, prefix)
+        for attr, prefix in motors.items()
+    }
 
     if flat:
         components = {
@@ -248,17 +277,27 @@ def ophyd_device_from_plc(plc_name, plc_project, macros, *, includes=None,
     return device_cls('', name=plc_name)
 
 
+def ophyd_device_from_plc(plc_name, plc_project, macros, *, includes=None,
+                          excludes=None, flat=False, use_cache=True):
+    attr_to_pairs, motors = records_from_plc(
+        plc_name, plc_project.tmc_path, macros=macros, includes=includes,
+        excludes=excludes, use_cache=use_cache)
+    return ophyd_device_from_records(plc_name, attr_to_pairs, motors,
+                                     flat=flat)
+
+
 def main(project, *, plcs=None, include=None, exclude=None, macro=None,
-         flat=False):
+         flat=False, no_cache=False, jobs=1):
     macros = util.split_macros(macro or [])
     include = include or []
     exclude = exclude or []
 
     solution_path, projects = util.get_tsprojects_from_filename(project.name)
 
-    devices = []
-    for tsproj_project in projects:
-        parsed_tsproj = pytmc.parser.parse(tsproj_project)
+    to_process = []
+    parsed_projects = cache.parse_all(projects, use_cache=not no_cache,
+                                      jobs=jobs)
+    for tsproj_project, parsed_tsproj in zip(projects, parsed_projects):
         for plc_name, plc_project in parsed_tsproj.plcs_by_name.items():
             logger.debug('Project: %s PLC: %s', tsproj_project, plc_name)
 
@@ -266,15 +305,22 @@ def main(project, *, plcs=None, include=None, exclude=None, macro=None,
                 logger.debug('Skipping; not in valid list: %s', plcs)
                 continue
 
-            try:
-                device = ophyd_device_from_plc(plc_name, plc_project, macros,
-                                               includes=include,
-                                               excludes=exclude,
+            to_process.append((plc_name, plc_project.tmc_path))
+
+    get_records = functools.partial(
+        records_from_plc, macros=macros, includes=include, excludes=exclude,
+        use_cache=not no_cache)
+
+    devices = []
+    results = util.run_jobs(get_records, to_process, jobs=jobs)
+    for (plc_name, _), result in zip(to_process, results):
+        try:
+            device = ophyd_device_from_records(plc_name, *result.result(),
                                                flat=flat)
-            except Exception:
-                logger.exception('Failed to create device for plc %s',
-                                 plc_name)
-                raise
+        except Exception:
+            logger.exception('Failed to create device for plc %s',
+                             plc_name)
+            raise
 
         for sig in typhos.utils.get_all_signals_from_device(device):
             logger.debug("Signal: %s", sig)
@@ -1,14 +1,26 @@
+import collections
+import collections.abc
+import concurrent.futures
+import contextlib
 import distutils.version
 import logging
 import os
 import pathlib
 import re
 import string
+import tempfile
+import weakref
 
 import pytmc
+import pytmc.bin.stcmd
 
 logger = logging.getLogger(__name__)
 
+# A picklable summary of a pytmc EPICSRecord, detached from the parsed tmc
+SimpleRecord = collections.namedtuple(
+    'SimpleRecord', 'pvname record_type fields aliases'
+)
+
 ADS_IOC_LOCATION = pathlib.Path(
     os.environ.get('ADS_IOC_LOCATION', '/reg/g/pcds/epics/ioc/common/ads-ioc')
 )
@@ -118,3 +130,244 @@ def should_filter(includes, excludes, values):
                                     for incl in includes
                                     for value in values
                                     )
+
+
+def records_from_packages(packages, macros):
+    for package in sorted(packages, key=lambda pkg: pkg.pvname):
+        try:
+            package.pvname = expand_macros(package.pvname, macros)
+        except ValueError:
+            logger.exception('Macro missing for: %s %s',
+                             package.tcname, package.pvname)
+            continue
+
+        pkg_records = package.records
+        try:
+            input_record, output_record = pkg_records
+        except ValueError:
+            input_record, output_record = pkg_records[0], None
+
+        for record in pkg_records:
+            record.aliases = list(_expand_aliases(record, macros))
+        yield input_record, output_record
+
+
+def _expand_aliases(record, macros):
+    for alias in record.aliases:
+        try:
+            yield expand_macros(alias, macros)
+        except ValueError:
+            logger.warning('Macro missing for alias of %s: %s',
+                           record.pvname, alias)
+
+
+def simplify_record(record):
+    """Get a picklable SimpleRecord from a pytmc EPICSRecord (or None)."""
+    if record is None:
+        return None
+    return SimpleRecord(record.pvname, record.record_type, dict(record.fields),
+                        list(record.aliases))
+
+
+def pvname_to_attribute(pvname):
+    name = pvname.strip(' "')
+    attr = name.replace(':', '_')
+    if not attr.isidentifier():
+        return f'_{attr}'
+    return attr
+
+
+def get_motor_prefixes(plc_name, tmc, *, includes=None, excludes=None):
+    """
+    Get the PV prefixes of the DUT_MotionStage symbols in a PLC.
+
+    Parameters
+    ----------
+    plc_name : str
+        The PLC name, used as a prefix for axes named after their NC axis.
+
+    tmc : pytmc.parser.TcModuleClass
+        The parsed tmc file.
+
+    includes : list of str, optional
+        Include motors by symbol name.
+
+    excludes : list of str, optional
+        Exclude motors by symbol name.
+
+    Returns
+    -------
+    list of str
+    """
+    prefixes = []
+    for motor in tmc.find(pytmc.parser.Symbol_DUT_MotionStage):
+        if motor.is_pointer:
+            continue
+
+        if not should_filter(includes or [], excludes or [],
+                             ['motor', motor.name]):
+            continue
+
+        prefixes.append(''.join(
+            pytmc.bin.stcmd.get_name(motor, {'prefix': plc_name, 'delim': ':'})
+        ))
+    return prefixes
+
+
+def _get_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Read once, as changing the umask to read it is not thread-safe
+_UMASK = _get_umask()
+
+
+@contextlib.contextmanager
+def atomic_write(filename, mode='wb', **kwargs):
+    """
+    Open a temporary file which replaces ``filename`` once fully written.
+
+    Readers never see a partially-written file.  If the block raises, the
+    temporary file is removed and ``filename`` is left as it was.
+
+    Parameters
+    ----------
+    filename : str or pathlib.Path
+        The file to write.
+
+    mode : str, optional
+        The file mode, 'wb' or 'wt'.
+
+    **kwargs
+        Passed to :func:`open`, e.g., ``encoding``.
+    """
+    filename = pathlib.Path(filename)
+    fd, temp_filename = tempfile.mkstemp(
+        dir=filename.parent, prefix=f'.{filename.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **kwargs) as f:
+            yield f
+        # mkstemp creates files readable only by their owner
+        os.chmod(temp_filename, 0o666 & ~_UMASK)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            ...
+        raise
+
+
+class InstrumentedPVDatabase(collections.abc.MutableMapping):
+    """
+    A PV database which instruments its ChannelData, e.g., to record puts.
+
+    PVs are instrumented by :meth:`instrument` as the server looks them up,
+    such that lazy PV databases are not populated up front.
+
+    Parameters
+    ----------
+    pvdb : dict
+        The PV database to wrap.
+
+    Attributes
+    ----------
+    uninstrumented : set of str
+        PV names which are served as they are, e.g., summary PVs.
+    """
+
+    def __init__(self, pvdb):
+        self.pvdb = pvdb
+        self.uninstrumented = set()
+        self._instrumented = weakref.WeakSet()
+
+    def instrument(self, pvname, channeldata):
+        """Instrument ChannelData, once per instance.  Override this."""
+
+    def _instrument(self, pvname, channeldata):
+        if pvname in self.uninstrumented:
+            return
+        if channeldata not in self._instrumented:
+            self.instrument(pvname, channeldata)
+            self._instrumented.add(channeldata)
+
+    def __getitem__(self, pvname):
+        channeldata = self.pvdb[pvname]
+        self._instrument(pvname, channeldata)
+        return channeldata
+
+    def __setitem__(self, pvname, channeldata):
+        # The server caches "record.FIELD" lookups here
+        self._instrument(pvname, channeldata)
+        self.pvdb[pvname] = channeldata
+
+    def __delitem__(self, pvname):
+        del self.pvdb[pvname]
+
+    def __contains__(self, pvname):
+        return pvname in self.pvdb
+
+    def __iter__(self):
+        return iter(self.pvdb)
+
+    def __len__(self):
+        return len(self.pvdb)
+
+    def items(self):
+        return self.pvdb.items()
+
+    def values(self):
+        return self.pvdb.values()
+
+
+def _initialize_worker(log_level):
+    logging.basicConfig()
+    logging.getLogger('ads_deploy').setLevel(log_level)
+
+
+def run_jobs(func, args_list, *, jobs=1):
+    """
+    Call ``func(*args)`` for each ``args`` in ``args_list``.
+
+    Parameters
+    ----------
+    func : callable
+        The function to call.  When using worker processes, this must be a
+        module-level function and its arguments and return value must be
+        picklable.
+
+    args_list : list of tuple
+        Positional arguments for each call.
+
+    jobs : int, optional
+        Number of worker processes to use.  1 (the default) runs everything
+        in this process, and 0 uses one worker per CPU.
+
+    Yields
+    ------
+    future : concurrent.futures.Future
+        One per call, in the order of ``args_list`` regardless of the order
+        of completion.  Exceptions are raised from ``future.result()``.
+    """
+    args_list = list(args_list)
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+
+    if jobs <= 1 or len(args_list) <= 1:
+        for args in args_list:
+            future = concurrent.futures.Future()
+            try:
+                future.set_result(func(*args))
+            except Exception as ex:
+                future.set_exception(ex)
+            yield future
+        return
+
+    log_level = logging.getLogger('ads_deploy').getEffectiveLevel()
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(jobs, len(args_list)),
+            initializer=_initialize_worker,
+            initargs=(log_level, )) as executor:
+        yield from [executor.submit(func, *args) for args in args_list]
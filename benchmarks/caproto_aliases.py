@@ -0,0 +1,106 @@
+"""
+Benchmark the memory used by record aliases in the mock caproto IOC.
+
+    $ python benchmarks/caproto_aliases.py --records 2000 --aliases 0 1 4 16
+
+Aliases are served as extra PV database entries sharing the ChannelData of
+their record, so each alias should only cost its database entry (for lazy
+databases, its entry in the alias table).  Each database is created with
+all of its records and aliases looked up, and the memory used by the
+aliases is the difference from the same records without aliases.
+"""
+
+import argparse
+import asyncio
+import gc
+import tracemalloc
+
+from ads_deploy import caproto_ioc, util
+
+
+def make_record_pairs(records, aliases):
+    def make_aliases(pvname):
+        return [f'ALIAS{idx}:{pvname}' for idx in range(aliases)]
+
+    pairs = []
+    for idx in range(records):
+        input_pvname, output_pvname = f'BENCH:VAL{idx}_RBV', f'BENCH:VAL{idx}'
+        pairs.append(
+            (util.SimpleRecord(input_pvname, 'ai', {'PREC': '3'},
+                               make_aliases(input_pvname)),
+             util.SimpleRecord(output_pvname, 'ao', {'PREC': '3'},
+                               make_aliases(output_pvname)))
+        )
+    return pairs
+
+
+def create_eager(pairs):
+    ioc_class = caproto_ioc.create_ioc_from_records(pairs, class_name='Bench')
+    ioc = ioc_class(prefix='')
+
+    def add():
+        caproto_ioc.add_aliases(ioc.pvdb, ioc.aliases)
+
+    return ioc, ioc.pvdb, add
+
+
+def create_lazy(pairs):
+    pvdb = caproto_ioc.LazyPVDatabase(caproto_ioc.get_record_table(pairs))
+    for pvname in pvdb.records:
+        pvdb[pvname]
+
+    def add():
+        for alias in pvdb.aliases:
+            pvdb[alias]
+
+    return pvdb, pvdb, add
+
+
+async def measure(create, pairs):
+    """
+    Get the memory used by a database with all of its records and aliases
+    looked up, along with its number of PVs and distinct ChannelData.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        keep, pvdb, add = create(pairs)
+        add()
+        gc.collect()
+        used, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    channeldata = {id(value) for value in pvdb.values()}
+    return used, len(pvdb), len(channeldata)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=2000,
+                        help='Number of record pairs')
+    parser.add_argument('--aliases', type=int, nargs='+',
+                        default=[0, 1, 4, 16],
+                        help='Aliases per record')
+    args = parser.parse_args()
+
+    print(f'{"Database":<8} {"Aliases":>8} {"PVs":>8} {"ChannelData":>12} '
+          f'{"Record MiB":>11} {"Alias KiB":>10} {"Bytes/alias":>12}')
+    for name, create in (('PVGroup', create_eager), ('Lazy', create_lazy)):
+        # The same records without aliases, once one-time allocations (e.g.,
+        # of caches) are out of the way
+        for _ in range(2):
+            record_used, _, _ = asyncio.run(
+                measure(create, make_record_pairs(args.records, 0)))
+        for aliases in args.aliases:
+            pairs = make_record_pairs(args.records, aliases)
+            used, pvs, channeldata = asyncio.run(measure(create, pairs))
+            alias_used = used - record_used
+            alias_count = 2 * args.records * aliases
+            per_alias = alias_used / alias_count if alias_count else 0
+            print(f'{name:<8} {aliases:>8} {pvs:>8} {channeldata:>12} '
+                  f'{record_used / 1024 ** 2:>11.2f} '
+                  f'{alias_used / 1024:>10.1f} {per_alias:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
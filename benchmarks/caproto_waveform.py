@@ -0,0 +1,84 @@
+"""
+Benchmark put/get throughput of large waveforms against the mock caproto IOC.
+
+    $ python benchmarks/caproto_waveform.py --nelm 100000 --count 50
+
+The IOC is served from a background thread on localhost, with an output
+waveform record forwarding puts to its input (readback) record.
+"""
+
+import argparse
+import asyncio
+import os
+import threading
+import time
+
+import numpy
+
+from ads_deploy import caproto_ioc, util
+
+
+def make_record_pairs(ftvl, nelm):
+    fields = {'FTVL': ftvl, 'NELM': str(nelm)}
+    return [
+        (util.SimpleRecord('BENCH:ARR_RBV', 'waveform', fields, []),
+         util.SimpleRecord('BENCH:ARR', 'waveform', fields, [])),
+    ]
+
+
+def serve(pvdb):
+    asyncio.run(caproto_ioc.run_servers([pvdb], interfaces=['127.0.0.1']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nelm', type=int, default=100_000)
+    parser.add_argument('--ftvl', choices=sorted(caproto_ioc.WAVEFORM_TYPES),
+                        default='DOUBLE')
+    parser.add_argument('--count', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ.setdefault('EPICS_CA_AUTO_ADDR_LIST', 'NO')
+    os.environ.setdefault('EPICS_CA_ADDR_LIST', '127.0.0.1')
+    from caproto.threading.client import Context
+
+    ioc_class = caproto_ioc.create_ioc_from_records(
+        make_record_pairs(args.ftvl, args.nelm), class_name='Bench')
+    ioc = ioc_class(prefix='')
+    caproto_ioc.prepare_startup_fields(ioc)
+    threading.Thread(target=serve, args=(ioc.pvdb, ), daemon=True).start()
+
+    output, readback = Context().get_pvs('BENCH:ARR', 'BENCH:ARR_RBV',
+                                         timeout=10)
+    output.wait_for_connection(timeout=10)
+    readback.wait_for_connection(timeout=10)
+
+    _, dtype = caproto_ioc.WAVEFORM_TYPES[args.ftvl]
+    values = [numpy.arange(args.nelm, dtype=dtype) + idx
+              for idx in range(args.count)]
+    nbytes = args.count * args.nelm * dtype.itemsize
+
+    t0 = time.perf_counter()
+    for _ in range(args.count):
+        readback.read(timeout=30)
+    initial_get = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for value in values:
+        output.write(value, wait=True, timeout=30)
+    t1 = time.perf_counter()
+    for _ in range(args.count):
+        data = readback.read(timeout=30).data
+    t2 = time.perf_counter()
+
+    assert numpy.array_equal(data, values[-1])
+    print(f'Elements:            {args.nelm} x {args.ftvl}')
+    print(f'Get (initial value): {initial_get / args.count * 1e3:.2f} ms/get')
+    print(f'Put:                 {(t1 - t0) / args.count * 1e3:.2f} ms/put, '
+          f'{nbytes / (t1 - t0) / 1024 ** 2:.1f} MiB/s')
+    print(f'Get:                 {(t2 - t1) / args.count * 1e3:.2f} ms/get, '
+          f'{nbytes / (t2 - t1) / 1024 ** 2:.1f} MiB/s')
+
+
+if __name__ == '__main__':
+    main()
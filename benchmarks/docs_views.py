@@ -0,0 +1,116 @@
+"""
+Benchmark rendering the per-PLC documentation templates of a project.
+
+    $ python benchmarks/docs_views.py path/to/project.tsproj --repeat 3
+
+Per-PLC templates look up sorted symbol groups, records by data type, library
+versions and source code in ``plc.views``, which are computed once per PLC.
+This compares the current templates against the templates from before
+``plc.views`` (in ``docs_views_baseline/``), which sorted and grouped in
+jinja and fetched the source code of each POU twice.  Both render the same
+PLC contexts, with the pytmc helper caches cleared before each round.
+
+The views do not make rendering measurably faster: the EPICS template takes
+most of the time, looking up the data types and records of the PLC, which
+both versions do once per render.
+"""
+
+import argparse
+import collections
+import pathlib
+import time
+
+from pytmc.bin.template import get_render_context
+
+from ads_deploy import cache, docs, util
+
+BASELINE_PATH = pathlib.Path(__file__).parent / 'docs_views_baseline'
+
+
+def render_plc(env, templates, render_args, plc):
+    """
+    Render all per-PLC templates of a PLC with fresh views.
+
+    Returns
+    -------
+    elapsed : collections.Counter
+        Seconds taken by each template.
+
+    outputs : dict
+        Rendered text of each template.
+    """
+    docs.clear_pytmc_caches()
+    plc = dict(plc, views=docs.PlcViews(plc["obj"]))
+    elapsed = collections.Counter()
+    outputs = {}
+    for template_path, template in templates:
+        ctx = dict(get_render_context())
+        ctx.update(render_args, plc=plc)
+        t0 = time.perf_counter()
+        outputs[template_path.name] = ''.join(
+            docs.generate_template(env, template, context=ctx)
+        )
+        elapsed[template_path.name] += time.perf_counter() - t0
+    return elapsed, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('project', type=pathlib.Path,
+                        help='The .tsproj or .sln file')
+    parser.add_argument('--plcs', nargs='*', help='PLC names to limit to')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Renders of each template, taking the fastest')
+    args = parser.parse_args()
+
+    current = [
+        path for path in docs.DEFAULT_TEMPLATES
+        if docs.get_template_type(path) == 'per-PLC'
+    ]
+    baseline = [BASELINE_PATH / path.name for path in current]
+    # The baseline templates import util.macro from the default templates
+    env = docs.get_jinja_environment(current + baseline)
+    template_sets = {
+        name: [
+            (path, docs.compile_template(env, path.read_text(), str(path)))
+            for path in paths
+        ]
+        for name, paths in (('baseline', baseline), ('views', current))
+    }
+
+    solution_path, projects = util.get_tsprojects_from_filename(
+        args.project.resolve())
+    render_args = docs.get_solution_info(solution_path)
+
+    print(f'{"PLC":<24} {"Template":<40} {"Baseline":>9} {"Views":>9}')
+    for tsproj_project in projects:
+        tsproj_project = pathlib.Path(tsproj_project)
+        parsed_tsproj = cache.parse(tsproj_project)
+        render_args['tsproj'] = docs.get_tsproj_info(tsproj_project,
+                                                     parsed_tsproj)
+        for plc in docs.iter_plc_info(parsed_tsproj, plcs=args.plcs):
+            results = {}
+            outputs = {}
+            for name, templates in template_sets.items():
+                best = None
+                for _ in range(args.repeat):
+                    elapsed, outputs[name] = render_plc(
+                        env, templates, render_args, plc)
+                    best = elapsed if best is None else {
+                        key: min(best[key], elapsed[key]) for key in best
+                    }
+                results[name] = best
+
+            for key in sorted(results['views']):
+                print(f'{plc["name"]:<24} {key[-40:]:<40} '
+                      f'{results["baseline"][key]:>8.3f}s '
+                      f'{results["views"][key]:>8.3f}s')
+            print(f'{plc["name"]:<24} {"Total":<40} '
+                  f'{sum(results["baseline"].values()):>8.3f}s '
+                  f'{sum(results["views"].values()):>8.3f}s')
+            if outputs['baseline'] != outputs['views']:
+                print(f'{plc["name"]:<24} Warning: rendered outputs differ')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark building the typhos device hierarchy for synthetic PV names.
+
+    $ python benchmarks/typhos_tree.py --count 100000
+"""
+
+import argparse
+import random
+import time
+
+from ads_deploy import typhos_gui
+
+
+def make_pairs(count, min_depth, max_depth, seed=0):
+    """Synthetic {attr: (input_record, None)} pairs with hierarchical PVs."""
+    rand = random.Random(seed)
+    pairs = {}
+    for idx in range(count):
+        depth = rand.randint(min_depth, max_depth)
+        parts = ['PLC'] + [
+            f'{rand.choice("ABCDEFGH")}{rand.randint(0, 3)}'
+            for _ in range(depth)
+        ] + [f'VAL{idx}']
+        pvname = ':'.join(parts)
+        record = typhos_gui.SimpleRecord(pvname, 'ai', {}, [])
+        pairs[typhos_gui.pvname_to_attribute(pvname)] = (record, None)
+    return pairs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=100_000)
+    parser.add_argument('--min-depth', type=int, default=4)
+    parser.add_argument('--max-depth', type=int, default=12)
+    parser.add_argument('--threshold', type=int, default=50)
+    args = parser.parse_args()
+
+    pairs = make_pairs(args.count, args.min_depth, args.max_depth)
+
+    t0 = time.perf_counter()
+    root = typhos_gui.Node.build_tree(pairs)
+    t1 = time.perf_counter()
+    root.create_device_class(threshold=args.threshold, components={})
+    t2 = time.perf_counter()
+
+    nodes = sum(1 for _ in root.walk_depth_first())
+    print(f'PVs:                 {args.count}')
+    print(f'Nodes after squash:  {nodes}')
+    print(f'build_tree:          {t1 - t0:.3f} s')
+    print(f'create_device_class: {t2 - t1:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
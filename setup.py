@@ -5,7 +5,7 @@ from setuptools import find_packages, setup
 
 import versioneer
 
-min_version = (3, 6)
+min_version = (3, 8)
 
 if sys.version_info < min_version:
     error = """
@@ -62,6 +62,7 @@ setup(
                        ]
         },
     install_requires=requirements,
+    python_requires='>={}.{}'.format(*min_version),
     classifiers=[
         'Development Status :: 2 - Pre-Alpha',
         'Natural Language :: English',